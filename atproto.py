@@ -3,71 +3,364 @@ atproto.py - AT Protocol 共通操作モジュール
 
 whtwnd_post.py / bsky_post.py から共通で使用する。
 - 設定ファイルの読み込み
-- セッション認証
-- blob（画像）アップロード
+- セッション認証（セッションキャッシュ・refreshSession）
+- blob（画像）アップロード（ローカルCID計算による重複アップロードの省略）
 - ハンドル→DID解決
-- HTTPリクエスト共通処理（リトライ・エラーハンドリング）
+- HTTPリクエスト共通処理（コネクションプール・リトライ・エラーハンドリング）
+
+起動を速くするため、requests（ssl・urllib3 等を含めて数十ms）は最初の通信時に、
+mimetypes・concurrent.futures は使う関数の中で読み込む。--help・引数エラー・変更のない sync では読み込まない。
 """
 
+import base64
+import hashlib
 import json
-import mimetypes
+import os
 import sys
+import threading
 import time
 from pathlib import Path
+from urllib.parse import urlparse
 
-try:
-    import requests
-except ImportError:
-    print("requests が必要です: pip install requests")
-    sys.exit(1)
+import rate_limit
 
-PDS_HOST = "https://bsky.social"  # セルフホストPDSの場合はここを変更
+# セルフホストPDSの場合は環境変数 WHTWND_PDS_HOST で指定する（ベンチマークではローカルの模擬サーバーを指す）
+PDS_HOST = os.environ.get("WHTWND_PDS_HOST", "https://bsky.social").rstrip("/")
 
 # 設定ファイル: カレントディレクトリ優先、なければホーム
 _LOCAL_CONFIG = Path(".bsky_config.json")
 _HOME_CONFIG = Path.home() / ".bsky_config.json"
 
+# キャッシュ類（セッション等）の保存先: $XDG_CACHE_HOME/whtwnd-cli
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "whtwnd-cli"
+_SESSION_FILE = CACHE_DIR / "sessions.json"
+
+MAX_RATE_LIMIT_WAIT = 3600  # レート制限のリセットをこの秒数まで待って続行する（超える場合は終了）
+_MAX_RATE_LIMITED = 10      # 1リクエストが 429 を受けて待ち直す回数の上限
+
+
+# ──────────────────────────────────────────────
+# HTTPクライアント（コネクションプール）
+# ──────────────────────────────────────────────
+
+def _load_requests():
+    """requests を読み込んで返す（最初の通信時に1回だけ実際の import が走る）"""
+    try:
+        import requests
+        import requests.adapters
+    except ImportError:
+        print("requests が必要です: pip install requests")
+        sys.exit(1)
+    return requests
+
+
+class HttpClient:
+    """
+    keep-alive 付きコネクションプールを持つ共有HTTPクライアント。
+
+    requests.Session にチューニングした HTTPAdapter をマウントし、
+    ホストごとのプール（bsky.social / whtwnd.com など）で TCP+TLS 接続を再利用する。
+      pool_connections: プールを保持するホスト数
+      pool_maxsize    : 1ホストあたりの最大接続数（並列アップロード数の上限目安）
+      timeout         : リクエスト側で timeout 未指定時の既定値（秒）
+      keep_alive      : False にすると毎回接続を閉じる（計測・比較用）
+    """
+
+    def __init__(self, *, pool_connections: int = 4, pool_maxsize: int = 8,
+                 timeout: float = 15, keep_alive: bool = True):
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.options = {"pool_connections": pool_connections, "pool_maxsize": pool_maxsize,
+                        "timeout": timeout, "keep_alive": keep_alive}
+        requests = _load_requests()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=0,  # リトライは api_request 側で制御する
+            pool_block=False,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+
+    def request(self, method: str, url: str, **kwargs) -> "requests.Response":
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_client: HttpClient | None = None
+
+
+def get_client() -> HttpClient:
+    """共有HTTPクライアントを返す。未作成なら既定設定で作成する"""
+    global _client
+    if _client is None:
+        _client = HttpClient()
+    return _client
+
+
+def configure_client(**options) -> HttpClient:
+    """共有HTTPクライアントを指定オプションで作り直す（オプションは HttpClient と同じ）"""
+    global _client
+    if _client is not None:
+        _client.close()
+    _client = HttpClient(**options)
+    return _client
+
+
+def ensure_pool_size(size: int) -> HttpClient:
+    """並列数 size に対して1ホストあたりのプールが足りなければ共有クライアントを拡張する"""
+    client = get_client()
+    if client.options["pool_maxsize"] >= size:
+        return client
+    return configure_client(**{**client.options, "pool_maxsize": size})
+
 
 # ──────────────────────────────────────────────
 # HTTP共通処理（リトライ）
 # ──────────────────────────────────────────────
 
-def api_request(method: str, url: str, *, max_retries: int = 3, **kwargs) -> requests.Response:
+def api_request(method: str, url: str, *, max_retries: int = 3,
+                auth: dict | None = None, **kwargs) -> "requests.Response":
     """
-    HTTPリクエストを実行する。
+    共有HTTPクライアント経由でHTTPリクエストを実行する。
     以下の場合にエクスポネンシャルバックオフでリトライする:
       - ネットワークエラー（Timeout / ConnectionError）
-      - 429 レート制限
       - 5xx サーバーエラー
+    送信前にレート制限の残り（ratelimit-* ヘッダーの記録）を確認し、必要なら間隔を空ける（rate_limit.py）。
+    それでも 429 を受けた場合は制限のリセットまで待って再送する（MAX_RATE_LIMIT_WAIT まで）。
+
+    auth にセッションを渡すと accessJwt で Authorization ヘッダーを付与し、
+    トークン期限切れの応答を受けた場合は refresh_session() で更新して1度だけ再送する。
     """
-    for attempt in range(max_retries):
+    if auth is None:
+        return _send(method, url, max_retries, **kwargs)
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    for refreshed in (False, True):
+        token = auth["accessJwt"]
+        headers["Authorization"] = f"Bearer {token}"
+        resp = _send(method, url, max_retries, headers=headers, **kwargs)
+        if refreshed or not _is_expired_token(resp):
+            return resp
+        if not refresh_session(auth, stale_token=token):
+            return resp
+    return resp
+
+
+def _is_expired_token(resp: "requests.Response") -> bool:
+    """アクセストークン期限切れ・無効を示す応答かどうか"""
+    if resp.status_code == 401:
+        return True
+    if resp.status_code == 400:
         try:
-            resp = requests.request(method, url, **kwargs)
+            return resp.json().get("error") in ("ExpiredToken", "InvalidToken")
+        except ValueError:
+            return False
+    return False
+
+
+# 429 を受けたら全スレッドの送信をこの時刻（time.monotonic）まで止める
+_paused_until = 0.0
+_pause_lock = threading.Lock()
+_rate_limiter: rate_limit.RateLimiter | None = None
+
+
+def get_rate_limiter() -> rate_limit.RateLimiter:
+    """レート制限の記録（CACHE_DIR / "ratelimit.json"、プロセス間で共有）を返す"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = rate_limit.RateLimiter(CACHE_DIR / "ratelimit.json")
+    return _rate_limiter
+
+
+def rate_limit_wait(resp, limited: int) -> float:
+    """
+    limited 回目の 429 を受けたときに待つ秒数。ratelimit-reset があればリセットまで、
+    なければ Retry-After、それもなければエクスポネンシャルバックオフ（最大60秒）
+    """
+    values = rate_limit.parse_headers(resp.headers)
+    if values:
+        return max(1.0, values["reset"] - time.time())
+    try:
+        return float(resp.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return float(min(2 ** limited, 60))
+
+
+def rate_limit_message(wait: float) -> str:
+    """待機しきれないレート制限のエラーメッセージ"""
+    resume = time.strftime("%H:%M", time.localtime(time.time() + wait))
+    return f"レート制限に達しました。{resume} 頃に制限が解除されます。時間をおいてから再試行してください。"
+
+
+def _pause_all(wait: float):
+    global _paused_until
+    with _pause_lock:
+        _paused_until = max(_paused_until, time.monotonic() + wait)
+
+
+def _wait_if_paused():
+    delay = _paused_until - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+
+# api_request の試行ごとの記録を受け取る関数（request_trace.py の --trace など）
+_request_hooks: list = []
+
+
+def add_request_hook(hook):
+    """api_request（atproto_async を含む）の試行ごとに trace_event() の dict を受け取る関数を登録する"""
+    _request_hooks.append(hook)
+
+
+def remove_request_hook(hook):
+    if hook in _request_hooks:
+        _request_hooks.remove(hook)
+
+
+def _body_size(kwargs: dict) -> int | None:
+    """送信するボディのバイト数（data / json から求める。ファイルオブジェクトなど長さが分からなければ None）"""
+    if kwargs.get("json") is not None:
+        return len(json.dumps(kwargs["json"]).encode())
+    data = kwargs.get("data")
+    if data is None:
+        return 0
+    if isinstance(data, str):
+        return len(data.encode())
+    try:
+        return len(data)
+    except TypeError:
+        return None
+
+
+def trace_event(method: str, url: str, kwargs: dict, resp, queued: float, started: float, tries: int, *,
+                backoff: float = 0, error: str | None = None, thread: str | None = None) -> dict:
+    """
+    1回の試行の記録を作る（時刻は time.monotonic の値）。
+      nsid / host    : XRPC の NSID（XRPC 以外は URL のパス）と送信先ホスト
+      status / error : HTTP ステータス。応答がなければ None で、error に例外名
+      bytes_out / in : 送信・受信したボディのバイト数（ヘッダーは含まない）
+      wait           : 送信前にレート制限・429 による一時停止で待った秒数
+      elapsed        : 送信開始から応答本文の受信完了までの秒数
+      ttfb           : 応答ヘッダーが届くまでの秒数（接続確立・送信・サーバーの処理時間。requests のみ）
+      attempt        : 何回目の試行か（1始まり。429 による再送を含む）
+      backoff        : この試行の後、次の試行までに待つ秒数（5xx・ネットワークエラー・429）
+    """
+    parsed = urlparse(url)
+    now = time.monotonic()
+    bytes_in = None
+    if resp is not None:
+        if kwargs.get("stream"):
+            bytes_in = int(resp.headers.get("Content-Length") or 0) or None
+        else:
+            bytes_in = len(resp.content)
+    ttfb = getattr(resp, "elapsed", None)
+    return {
+        "ts": time.time() - (now - started),
+        "start": started,
+        "method": method,
+        "nsid": parsed.path.rsplit("/xrpc/", 1)[-1] if "/xrpc/" in parsed.path else parsed.path,
+        "host": parsed.netloc,
+        "status": None if resp is None else resp.status_code,
+        "error": error,
+        "bytes_out": _body_size(kwargs),
+        "bytes_in": bytes_in,
+        "wait": started - queued,
+        "elapsed": now - started,
+        "ttfb": None if ttfb is None else ttfb.total_seconds(),
+        "attempt": tries,
+        "backoff": backoff,
+        "thread": thread or threading.current_thread().name,
+    }
+
+
+def _emit(method: str, url: str, kwargs: dict, resp, queued: float, started: float, tries: int, **extra):
+    if not _request_hooks:
+        return
+    event = trace_event(method, url, kwargs, resp, queued, started, tries, **extra)
+    for hook in list(_request_hooks):
+        hook(event)
+
+
+def _send(method: str, url: str, max_retries: int, **kwargs) -> "requests.Response":
+    """
+    リトライ付きでリクエストを1件送信する。
+    並列実行中にどれかのリクエストが 429 を受けた場合、他のスレッドも待機時間が明けるまで送信を控える。
+    request フックが登録されていれば、試行ごとに trace_event() の記録を渡す。
+    """
+    requests = _load_requests()
+    body = kwargs.get("data")
+    limiter = get_rate_limiter()
+    attempt = limited = 0
+    resp = None
+    while attempt < max_retries:
+        queued = time.monotonic()
+        _wait_if_paused()
+        while (delay := limiter.reserve(url)) > 0:
+            time.sleep(delay)
+        started = time.monotonic()
+        tries = attempt + limited + 1
+        resp = None
+        try:
+            if isinstance(body, FileBody):
+                body.rewind()
+            resp = get_client().request(method, url, **kwargs)
         except requests.exceptions.Timeout:
-            if attempt < max_retries - 1:
-                _backoff("タイムアウト", attempt, max_retries)
+            attempt += 1
+            retry = attempt < max_retries
+            _emit(method, url, kwargs, None, queued, started, tries,
+                  backoff=2 ** (attempt - 1) if retry else 0, error="Timeout")
+            if retry:
+                _backoff("タイムアウト", attempt - 1, max_retries)
                 continue
             print("エラー: 接続タイムアウトが続いています。ネットワーク環境を確認してください。")
             sys.exit(1)
         except requests.exceptions.ConnectionError:
-            if attempt < max_retries - 1:
-                _backoff("接続エラー", attempt, max_retries)
+            attempt += 1
+            retry = attempt < max_retries
+            _emit(method, url, kwargs, None, queued, started, tries,
+                  backoff=2 ** (attempt - 1) if retry else 0, error="ConnectionError")
+            if retry:
+                _backoff("接続エラー", attempt - 1, max_retries)
                 continue
             print("エラー: サーバーに接続できません。ネットワーク環境を確認してください。")
             sys.exit(1)
+        except BaseException as e:  # progress フックによる中断など
+            _emit(method, url, kwargs, None, queued, started, tries, error=type(e).__name__)
+            raise
+        finally:
+            if resp is None:
+                limiter.release(url)  # 応答がなければ確保した予算を戻す
+        limiter.observe(url, resp.status_code, resp.headers)
 
         if resp.status_code == 429:
-            wait = int(resp.headers.get("Retry-After", 2 ** (attempt + 1)))
-            if attempt < max_retries - 1:
-                _backoff("レート制限", attempt, max_retries, wait)
-                continue
-            print("エラー: レート制限に達しました。しばらく時間をおいてから再試行してください。")
-            sys.exit(1)
+            # リセット時刻が分かっていれば待って続行する（回数の上限には数えない）
+            limited += 1
+            wait = rate_limit_wait(resp, limited)
+            give_up = wait > MAX_RATE_LIMIT_WAIT or limited > _MAX_RATE_LIMITED
+            _emit(method, url, kwargs, resp, queued, started, tries, backoff=0 if give_up else wait)
+            if give_up:
+                print(f"エラー: {rate_limit_message(wait)}")
+                sys.exit(1)
+            _pause_all(wait)
+            print(f"  レート制限: {wait:.0f}秒後に再開します...")
+            time.sleep(wait)
+            continue
 
-        if resp.status_code >= 500 and attempt < max_retries - 1:
-            _backoff(f"サーバーエラー ({resp.status_code})", attempt, max_retries)
+        attempt += 1
+        if resp.status_code >= 500 and attempt < max_retries:
+            _emit(method, url, kwargs, resp, queued, started, tries, backoff=2 ** (attempt - 1))
+            _backoff(f"サーバーエラー ({resp.status_code})", attempt - 1, max_retries)
             continue
 
+        _emit(method, url, kwargs, resp, queued, started, tries)
         return resp
 
     return resp  # max_retries=0 など到達しないケースの保険
@@ -117,6 +410,105 @@ def load_config() -> dict:
 # AT Protocol 認証
 # ──────────────────────────────────────────────
 
+# DID → (セッションストアのキー, ハンドル, パスワード)。refreshSession 失敗時の再ログイン用
+_logins: dict[str, tuple[str, str, str]] = {}
+_refresh_lock = threading.Lock()
+
+
+def login(handle: str, password: str) -> dict:
+    """
+    セッションを取得する。
+    1. セッションストアに有効な accessJwt があれば再利用
+    2. 期限切れなら refreshJwt で com.atproto.server.refreshSession
+    3. それも失敗した場合のみパスワードで createSession
+    """
+    key = f"{handle}@{PDS_HOST}"
+    cached = _load_session_store().get(key)
+    if cached:
+        _logins[cached["did"]] = (key, handle, password)
+        if not _jwt_expired(cached["accessJwt"]):
+            print(f"✓ セッション再利用: {cached['handle']} (DID: {cached['did']})")
+            return cached
+        if refresh_session(cached):
+            return cached
+
+    data = create_session(handle, password)
+    session = {k: data[k] for k in ("did", "handle", "accessJwt", "refreshJwt", "didDoc") if k in data}
+    _logins[session["did"]] = (key, handle, password)
+    _save_session(key, session)
+    return session
+
+
+def refresh_session(session: dict, stale_token: str | None = None) -> bool:
+    """
+    refreshJwt でセッションを更新し、session を書き換える（同じ dict を共有する呼び出し元にも反映される）。
+    refreshSession が失敗した場合は login() で記録したパスワードで再ログインする。
+    stale_token を指定すると、別スレッドが既に更新済みの場合は何もしない。
+    更新できなかった場合は False を返す。
+    """
+    with _refresh_lock:
+        if stale_token is not None and session["accessJwt"] != stale_token:
+            return True
+
+        resp = _send(
+            "POST",
+            f"{PDS_HOST}/xrpc/com.atproto.server.refreshSession",
+            3,
+            headers={"Authorization": f"Bearer {session['refreshJwt']}"},
+            timeout=15,
+        )
+        stored = _logins.get(session["did"])
+        if resp.ok:
+            data = resp.json()
+            print("✓ セッション更新 (refreshSession)")
+        elif stored is not None:
+            print(f"  セッション更新に失敗しました ({resp.status_code})。パスワードで再ログインします。")
+            data = create_session(stored[1], stored[2])
+        else:
+            return False
+
+        session.update({k: data[k] for k in ("did", "handle", "accessJwt", "refreshJwt", "didDoc") if k in data})
+        if stored is not None:
+            _save_session(stored[0], session)
+        return True
+
+
+def _jwt_expired(token: str, margin: int = 60) -> bool:
+    """JWT の exp を確認する（署名検証はしない）。exp が読めない場合は有効とみなす"""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, ValueError, KeyError, TypeError):
+        return False
+    return exp - margin < time.time()
+
+
+def _load_session_store() -> dict:
+    try:
+        with open(_SESSION_FILE) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _save_session(key: str, session: dict):
+    """セッションストアに保存する（パーミッション 0600）"""
+    store = _load_session_store()
+    store[key] = {k: session[k] for k in ("did", "handle", "accessJwt", "refreshJwt", "didDoc") if k in session}
+    write_private_file(_SESSION_FILE, json.dumps(store, ensure_ascii=False, indent=2))
+
+
+def write_private_file(path: Path, text: str):
+    """所有者のみ読み書き可能 (0600) なファイルをアトミックに書き込む"""
+    path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
 def create_session(handle: str, password: str) -> dict:
     """Bluesky/ATProto セッションを作成してアクセストークンとDIDを返す"""
     resp = api_request(
@@ -139,57 +531,348 @@ def create_session(handle: str, password: str) -> dict:
     return data
 
 
+def pds_service_did(session: dict) -> str:
+    """
+    ユーザーの PDS のサービス DID（did:web:<ホスト名>）を返す。
+    セッションの DID ドキュメントに記載された PDS を優先し、なければ PDS_HOST を使う
+    （bsky.social はエントリーウェイで、実際の PDS は別ホストのため）。
+    """
+    endpoint = PDS_HOST
+    for service in (session.get("didDoc") or {}).get("service", []):
+        if service.get("id") == "#atproto_pds":
+            endpoint = service.get("serviceEndpoint", endpoint)
+            break
+    return "did:web:" + urlparse(endpoint).hostname
+
+
+def get_service_auth(session: dict, aud: str, lxm: str, expires_in: int | None = None) -> str:
+    """
+    com.atproto.server.getServiceAuth で他サービス（動画サービス等）向けの認証トークンを取得する。
+    aud は呼び出し先サービスの DID、lxm は呼び出すメソッドの NSID。
+    """
+    params = {"aud": aud, "lxm": lxm}
+    if expires_in:
+        params["exp"] = int(time.time()) + expires_in
+    resp = api_request(
+        "GET",
+        f"{PDS_HOST}/xrpc/com.atproto.server.getServiceAuth",
+        auth=session,
+        params=params,
+        timeout=15,
+    )
+    if not resp.ok:
+        raise RuntimeError(f"サービス認証トークンの取得に失敗しました: {resp.status_code} {resp.text}")
+    return resp.json()["token"]
+
+
 # ──────────────────────────────────────────────
 # blob（画像）アップロード
 # ──────────────────────────────────────────────
 
-def upload_blob(session: dict, file_path: Path) -> dict:
-    """ローカルファイルをPDSにアップロードして blob オブジェクトを返す"""
-    mime_type, _ = mimetypes.guess_type(str(file_path))
-    if mime_type is None:
-        mime_type = "application/octet-stream"
+class FileBody:
+    """
+    ファイルをメモリに読み込まずにストリーム送信するためのリクエストボディ。
+
+    requests/urllib3 は read(n) で少しずつ読み出すため、ファイルサイズに関係なく
+    常駐メモリは一定になる。Content-Length は len() から決まる。
+    リトライ時は _send() が rewind() で先頭に戻してから再送する。
+    progress を渡すと送信済みバイト数ごとに progress(sent, total) を呼ぶ。
+    """
+
+    def __init__(self, f, size: int, progress=None):
+        self._f = f
+        self._size = size
+        self._progress = progress
+        self.sent = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def read(self, n: int = -1) -> bytes:
+        chunk = self._f.read(n)
+        self.sent += len(chunk)
+        if self._progress and chunk:
+            self._progress(self.sent, self._size)
+        return chunk
 
+    def rewind(self):
+        self._f.seek(0)
+        self.sent = 0
+
+
+def file_sha256(file_path: Path) -> bytes:
+    """ファイルの sha256 ダイジェストを 1MB ずつ読みながら計算する"""
+    h = hashlib.sha256()
     with open(file_path, "rb") as f:
-        data = f.read()
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.digest()
+
+
+def cid_from_sha256(digest: bytes) -> str:
+    """
+    sha256 ダイジェストから blob の CID を組み立てる。
+    uploadBlob が返す ref.$link と同じ CIDv1（raw コーデック, sha2-256, base32 小文字）。
+    """
+    # <version=1><codec=raw 0x55><multihash: sha2-256 0x12, 長さ 0x20, ダイジェスト>
+    raw = bytes([0x01, 0x55, 0x12, 0x20]) + digest
+    return "b" + base64.b32encode(raw).decode().lower().rstrip("=")
+
 
+def compute_cid(file_path: Path) -> str:
+    """ローカルファイルの blob CID を計算する"""
+    return cid_from_sha256(file_sha256(file_path))
+
+
+def find_existing_blob(session: dict, file_path: Path, cid: str | None = None) -> dict | None:
+    """
+    同じ内容の blob が既にリポジトリに存在すれば、アップロードせずに blob オブジェクトを組み立てて返す。
+    存在確認は com.atproto.sync.getBlob への HEAD リクエストで行う。存在しなければ None。
+    """
+    if cid is None:
+        cid = compute_cid(file_path)
     resp = api_request(
-        "POST",
-        f"{PDS_HOST}/xrpc/com.atproto.repo.uploadBlob",
-        headers={
-            "Authorization": f"Bearer {session['accessJwt']}",
-            "Content-Type": mime_type,
-        },
-        data=data,
-        timeout=60,
+        "HEAD",
+        f"{PDS_HOST}/xrpc/com.atproto.sync.getBlob",
+        params={"did": session["did"], "cid": cid},
+        allow_redirects=True,
+        timeout=10,
     )
+    if resp.status_code != 200:
+        return None
+
+    mime_type = resp.headers.get("Content-Type", "").split(";")[0].strip()
+    if not mime_type:
+        import mimetypes
+        mime_type = mimetypes.guess_type(str(file_path))[0] or "application/octet-stream"
+    print(f"  ✓ PDSに存在: {file_path.name} → CID: {cid[:16]}…")
+    return {
+        "$type": "blob",
+        "ref": {"$link": cid},
+        "mimeType": mime_type,
+        "size": file_path.stat().st_size,
+    }
+
+
+def upload_blob(session: dict, file_path: Path, progress=None, *,
+                skip_existing: bool = False, cid: str | None = None) -> dict:
+    """
+    ローカルファイルをPDSにアップロードして blob オブジェクトを返す。
+    ファイルはメモリに読み込まずストリーム送信する。
+    progress を渡すと progress(送信済みバイト数, 総バイト数) で進捗を通知する。
+
+    skip_existing=True の場合は CID をローカルで計算し（cid 指定時はそれを使う）、
+    同じ blob がリポジトリに既にあればアップロードを省略する。
+    失敗時は RuntimeError を送出する。
+    """
+    if skip_existing:
+        existing = find_existing_blob(session, file_path, cid)
+        if existing is not None:
+            return existing
+
+    import mimetypes
+    mime_type, _ = mimetypes.guess_type(str(file_path))
+    if mime_type is None:
+        mime_type = "application/octet-stream"
+
+    size = file_path.stat().st_size
+    started = time.monotonic()
+    with open(file_path, "rb") as f:
+        resp = api_request(
+            "POST",
+            f"{PDS_HOST}/xrpc/com.atproto.repo.uploadBlob",
+            auth=session,
+            headers={"Content-Type": mime_type, "Content-Length": str(size)},
+            data=FileBody(f, size, progress),
+            timeout=60,
+        )
+    elapsed = time.monotonic() - started
     if resp.status_code == 401:
-        print(f"アップロード失敗 ({file_path.name}): 認証トークンが無効です。再ログインしてください。")
-        sys.exit(1)
+        raise RuntimeError(f"アップロード失敗 ({file_path.name}): 認証トークンが無効です。再ログインしてください。")
     if resp.status_code == 413:
-        print(f"アップロード失敗 ({file_path.name}): ファイルサイズが大きすぎます。")
-        sys.exit(1)
+        raise RuntimeError(f"アップロード失敗 ({file_path.name}): ファイルサイズが大きすぎます（--optimize で縮小できます）。")
     if not resp.ok:
-        print(f"アップロード失敗 ({file_path.name}): {resp.status_code} {resp.text}")
-        print("  ※ アップロード済みのファイルはPDSのGCにより自動削除されます。")
-        sys.exit(1)
+        raise RuntimeError(f"アップロード失敗 ({file_path.name}): {resp.status_code} {resp.text}\n"
+                           "  ※ アップロード済みのファイルはPDSのGCにより自動削除されます。")
 
     blob = resp.json()["blob"]
     cid = blob["ref"]["$link"]
-    print(f"  ✓ アップロード完了: {file_path.name} → CID: {cid[:16]}…")
+    print(f"  ✓ アップロード完了: {file_path.name} ({format_throughput(size, elapsed)}) → CID: {cid[:16]}…")
     return blob
 
 
+def format_throughput(size: int, elapsed: float) -> str:
+    """転送サイズとスループットを「1.2 MB, 3.4 MB/s」の形式で返す"""
+    mb = size / 1024 / 1024
+    return f"{mb:.1f} MB, {mb / max(elapsed, 1e-6):.1f} MB/s"
+
+
 def blob_to_public_url(did: str, cid: str) -> str:
     """blob CIDをPDS経由の公開URLに変換する"""
     return f"{PDS_HOST}/xrpc/com.atproto.sync.getBlob?did={did}&cid={cid}"
 
 
+# ──────────────────────────────────────────────
+# レコード一括書き込み
+# ──────────────────────────────────────────────
+
+APPLY_WRITES_LIMIT = 200  # PDS が1回の applyWrites で受け付ける書き込み数の上限
+
+_TID_CHARS = "234567abcdefghijklmnopqrstuvwxyz"
+_tid_lock = threading.Lock()
+_last_tid_us = 0
+
+
+def generate_tid() -> str:
+    """
+    レコードキー用の TID（時刻順に並ぶ13文字の base32-sortable 文字列）を生成する。
+    applyWrites の create で rkey を事前に決めておくために使う。
+    """
+    global _last_tid_us
+    with _tid_lock:
+        now_us = max(time.time_ns() // 1000, _last_tid_us + 1)  # 同一プロセス内で単調増加
+        _last_tid_us = now_us
+    clock_id = int.from_bytes(os.urandom(2), "big") & 0x3FF
+    value = (now_us << 10) | clock_id
+    return "".join(_TID_CHARS[(value >> (5 * i)) & 0x1F] for i in reversed(range(13)))
+
+
+def apply_writes(session: dict, writes: list[dict], batch_size: int = APPLY_WRITES_LIMIT):
+    """
+    com.atproto.repo.applyWrites で書き込みをまとめて実行し、書き込みごとの結果を順に返すジェネレーター。
+    writes は batch_size（PDS の上限以下）ごとに分割して送信する。各バッチはアトミックに適用される。
+    結果は {"uri": ..., "cid": ...}（delete は空 dict）。失敗時は RuntimeError を送出する
+    （それまでに返した結果のバッチはコミット済み）。
+    """
+    batch_size = min(batch_size, APPLY_WRITES_LIMIT)
+    for i in range(0, len(writes), batch_size):
+        batch = writes[i:i + batch_size]
+        resp = api_request(
+            "POST",
+            f"{PDS_HOST}/xrpc/com.atproto.repo.applyWrites",
+            auth=session,
+            json={"repo": session["did"], "writes": batch},
+            timeout=60,
+        )
+        if resp.status_code == 400:
+            raise RuntimeError(f"一括書き込み失敗: リクエストが不正です ({resp.text})")
+        if resp.status_code == 401:
+            raise RuntimeError("一括書き込み失敗: 認証トークンが無効です。再ログインしてください。")
+        if not resp.ok:
+            raise RuntimeError(f"一括書き込み失敗: {resp.status_code} {resp.text}")
+
+        results = resp.json().get("results") or []
+        for n, write in enumerate(batch):
+            result = results[n] if n < len(results) else {}
+            if "uri" not in result and "rkey" in write:
+                # results を返さない PDS 向け: rkey は事前に決めてあるので URI を組み立てられる
+                result = {**result, "uri": f"at://{session['did']}/{write['collection']}/{write['rkey']}"}
+            yield {k: v for k, v in result.items() if k in ("uri", "cid")}
+
+
+# ──────────────────────────────────────────────
+# レコード一覧
+# ──────────────────────────────────────────────
+
+def list_records(session: dict, collection: str, *, limit: int = 100,
+                 cursor: str | None = None, reverse: bool = False) -> dict:
+    """
+    com.atproto.repo.listRecords で1ページ分を取得して {"records": [...], "cursor": ...} を返す。
+    既定の並び順は新しい順（rkey 降順）。reverse=True で古い順。
+    失敗時は RuntimeError を送出する。
+    """
+    params = {"repo": session["did"], "collection": collection, "limit": limit}
+    if cursor:
+        params["cursor"] = cursor
+    if reverse:
+        params["reverse"] = "true"
+
+    resp = api_request(
+        "GET",
+        f"{PDS_HOST}/xrpc/com.atproto.repo.listRecords",
+        params=params,
+        auth=session,
+        timeout=15,
+    )
+    if resp.status_code == 401:
+        raise RuntimeError("記事一覧の取得に失敗しました: 認証トークンが無効です。再ログインしてください。")
+    if not resp.ok:
+        raise RuntimeError(f"記事一覧の取得に失敗しました: {resp.status_code} {resp.text}")
+    return resp.json()
+
+
+def get_record(session: dict, collection: str, rkey: str) -> dict | None:
+    """
+    com.atproto.repo.getRecord で1件取得して {"uri", "cid", "value"} を返す。
+    存在しない場合は None、それ以外の失敗時は RuntimeError を送出する。
+    """
+    resp = api_request(
+        "GET",
+        f"{PDS_HOST}/xrpc/com.atproto.repo.getRecord",
+        params={"repo": session["did"], "collection": collection, "rkey": rkey},
+        auth=session,
+        timeout=15,
+    )
+    if resp.status_code in (400, 404) and "RecordNotFound" in resp.text:
+        return None
+    if not resp.ok:
+        raise RuntimeError(f"レコードの取得に失敗しました: {resp.status_code} {resp.text}")
+    return resp.json()
+
+
+def iter_pages(session: dict, collection: str, page_size: int = 100, reverse: bool = False,
+               prefetch: bool = True):
+    """
+    listRecords のページ（{"records": [...], "cursor": ...}）を順に返すジェネレーター。
+    prefetch=True の場合、呼び出し側が現在のページを処理している間に次のページを
+    バックグラウンドで取得しておく（途中で打ち切ると先読みした1ページ分は無駄になる）。
+    """
+    def fetch(cursor):
+        return list_records(session, collection, limit=page_size, cursor=cursor, reverse=reverse)
+
+    def has_next(page):
+        return bool(page.get("cursor")) and bool(page.get("records"))
+
+    if not prefetch:
+        page = fetch(None)
+        yield page
+        while has_next(page):
+            page = fetch(page["cursor"])
+            yield page
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    try:
+        future = pool.submit(fetch, None)
+        while future is not None:
+            page = future.result()
+            future = pool.submit(fetch, page["cursor"]) if has_next(page) else None
+            yield page
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_records(session: dict, collection: str, page_size: int = 100, reverse: bool = False,
+                 prefetch: bool = True):
+    """
+    コレクションの全レコードを1件ずつ返すジェネレーター。
+    ページは必要になった時点で取得するため、レコード数に関係なくメモリ使用量は一定。
+    """
+    for page in iter_pages(session, collection, page_size, reverse, prefetch):
+        yield from page.get("records", [])
+
+
 # ──────────────────────────────────────────────
 # ハンドル解決
 # ──────────────────────────────────────────────
 
-def resolve_handle_to_did(handle: str) -> str | None:
-    """ハンドルをDIDに解決する。失敗時はNoneを返す"""
+def resolve_handle(handle: str) -> tuple[str | None, bool]:
+    """
+    ハンドルをDIDに解決し (DID, 結果が確定したか) を返す。
+    ハンドルが存在しない（400）場合は (None, True)、サーバーエラー等の一時的な失敗は (None, False)。
+    """
     resp = api_request(
         "GET",
         f"{PDS_HOST}/xrpc/com.atproto.identity.resolveHandle",
@@ -197,5 +880,10 @@ def resolve_handle_to_did(handle: str) -> str | None:
         timeout=10,
     )
     if resp.ok:
-        return resp.json().get("did")
-    return None
+        return resp.json().get("did"), True
+    return None, resp.status_code == 400
+
+
+def resolve_handle_to_did(handle: str) -> str | None:
+    """ハンドルをDIDに解決する。失敗時はNoneを返す"""
+    return resolve_handle(handle)[0]
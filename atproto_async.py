@@ -0,0 +1,397 @@
+"""
+atproto_async.py - atproto.py の asyncio 版
+
+イベントループを止めずに AT Protocol を呼び出すための非同期クライアント。
+リトライ・バックオフ・429 の扱いは atproto.api_request と同じ
+（429 による送信停止とレート制限の記録 ratelimit.json は同期版と共有する）。
+
+同期版との違い:
+  - 処理を続けられない失敗は sys.exit ではなく RuntimeError を送出する
+    （非同期サービスに組み込んだ場合にプロセスを終了させないため。aiohttp がない場合の import も同様）
+  - 各関数は AsyncClient を第1引数に取る。同時実行数は AsyncClient のセマフォで制限する
+
+使い方:
+  async with AsyncClient(max_concurrency=8) as client:
+      session = await login(client, handle, password)
+      blobs = await asyncio.gather(*(upload_blob(client, session, p) for p in paths))
+"""
+
+import asyncio
+import json
+import mimetypes
+import time
+from pathlib import Path
+
+import atproto
+
+try:
+    import aiohttp
+except ImportError as e:
+    raise RuntimeError("aiohttp が必要です: pip install aiohttp") from e
+
+DEFAULT_CONCURRENCY = 8
+
+
+# ──────────────────────────────────────────────
+# HTTPクライアント
+# ──────────────────────────────────────────────
+
+class Response:
+    """読み込み済みのレスポンス（requests.Response と同じ属性名で参照できる）"""
+
+    def __init__(self, status_code: int, headers, content: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class FileStream:
+    """
+    ファイルをチャンク単位で読みながら送るリクエストボディ。
+    リトライのたびに先頭から読み直す。progress を渡すと progress(sent, total) を呼ぶ。
+    """
+
+    def __init__(self, file_path: Path, progress=None, chunk_size: int = 1 << 16):
+        self.file_path = file_path
+        self.size = file_path.stat().st_size
+        self._progress = progress
+        self._chunk_size = chunk_size
+
+    def __len__(self) -> int:
+        return self.size
+
+    async def chunks(self):
+        sent = 0
+        with open(self.file_path, "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, self._chunk_size)
+                if not chunk:
+                    return
+                sent += len(chunk)
+                if self._progress:
+                    self._progress(sent, self.size)
+                yield chunk
+
+
+class AsyncClient:
+    """
+    aiohttp.ClientSession を持つ非同期HTTPクライアント。
+      max_concurrency: 同時に実行するリクエスト数の上限（セマフォ）
+      limit_per_host : 1ホストあたりの最大接続数
+      timeout        : リクエスト側で timeout 未指定時の既定値（秒）。requests と同じく接続と各読み取りの待ち時間で、
+                       リクエスト全体の制限ではない（大きな blob のアップロードが時間切れにならないように）
+    トークン更新の排他（refresh_lock）もクライアントごとに持つ（クライアントは1つのイベントループの中で使うため、
+    asyncio.run を繰り返したりデーモンで別のループを動かしたりしても、前のループのロックを使わない）。
+    """
+
+    def __init__(self, *, max_concurrency: int = DEFAULT_CONCURRENCY,
+                 limit_per_host: int = DEFAULT_CONCURRENCY, timeout: float = 15):
+        self.timeout = timeout
+        self.refresh_lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=max_concurrency * 2, limit_per_host=limit_per_host),
+        )
+
+    async def __aenter__(self) -> "AsyncClient":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        await self._session.close()
+
+    async def request(self, method: str, url: str, *, timeout: float | None = None, **kwargs) -> Response:
+        if isinstance(kwargs.get("data"), FileStream):
+            kwargs["data"] = kwargs["data"].chunks()
+        timeout = timeout or self.timeout
+        client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+        async with self._semaphore:
+            async with self._session.request(method, url, timeout=client_timeout, **kwargs) as resp:
+                return Response(resp.status, resp.headers, await resp.read())
+
+
+# ──────────────────────────────────────────────
+# HTTP共通処理（リトライ）
+# ──────────────────────────────────────────────
+
+async def api_request(client: AsyncClient, method: str, url: str, *, max_retries: int = 3,
+                      auth: dict | None = None, **kwargs) -> Response:
+    """
+    atproto.api_request の非同期版。
+    ネットワークエラー・429・5xx をエクスポネンシャルバックオフでリトライし、
+    auth を渡した場合はトークン期限切れ時に refresh_session() で更新して1度だけ再送する。
+    リトライを使い切った場合は RuntimeError を送出する。
+    """
+    if auth is None:
+        return await _send(client, method, url, max_retries, **kwargs)
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    for refreshed in (False, True):
+        token = auth["accessJwt"]
+        headers["Authorization"] = f"Bearer {token}"
+        resp = await _send(client, method, url, max_retries, headers=headers, **kwargs)
+        if refreshed or not atproto._is_expired_token(resp):
+            return resp
+        if not await refresh_session(client, auth, stale_token=token):
+            return resp
+    return resp
+
+
+async def _send(client: AsyncClient, method: str, url: str, max_retries: int, **kwargs) -> Response:
+    limiter = atproto.get_rate_limiter()
+    attempt = limited = 0
+    resp = None
+
+    def emit(resp, tries, **extra):
+        # タスクごとに別のレーンとして記録する（同じスレッドで並行して動くため）
+        task = asyncio.current_task()
+        atproto._emit(method, url, kwargs, resp, queued, started, tries,
+                      thread=task.get_name() if task else None, **extra)
+
+    while attempt < max_retries:
+        queued = time.monotonic()
+        delay = atproto._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # 記録はメモリ上にあり、ファイルとの同期もときどきでファイルロックを待たないので、ループの中で直接呼ぶ
+        while (delay := limiter.reserve(url)) > 0:
+            await asyncio.sleep(delay)
+        started = time.monotonic()
+        tries = attempt + limited + 1
+        resp = None
+        try:
+            resp = await client.request(method, url, **kwargs)
+        except asyncio.TimeoutError:
+            attempt += 1
+            retry = attempt < max_retries
+            emit(None, tries, backoff=2 ** (attempt - 1) if retry else 0, error="Timeout")
+            if retry:
+                await _backoff("タイムアウト", attempt - 1, max_retries)
+                continue
+            raise RuntimeError("接続タイムアウトが続いています。ネットワーク環境を確認してください。")
+        except aiohttp.ClientConnectionError:
+            attempt += 1
+            retry = attempt < max_retries
+            emit(None, tries, backoff=2 ** (attempt - 1) if retry else 0, error="ConnectionError")
+            if retry:
+                await _backoff("接続エラー", attempt - 1, max_retries)
+                continue
+            raise RuntimeError("サーバーに接続できません。ネットワーク環境を確認してください。")
+        except BaseException as e:  # キャンセルなど
+            emit(None, tries, error=type(e).__name__)
+            raise
+        finally:
+            if resp is None:
+                limiter.release(url)  # 応答がなければ確保した予算を戻す
+        limiter.observe(url, resp.status_code, resp.headers)
+
+        if resp.status_code == 429:
+            limited += 1
+            wait = atproto.rate_limit_wait(resp, limited)
+            give_up = wait > atproto.MAX_RATE_LIMIT_WAIT or limited > atproto._MAX_RATE_LIMITED
+            emit(resp, tries, backoff=0 if give_up else wait)
+            if give_up:
+                raise RuntimeError(atproto.rate_limit_message(wait))
+            atproto._pause_all(wait)
+            print(f"  レート制限: {wait:.0f}秒後に再開します...")
+            await asyncio.sleep(wait)
+            continue
+
+        attempt += 1
+        if resp.status_code >= 500 and attempt < max_retries:
+            emit(resp, tries, backoff=2 ** (attempt - 1))
+            await _backoff(f"サーバーエラー ({resp.status_code})", attempt - 1, max_retries)
+            continue
+
+        emit(resp, tries)
+        return resp
+
+    return resp  # max_retries=0 など到達しないケースの保険
+
+
+async def _backoff(reason: str, attempt: int, max_retries: int, wait: int | None = None):
+    """リトライ待機のアナウンスと asyncio.sleep"""
+    if wait is None:
+        wait = 2 ** attempt
+    print(f"  {reason}: {wait}秒後にリトライします... ({attempt + 1}/{max_retries})")
+    await asyncio.sleep(wait)
+
+
+# ──────────────────────────────────────────────
+# AT Protocol 認証
+# ──────────────────────────────────────────────
+
+async def login(client: AsyncClient, handle: str, password: str) -> dict:
+    """atproto.login の非同期版（セッションストアは同期版と共有する。ファイルの読み書きはスレッドで行う）"""
+    key = f"{handle}@{atproto.PDS_HOST}"
+    cached = (await asyncio.to_thread(atproto._load_session_store)).get(key)
+    if cached:
+        atproto._logins[cached["did"]] = (key, handle, password)
+        if not atproto._jwt_expired(cached["accessJwt"]):
+            print(f"✓ セッション再利用: {cached['handle']} (DID: {cached['did']})")
+            return cached
+        if await refresh_session(client, cached):
+            return cached
+
+    data = await create_session(client, handle, password)
+    session = {k: data[k] for k in ("did", "handle", "accessJwt", "refreshJwt", "didDoc") if k in data}
+    atproto._logins[session["did"]] = (key, handle, password)
+    await asyncio.to_thread(atproto._save_session, key, session)
+    return session
+
+
+async def refresh_session(client: AsyncClient, session: dict, stale_token: str | None = None) -> bool:
+    """atproto.refresh_session の非同期版"""
+    async with client.refresh_lock:
+        if stale_token is not None and session["accessJwt"] != stale_token:
+            return True
+
+        resp = await _send(
+            client,
+            "POST",
+            f"{atproto.PDS_HOST}/xrpc/com.atproto.server.refreshSession",
+            3,
+            headers={"Authorization": f"Bearer {session['refreshJwt']}"},
+        )
+        stored = atproto._logins.get(session["did"])
+        if resp.ok:
+            data = resp.json()
+            print("✓ セッション更新 (refreshSession)")
+        elif stored is not None:
+            print(f"  セッション更新に失敗しました ({resp.status_code})。パスワードで再ログインします。")
+            data = await create_session(client, stored[1], stored[2])
+        else:
+            return False
+
+        session.update({k: data[k] for k in ("did", "handle", "accessJwt", "refreshJwt", "didDoc") if k in data})
+        if stored is not None:
+            await asyncio.to_thread(atproto._save_session, stored[0], session)
+        return True
+
+
+async def create_session(client: AsyncClient, handle: str, password: str) -> dict:
+    """atproto.create_session の非同期版。失敗時は RuntimeError を送出する"""
+    resp = await api_request(
+        client,
+        "POST",
+        f"{atproto.PDS_HOST}/xrpc/com.atproto.server.createSession",
+        json={"identifier": handle, "password": password},
+    )
+    if resp.status_code == 401:
+        raise RuntimeError("ログイン失敗: ハンドルまたはアプリパスワードが正しくありません")
+    if resp.status_code == 400:
+        raise RuntimeError(f"ログイン失敗: リクエストが不正です ({resp.text})")
+    if not resp.ok:
+        raise RuntimeError(f"ログイン失敗: {resp.status_code} {resp.text}")
+    data = resp.json()
+    print(f"✓ ログイン成功: {data['handle']} (DID: {data['did']})")
+    return data
+
+
+# ──────────────────────────────────────────────
+# blob（画像）アップロード
+# ──────────────────────────────────────────────
+
+async def find_existing_blob(client: AsyncClient, session: dict, file_path: Path,
+                             cid: str | None = None) -> dict | None:
+    """atproto.find_existing_blob の非同期版（ハッシュ計算はスレッドで行う）"""
+    if cid is None:
+        cid = await asyncio.to_thread(atproto.compute_cid, file_path)
+    resp = await api_request(
+        client,
+        "HEAD",
+        f"{atproto.PDS_HOST}/xrpc/com.atproto.sync.getBlob",
+        params={"did": session["did"], "cid": cid},
+        allow_redirects=True,
+        timeout=10,
+    )
+    if resp.status_code != 200:
+        return None
+
+    mime_type = resp.headers.get("Content-Type", "").split(";")[0].strip()
+    if not mime_type:
+        mime_type = mimetypes.guess_type(str(file_path))[0] or "application/octet-stream"
+    print(f"  ✓ PDSに存在: {file_path.name} → CID: {cid[:16]}…")
+    return {
+        "$type": "blob",
+        "ref": {"$link": cid},
+        "mimeType": mime_type,
+        "size": file_path.stat().st_size,
+    }
+
+
+async def upload_blob(client: AsyncClient, session: dict, file_path: Path, progress=None, *,
+                      skip_existing: bool = False, cid: str | None = None) -> dict:
+    """
+    atproto.upload_blob の非同期版。ファイルはチャンク単位でストリーム送信する。
+    失敗時は RuntimeError を送出する。
+    """
+    if skip_existing:
+        existing = await find_existing_blob(client, session, file_path, cid)
+        if existing is not None:
+            return existing
+
+    mime_type, _ = mimetypes.guess_type(str(file_path))
+    if mime_type is None:
+        mime_type = "application/octet-stream"
+
+    body = FileStream(file_path, progress)
+    started = time.monotonic()
+    resp = await api_request(
+        client,
+        "POST",
+        f"{atproto.PDS_HOST}/xrpc/com.atproto.repo.uploadBlob",
+        auth=session,
+        headers={"Content-Type": mime_type, "Content-Length": str(body.size)},
+        data=body,
+        timeout=60,
+    )
+    elapsed = time.monotonic() - started
+    if resp.status_code == 401:
+        raise RuntimeError(f"アップロード失敗 ({file_path.name}): 認証トークンが無効です。再ログインしてください。")
+    if resp.status_code == 413:
+        raise RuntimeError(f"アップロード失敗 ({file_path.name}): ファイルサイズが大きすぎます（--optimize で縮小できます）。")
+    if not resp.ok:
+        raise RuntimeError(f"アップロード失敗 ({file_path.name}): {resp.status_code} {resp.text}")
+
+    blob = resp.json()["blob"]
+    cid = blob["ref"]["$link"]
+    print(f"  ✓ アップロード完了: {file_path.name} ({atproto.format_throughput(body.size, elapsed)})"
+          f" → CID: {cid[:16]}…")
+    return blob
+
+
+# ──────────────────────────────────────────────
+# ハンドル解決
+# ──────────────────────────────────────────────
+
+async def resolve_handle(client: AsyncClient, handle: str) -> tuple[str | None, bool]:
+    """ハンドルをDIDに解決し (DID, 結果が確定したか) を返す（atproto.resolve_handle の asyncio 版）"""
+    resp = await api_request(
+        client,
+        "GET",
+        f"{atproto.PDS_HOST}/xrpc/com.atproto.identity.resolveHandle",
+        params={"handle": handle},
+        timeout=10,
+    )
+    if resp.ok:
+        return resp.json().get("did"), True
+    return None, resp.status_code == 400
+
+
+async def resolve_handle_to_did(client: AsyncClient, handle: str) -> str | None:
+    """ハンドルをDIDに解決する。失敗時はNoneを返す"""
+    return (await resolve_handle(client, handle))[0]
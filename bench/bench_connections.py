@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+bench_connections.py - 1回の投稿で開かれるTCP接続数を計測するベンチマーク
+
+ローカルに簡易PDSを立ち上げ、whtwnd_post の投稿フロー
+（createSession → uploadBlob × N → createRecord → listRecords）を実行して、
+サーバー側で accept した接続数とリクエスト数を表示する。
+
+使い方:
+  python bench/bench_connections.py              # 画像10枚
+  python bench/bench_connections.py --images 50
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import atproto  # noqa: E402
+import whtwnd_post  # noqa: E402
+
+_FAKE_CID = "bafkreihdwdcefgh4dqkjv67uzcmw7ojee6xedzdetojuzjevtenxquvyku"
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive を有効にする
+    stats: _Stats
+
+    def setup(self):
+        super().setup()
+        with self.stats.lock:
+            self.stats.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self):
+        with self.stats.lock:
+            self.stats.requests += 1
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        nsid = self.path.split("/xrpc/")[-1].split("?")[0]
+        if nsid == "com.atproto.server.createSession":
+            self._reply({"did": "did:plc:bench", "handle": "bench.test",
+                         "accessJwt": "a", "refreshJwt": "r"})
+        elif nsid == "com.atproto.repo.uploadBlob":
+            self._reply({"blob": {"$type": "blob", "ref": {"$link": _FAKE_CID},
+                                  "mimeType": "image/png", "size": length}})
+        elif nsid == "com.atproto.repo.createRecord":
+            self._reply({"uri": "at://did:plc:bench/com.whtwnd.blog.entry/3bench", "cid": _FAKE_CID})
+        elif nsid == "com.atproto.repo.listRecords":
+            self._reply({"records": [{"uri": "at://did:plc:bench/com.whtwnd.blog.entry/3bench",
+                                      "value": {"title": "bench"}}]})
+        else:
+            self._reply({})
+
+    def do_HEAD(self):
+        # getBlob の存在確認: 常に未アップロード扱い
+        with self.stats.lock:
+            self.stats.requests += 1
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_GET = _dispatch
+    do_POST = _dispatch
+
+
+def run_publish(host: str, md_file: Path) -> None:
+    """投稿フロー一式を実行する（出力は抑制しない）"""
+    atproto.PDS_HOST = host
+    session = atproto.create_session("bench.test", "password")
+    content, blobs = whtwnd_post.process_markdown_images(
+        md_file.read_text(encoding="utf-8"), md_file.parent, session,
+    )
+    whtwnd_post.post_entry(session, "bench", content, blobs)
+    whtwnd_post.find_rkey_by_title(session, "bench")
+
+
+def measure(keep_alive: bool, md_file: Path) -> tuple[int, int]:
+    stats = _Stats()
+    handler = type("Handler", (_Handler,), {"stats": stats})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        atproto.configure_client(keep_alive=keep_alive)
+        run_publish(f"http://127.0.0.1:{server.server_port}", md_file)
+    finally:
+        atproto.get_client().close()
+        server.shutdown()
+        server.server_close()
+    return stats.connections, stats.requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="投稿1回あたりの接続数を計測する")
+    parser.add_argument("--images", type=int, default=10, help="記事に含める画像数 (default: 10)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        lines = ["# bench", ""]
+        for i in range(args.images):
+            (tmp_dir / f"img{i}.png").write_bytes(b"\x89PNG" + bytes([i % 256]) * 1024)
+            lines.append(f"![img{i}](./img{i}.png)")
+        md_file = tmp_dir / "article.md"
+        md_file.write_text("\n".join(lines), encoding="utf-8")
+
+        results = {}
+        for keep_alive in (False, True):
+            results[keep_alive] = measure(keep_alive, md_file)
+
+    print(f"\n{'─'*50}")
+    print(f"{'モード':<16} {'接続数':>8} {'リクエスト数':>12}")
+    print(f"{'─'*50}")
+    for keep_alive, (conns, reqs) in results.items():
+        label = "keep-alive" if keep_alive else "毎回接続"
+        print(f"{label:<16} {conns:>8} {reqs:>12}")
+    print(f"{'─'*50}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+bench_daemon.py - デーモン経由と直接実行でのコマンド1回あたりの所要時間を比較するベンチマーク
+
+ローカルに簡易PDSを立ち上げ、`bsky_post.py post` を別プロセスとして繰り返し実行する。
+  - 直接実行: 毎回インタープリターを起動し、import・設定読み込み・ログイン（セッション再利用）・接続確立を行う
+  - デーモン経由: WHTWND_DAEMON=1 でこのプロセス内のデーモンにジョブを送る
+セッション・キャッシュは一時ディレクトリに作る（XDG_CACHE_HOME を差し替える）。
+
+使い方:
+  python bench/bench_daemon.py
+  python bench/bench_daemon.py --runs 50
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+_TMP = tempfile.mkdtemp()
+os.environ["XDG_CACHE_HOME"] = _TMP  # atproto を import する前に差し替える
+sys.path.insert(0, str(ROOT))
+
+import atproto  # noqa: E402
+import daemon  # noqa: E402
+
+_FAKE_CID = "bafyreihdwdcefgh4dqkjv67uzcmw7ojee6xedzdetojuzjevtenxquvyku"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        nsid = self.path.split("/xrpc/")[-1].split("?")[0]
+        if nsid == "com.atproto.server.createSession":
+            body = {"did": "did:plc:bench", "handle": "bench.test", "accessJwt": "a", "refreshJwt": "r"}
+        else:
+            body = {"uri": "at://did:plc:bench/app.bsky.feed.post/3bench", "cid": _FAKE_CID}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = _dispatch
+
+
+def timed_runs(command: list[str], env: dict, cwd: str, runs: int) -> list[float]:
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, env=env, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="デーモン経由と直接実行の所要時間を比較する")
+    parser.add_argument("--runs", type=int, default=20, help="それぞれの実行回数 (default: 20)")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"http://127.0.0.1:{server.server_port}"
+    atproto.PDS_HOST = host
+
+    work = Path(_TMP) / "work"
+    work.mkdir()
+    (work / ".bsky_config.json").write_text(json.dumps({"handle": "bench.test", "password": "p"}))
+
+    daemon.SOCKET_PATH = str(Path(_TMP) / "daemon.sock")
+    threading.Thread(target=daemon.serve, daemon=True).start()
+    while daemon._control("status") is None:
+        time.sleep(0.05)
+
+    env = {**os.environ, "WHTWND_DAEMON_SOCKET": daemon.SOCKET_PATH}
+    # 直接実行では PDS_HOST を差し替えてから main() を呼ぶ
+    direct = [sys.executable, "-c",
+              f"import sys; sys.path.insert(0, {str(ROOT)!r}); import atproto; atproto.PDS_HOST = {host!r}; "
+              "import bsky_post; sys.argv = ['bsky_post.py', 'post', 'ベンチマーク']; bsky_post.main()"]
+    via_daemon = [sys.executable, str(ROOT / "bsky_post.py"), "post", "ベンチマーク"]
+
+    t_direct = timed_runs(direct, env, str(work), args.runs)
+    t_daemon = timed_runs(via_daemon, {**env, "WHTWND_DAEMON": "1"}, str(work), args.runs)
+    daemon._control("stop")
+    server.shutdown()
+
+    print(f"\n{'─'*56}")
+    print(f"  bsky_post.py post × {args.runs}回（中央値 / 最小）")
+    print(f"  直接実行     : {statistics.median(t_direct) * 1000:7.1f} ms / {min(t_direct) * 1000:7.1f} ms")
+    print(f"  デーモン経由 : {statistics.median(t_daemon) * 1000:7.1f} ms / {min(t_daemon) * 1000:7.1f} ms")
+    print(f"  速度比       : {statistics.median(t_direct) / statistics.median(t_daemon):.1f}x")
+    print(f"{'─'*56}")
+
+
+if __name__ == "__main__":
+    main()
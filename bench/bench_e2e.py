@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+bench_e2e.py - 模擬PDS（bench/mock_pds.py）を相手にコマンドを実行し、操作ごとの通信量と所要時間を計測するベンチマーク
+
+本番の PDS に接続せずに、投稿・更新・タイトル検索・スキート投稿・同期の1操作あたりの
+リクエスト数（エンドポイント別）、送信バイト数、所要時間の p50 / p99、ピーク RSS を計測する。
+シナリオごとに新しい模擬PDSと子プロセスを使う（ピーク RSS をシナリオごとに分けるため）。
+子プロセスはログインと接続確立を済ませてから計測を始める。
+CLI の向き先は環境変数 WHTWND_PDS_HOST / WHTWND_WHITEWIND_HOST で模擬PDSに差し替え、
+キャッシュは一時ディレクトリに作る（XDG_CACHE_HOME を差し替える）。
+
+シナリオ:
+  post-50img        whtwnd_post.py post（ローカル画像50枚を参照する記事。画像は毎回異なる内容）
+  update            whtwnd_post.py update --title（100件の記事があるアカウント）
+  lookup-1000-cold  find_rkey_by_title()（1,000件・記事索引なし → listRecords を全件取得）
+  lookup-1000-warm  find_rkey_by_title()（1,000件・記事索引あり → 差分同期と getRecord による確認のみ）
+  skeet             bsky_post.py post（メンション1件・画像1枚）
+  sync-100          whtwnd_post.py sync（新規100件を applyWrites で書き込む）
+  export-1000       whtwnd_post.py export（記事1,000件・投稿5,000件を getRepo の1リクエストで書き出す）
+  mirror-500        whtwnd_post.py mirror-blobs --all（200KB の blob 500件を空のストアに並列ダウンロード）
+
+使い方:
+  python bench/bench_e2e.py
+  python bench/bench_e2e.py --scenario post-50img --scenario lookup-1000-cold --latency 30
+  python bench/bench_e2e.py --rate-limit 300/5 --inject-429 0.01
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "bench"))
+
+from mock_pds import MockPDS, parse_rate_limit  # noqa: E402
+
+# 名前 → (説明, 既定の実行回数)
+SCENARIOS = {
+    "post-50img": ("WhiteWind 投稿（画像50枚の記事）", 5),
+    "update": ("WhiteWind 更新（タイトル指定・100件中）", 20),
+    "lookup-1000-cold": ("タイトル検索（1,000件・索引なし）", 10),
+    "lookup-1000-warm": ("タイトル検索（1,000件・索引あり）", 20),
+    "skeet": ("Bluesky 投稿（メンション1件・画像1枚）", 20),
+    "sync-100": ("同期（新規100件）", 5),
+    "export-1000": ("書き出し（記事1,000件・投稿5,000件）", 5),
+    "mirror-500": ("blob のミラー（200KB × 500件）", 5),
+}
+_IMAGE_SIDE = 150  # ノイズ画像の一辺（約 68KB の PNG になる）
+_LOOKUP_TITLE = "記事 0007"  # 古い記事ほど全件取得の最後の方で見つかる
+
+
+def write_png(path: Path, side: int, seed: int):
+    """圧縮の効かないノイズの PNG を書き出す（Pillow を使わない）"""
+    rnd = random.Random(seed)
+    raw = b"".join(b"\0" + rnd.randbytes(side * 3) for _ in range(side))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    path.write_bytes(b"\x89PNG\r\n\x1a\n"
+                     + chunk(b"IHDR", struct.pack(">IIBBBBB", side, side, 8, 2, 0, 0, 0))
+                     + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b""))
+
+
+# ──────────────────────────────────────────────
+# 準備（親プロセス）
+# ──────────────────────────────────────────────
+
+def prepare(name: str, pds: MockPDS, work: Path, runs: int):
+    """シナリオに必要なファイルと模擬PDS上の記事を用意する"""
+    (work / ".bsky_config.json").write_text(json.dumps({"handle": pds.handle, "password": "bench"}))
+    if name == "post-50img":
+        for run in range(runs):
+            run_dir = work / f"run{run}"
+            run_dir.mkdir()
+            lines = [f"# 画像50枚の記事 {run}", ""]
+            for k in range(50):
+                write_png(run_dir / f"img{k:02d}.png", _IMAGE_SIDE, run * 100 + k)
+                lines.append(f"![図{k}](./img{k:02d}.png)")
+            (run_dir / "article.md").write_text("\n".join(lines) + "\n", encoding="utf-8")
+    elif name == "update":
+        title = pds.seed_entries(100)[42]
+        (work / "article.md").write_text(f"# {title}\n\n更新した本文\n", encoding="utf-8")
+    elif name.startswith("lookup-1000"):
+        pds.seed_entries(1000)
+    elif name == "skeet":
+        write_png(work / "photo.png", _IMAGE_SIDE, 1)
+    elif name == "export-1000":
+        pds.seed_entries(1000)
+        pds.seed_posts(5000)
+    elif name == "mirror-500":
+        pds.seed_blobs(500, 200 * 1024)
+    elif name == "sync-100":
+        for run in range(runs):
+            run_dir = work / f"run{run}"
+            run_dir.mkdir()
+            for k in range(100):
+                (run_dir / f"post{k:03d}.md").write_text(f"# 同期 {run}-{k}\n\n本文 {k}\n", encoding="utf-8")
+
+
+# ──────────────────────────────────────────────
+# 計測（子プロセス）
+# ──────────────────────────────────────────────
+
+def _run_main(module, argv: list[str]):
+    sys.argv = [f"{module.__name__}.py", *argv]
+    try:
+        module.main()
+    except SystemExit as e:
+        if e.code:
+            raise RuntimeError(f"{' '.join(argv)} が終了コード {e.code} で終了しました") from None
+
+
+def _make_op(name: str, work: Path):
+    """1回分の操作 op(i) を返す（ログインなどの準備はここで済ませる）"""
+    import atproto
+    import bsky_post
+    import entry_index
+    import whtwnd_post
+
+    config = atproto.load_config()
+    session = atproto.login(config["handle"], config["password"])
+    if name == "post-50img":
+        return lambda i: _run_main(whtwnd_post, ["post", str(work / f"run{i}" / "article.md")])
+    if name == "update":
+        title = (work / "article.md").read_text(encoding="utf-8").splitlines()[0][2:]
+        return lambda i: _run_main(whtwnd_post, ["update", "--title", title, str(work / "article.md")])
+    if name == "lookup-1000-cold":
+        return lambda i: whtwnd_post.find_rkey_by_title(
+            session, _LOOKUP_TITLE, entry_index.EntryIndex(work / f"entries{i}.sqlite3"))
+    if name == "lookup-1000-warm":
+        index = entry_index.EntryIndex(work / "entries.sqlite3")
+        index.rebuild(session)
+        return lambda i: whtwnd_post.find_rkey_by_title(session, _LOOKUP_TITLE, index)
+    if name == "skeet":
+        return lambda i: _run_main(bsky_post, ["post", f"ベンチマーク {i} @alice.test",
+                                               "--image", str(work / "photo.png")])
+    if name == "sync-100":
+        return lambda i: _run_main(whtwnd_post, ["sync", str(work / f"run{i}")])
+    if name == "export-1000":
+        return lambda i: _run_main(whtwnd_post, ["export", str(work / f"export{i}")])
+    if name == "mirror-500":
+        return lambda i: _run_main(whtwnd_post, ["mirror-blobs", str(work / f"blobs{i}"), "--all"])
+    raise ValueError(name)
+
+
+def _child(conn, name: str, work: str, runs: int):
+    os.chdir(work)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            op = _make_op(name, Path(work))
+        conn.send("ready")
+        conn.recv()
+        times = []
+        for i in range(runs):
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                op(i)
+            times.append(time.perf_counter() - started)
+        conn.send({"times": times, "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss})
+    except Exception as e:
+        conn.send({"error": f"{type(e).__name__}: {e}"})
+
+
+def percentile(values: list[float], p: float) -> float:
+    """最近接順位法によるパーセンタイル"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def run_scenario(name: str, runs: int, args) -> dict:
+    pds = MockPDS(latency=args.latency / 1000, jitter=args.jitter / 1000,
+                  rate_limit=args.rate_limit, inject_429=args.inject_429)
+    host = pds.start()
+    with tempfile.TemporaryDirectory() as tmp:
+        work = Path(tmp)
+        prepare(name, pds, work, runs)
+        os.environ.update({"WHTWND_PDS_HOST": host, "WHTWND_WHITEWIND_HOST": host,
+                           "XDG_CACHE_HOME": str(work / "cache")})
+        ctx = multiprocessing.get_context("spawn")  # 親の import・メモリを引き継がない
+        parent, child = ctx.Pipe()
+        proc = ctx.Process(target=_child, args=(child, name, str(work), runs))
+        proc.start()
+        message = parent.recv()
+        if message != "ready":
+            proc.join()
+            pds.stop()
+            raise RuntimeError(message["error"])
+        before = pds.snapshot()
+        parent.send("go")
+        result = parent.recv()
+        after = pds.snapshot()
+        proc.join()
+    pds.stop()
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    result["requests"] = after["requests"] - before["requests"]
+    result["status"] = after["status"] - before["status"]
+    result["bytes_in"] = after["bytes_in"] - before["bytes_in"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模擬PDSを相手に操作ごとの通信量と所要時間を計測する")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="実行するシナリオ（複数回指定可。省略時は全て）")
+    parser.add_argument("--runs", type=int, help="各シナリオの実行回数（省略時はシナリオごとの既定値）")
+    parser.add_argument("--latency", type=float, default=0, metavar="MS", help="模擬PDSの応答遅延 ms (default: 0)")
+    parser.add_argument("--jitter", type=float, default=0, metavar="MS", help="応答遅延に上乗せする乱数の幅 ms")
+    parser.add_argument("--rate-limit", type=parse_rate_limit, metavar="N/SEC",
+                        help="模擬PDSのレート制限（例: 300/5）")
+    parser.add_argument("--inject-429", type=float, default=0, metavar="P", help="この確率で 429 を返す")
+    args = parser.parse_args()
+
+    print(f"\n{'─'*72}")
+    print(f"  模擬PDS: 遅延 {args.latency:g} ms (+0〜{args.jitter:g} ms)"
+          + (f"  レート制限 {args.rate_limit[0]}/{args.rate_limit[1]}秒" if args.rate_limit else "")
+          + (f"  429注入 {args.inject_429:.1%}" if args.inject_429 else ""))
+    print(f"{'─'*72}")
+    print(f"  {'シナリオ':<18} {'回数':>4} {'req/op':>7} {'送信/op':>10} {'p50':>9} {'p99':>9} {'RSS':>8}")
+    for name in args.scenario or SCENARIOS:
+        description, default_runs = SCENARIOS[name]
+        runs = args.runs or default_runs
+        try:
+            result = run_scenario(name, runs, args)
+        except RuntimeError as e:
+            print(f"  {name:<22} エラー: {e}")
+            continue
+        times = result["times"]
+        total = sum(result["requests"].values())
+        print(f"  {name:<22} {runs:>4} {total / runs:>7.1f} {result['bytes_in'] / runs / 1024:>7.1f} KB"
+              f" {statistics.median(times) * 1000:>6.1f} ms {percentile(times, 99) * 1000:>6.1f} ms"
+              f" {result['rss_kb'] / 1024:>5.1f} MB")
+        breakdown = ", ".join(f"{nsid.rsplit('.', 1)[-1]} {count / runs:g}"
+                              for nsid, count in result["requests"].most_common())
+        print(f"      {description}: {breakdown}")
+        if result["status"].get(429):
+            print(f"      429: {result['status'][429]}回")
+    print(f"{'─'*72}")
+
+
+if __name__ == "__main__":
+    main()
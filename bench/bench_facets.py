@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+bench_facets.py - detect_facets の実行時間を計測するベンチマーク
+
+日本語（マルチバイト）を含むテキストに URL・@メンション・#ハッシュタグを散りばめ、
+テキスト長を変えながら現在の実装と旧実装（一致ごとに先頭からエンコードしてバイト位置を求める）を比較する。
+両者の出力が一致することも確認する。メンションは解決済みの DID を渡すのでネットワークは使わない。
+
+使い方:
+  python bench/bench_facets.py
+  python bench/bench_facets.py --sizes 300,3000,30000 --repeat 20
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bsky_post  # noqa: E402
+
+_WORDS = [
+    "今日は", "良い天気", "ですね。", "日本語の", "テキスト", "を書いています", "🎉", "絵文字も",
+    "https://example.com/path?q=1", "https://例え.jp/記事#見出し", "@alice.bsky.social", "@bob.test",
+    "#日本語タグ", "#python", "(括弧)", "「かぎ括弧」", "email@example.com", "abc#notag",
+]
+
+
+def old_detect_facets(text: str, resolved: dict[str, str | None]) -> list:
+    """旧実装（種類別に3回走査し、一致ごとに text[:pos].encode() でバイト位置を求める）"""
+    facets = []
+    url_re = re.compile(bsky_post._URL_PATTERN)
+    for m in url_re.finditer(text):
+        facets.append({
+            "index": {"byteStart": len(text[:m.start()].encode("UTF-8")),
+                      "byteEnd": len(text[:m.end()].encode("UTF-8"))},
+            "features": [{"$type": "app.bsky.richtext.facet#link", "uri": m.group()}],
+        })
+    for m in bsky_post.MENTION_RE.finditer(text):
+        did = resolved.get(m.group(1))
+        if did is None:
+            continue
+        facets.append({
+            "index": {"byteStart": len(text[:m.start()].encode("UTF-8")),
+                      "byteEnd": len(text[:m.end()].encode("UTF-8"))},
+            "features": [{"$type": "app.bsky.richtext.facet#mention", "did": did}],
+        })
+    tag_re = re.compile(bsky_post._TAG_PATTERN)
+    for m in tag_re.finditer(text):
+        facets.append({
+            "index": {"byteStart": len(text[:m.start()].encode("UTF-8")),
+                      "byteEnd": len(text[:m.end()].encode("UTF-8"))},
+            "features": [{"$type": "app.bsky.richtext.facet#tag", "tag": m.group(1)}],
+        })
+    return facets
+
+
+def make_text(chars: int, rng: random.Random) -> str:
+    parts = []
+    length = 0
+    while length < chars:
+        word = rng.choice(_WORDS)
+        parts.append(word)
+        length += len(word) + 1
+    return " ".join(parts)[:chars]
+
+
+def timeit(func, repeat: int) -> float:
+    """repeat 回実行したうちの最短時間（秒）を返す"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="detect_facets の実行時間を計測する")
+    parser.add_argument("--sizes", default="300,3000,30000,100000", help="テキスト長（文字数、カンマ区切り）")
+    parser.add_argument("--repeat", type=int, default=5, help="各計測の繰り返し回数 (default: 5)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    resolved = {"alice.bsky.social": "did:plc:alice", "bob.test": None}
+
+    print(f"\n{'─'*64}")
+    print(f"{'文字数':>8} {'facet数':>8} {'旧実装':>12} {'現在':>12} {'速度比':>8}  出力")
+    print(f"{'─'*64}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        text = make_text(size, rng)
+        old = old_detect_facets(text, resolved)
+        new = bsky_post.detect_facets(text, resolved=resolved)
+        t_old = timeit(lambda: old_detect_facets(text, resolved), args.repeat)
+        t_new = timeit(lambda: bsky_post.detect_facets(text, resolved=resolved), args.repeat)
+        same = "一致" if old == new else "不一致"
+        print(f"{size:>8} {len(new):>8} {t_old * 1000:>9.2f} ms {t_new * 1000:>9.2f} ms "
+              f"{t_old / t_new:>7.1f}x  {same}")
+        if old != new:
+            sys.exit(1)
+    print(f"{'─'*64}")
+
+
+if __name__ == "__main__":
+    main()
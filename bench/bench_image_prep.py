@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+bench_image_prep.py - 画像の前処理（image_prep）の削減量と並列化の効果を計測するベンチマーク
+
+スマートフォンの写真に近い画像（4032x3024・JPEG 品質95・EXIF 付き）を生成し、
+既定の設定で前処理したときのアップロードバイト数の削減率と、
+1プロセス / 複数プロセスでの変換時間を比較する。派生ファイルは一時ディレクトリに書き出す。
+
+使い方:
+  python bench/bench_image_prep.py                # 写真8枚
+  python bench/bench_image_prep.py --images 16 --jobs 8
+
+要 Pillow: pip install Pillow
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import image_prep  # noqa: E402
+
+image_prep.require_pillow()
+from PIL import Image, ImageDraw, ImageFilter  # noqa: E402
+
+
+def make_photo(path: Path, seed: int, size: tuple[int, int] = (4032, 3024)) -> None:
+    """グラデーション・図形・ノイズを重ねた写真風の画像を EXIF 付きで保存する"""
+    rng = random.Random(seed)
+    w, h = size
+    base = Image.linear_gradient("L").resize(size).convert("RGB")
+    tint = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    im = Image.blend(base, tint, 0.5)
+    draw = ImageDraw.Draw(im)
+    for _ in range(40):
+        x, y = rng.randrange(w), rng.randrange(h)
+        r = rng.randrange(50, 600)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    im = im.filter(ImageFilter.GaussianBlur(8))
+    noise = Image.effect_noise(size, 24).convert("RGB")
+    im = Image.blend(im, noise, 0.12)
+    exif = Image.Exif()
+    exif[0x010F] = "BenchCamera"  # Make
+    exif[0x0112] = 1              # Orientation
+    im.save(path, "JPEG", quality=95, exif=exif.tobytes())
+
+
+def run(paths: list[Path], jobs: int, cache_dir: Path) -> tuple[float, dict]:
+    image_prep.CACHE_DIR = cache_dir
+    started = time.monotonic()
+    result = image_prep.prepare_images(paths, image_prep.make_options(), jobs=jobs)
+    return time.monotonic() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="画像の前処理の削減量と並列化の効果を計測する")
+    parser.add_argument("--images", type=int, default=8, help="生成する写真の枚数 (default: 8)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="並列実行時のプロセス数 (default: CPU数)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        paths = []
+        for i in range(args.images):
+            path = tmp_dir / f"IMG_{i:04d}.jpg"
+            make_photo(path, i)
+            paths.append(path)
+
+        t_serial, _ = run(paths, 1, tmp_dir / "serial")
+        t_parallel, result = run(paths, args.jobs, tmp_dir / "parallel")
+        t_cached, _ = run(paths, args.jobs, tmp_dir / "parallel")
+
+        src_total = sum(p.stat().st_size for p in paths)
+        out_total = sum(result[p].stat().st_size for p in paths)
+        with Image.open(result[paths[0]]) as im:
+            exif_left = len(im.getexif())
+
+    print(f"\n{'─'*56}")
+    print(f"  元画像         : {args.images}枚 {src_total / 1024 / 1024:.1f} MB")
+    print(f"  前処理後       : {out_total / 1024 / 1024:.1f} MB  (1/{src_total / out_total:.1f})")
+    print(f"  残った EXIF    : {exif_left}件")
+    print(f"  1プロセス      : {t_serial:.2f} s")
+    print(f"  {args.jobs}プロセス{'':<6}: {t_parallel:.2f} s  ({t_serial / t_parallel:.1f}x)")
+    print(f"  キャッシュ命中 : {t_cached:.2f} s")
+    print(f"{'─'*56}")
+
+
+if __name__ == "__main__":
+    main()
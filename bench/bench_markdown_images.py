@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+bench_markdown_images.py - Markdown の画像参照の走査・置換の実行時間を計測するベンチマーク
+
+生成した API リファレンス風の文書（見出し・説明・画像・コードブロック・インラインコード・表が続く）で、
+現在の実装（markdown_images.scan → splice）と旧実装（正規表現1本の finditer と、コールバックの re.sub）を比較する。
+文書のコード部分にはサンプルの画像パス（"sample/…"）を書いてあり、旧実装がそれを画像として拾う件数も表示する。
+ファイルの存在確認とアップロードは行わず、走査と置換だけを計測する。
+
+使い方:
+  python bench/bench_markdown_images.py
+  python bench/bench_markdown_images.py --sizes 200,2000 --repeat 10
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import markdown_images  # noqa: E402
+
+OLD_IMAGE_PATTERN = re.compile(r'!\[([^\]]*)\]\(([^)]+)\)')
+
+
+def old_scan_and_substitute(content: str, urls: dict[str, str]) -> tuple[list[str], str]:
+    """旧実装（参照先を正規表現で集め、re.sub のコールバックで ![alt](URL) を組み立て直す）"""
+    paths = list(dict.fromkeys(m.group(2).strip() for m in OLD_IMAGE_PATTERN.finditer(content)))
+
+    def replace_image(match):
+        url = urls.get(match.group(2).strip())
+        if url is None:
+            return match.group(0)
+        return f"![{match.group(1)}]({url})"
+
+    return paths, OLD_IMAGE_PATTERN.sub(replace_image, content)
+
+
+def new_scan_and_substitute(content: str, urls: dict[str, str]) -> tuple[list[str], str]:
+    refs = markdown_images.scan(content)
+    paths = list(dict.fromkeys(path for _, _, path, _ in refs))
+    return paths, markdown_images.splice(content, refs, urls)
+
+
+def make_document(kb: int, rng: random.Random) -> str:
+    """API リファレンス風の文書を kb KB 程度生成する"""
+    sections = []
+    size = 0
+    i = 0
+    while size < kb * 1024:
+        name = f"endpoint_{i:05d}"
+        section = "\n".join([
+            f"## `{name}()`",
+            "",
+            f"{name} はリクエストを処理して結果を返します。引数 `path` には `![図](sample/{i}.png)` のような",
+            "Markdown を渡せます。詳しくは [概要](#overview) を参照してください。",
+            "",
+            f"![{name} のシーケンス図](./images/{name}.png \"{name}\")",
+            "",
+            "| 引数 | 型 | 説明 |",
+            "|---|---|---|",
+            "| path | str | 画像のパス |",
+            "| width | int | 幅 |",
+            "",
+            "```python",
+            f"result = client.{name}(\"![example](sample/{name}.png)\")",
+            f"print(result)  # ![out](sample/out_{i}.png)",
+            "```",
+            "",
+            f"<img src=\"./images/{name}_detail.png\" width=\"{rng.randint(200, 800)}\">",
+            "",
+        ])
+        sections.append(section)
+        size += len(section.encode("utf-8"))
+        i += 1
+    return "\n".join(sections)
+
+
+def timeit(func, repeat: int) -> float:
+    """repeat 回実行したうちの最短時間（秒）を返す"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Markdown の画像参照の走査・置換の実行時間を計測する")
+    parser.add_argument("--sizes", default="20,200,2000", help="文書のサイズ（KB、カンマ区切り）")
+    parser.add_argument("--repeat", type=int, default=5, help="各計測の繰り返し回数 (default: 5)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"\n{'─'*72}")
+    print(f"{'サイズ':>8} {'旧:画像':>7} {'うちコード内':>6} {'現在:画像':>8} {'旧実装':>12} {'現在':>12} {'速度比':>8}")
+    print(f"{'─'*72}")
+    for kb in (int(s) for s in args.sizes.split(",")):
+        doc = make_document(kb, rng)
+        old_paths, _ = old_scan_and_substitute(doc, {})
+        new_paths, _ = new_scan_and_substitute(doc, {})
+        urls = {p: f"https://pds.example/xrpc/com.atproto.sync.getBlob?cid={i}" for i, p in enumerate(old_paths + new_paths)}
+        in_code = sum(1 for p in old_paths if p.startswith("sample/"))
+        if any(p.startswith("sample/") for p in new_paths):
+            print("  ✗ 現在の実装がコード内のサンプルを画像として扱っています")
+            sys.exit(1)
+        t_old = timeit(lambda: old_scan_and_substitute(doc, urls), args.repeat)
+        t_new = timeit(lambda: new_scan_and_substitute(doc, urls), args.repeat)
+        print(f"{len(doc.encode('utf-8')) / 1024:>6.0f}KB {len(old_paths):>8} {in_code:>12} {len(new_paths):>10}"
+              f" {t_old * 1000:>9.2f} ms {t_new * 1000:>9.2f} ms {t_old / t_new:>7.1f}x")
+    print(f"{'─'*72}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+bench_rate_limit.py - レート制限下での一括書き込みのスループットと 429 の回数を計測するベンチマーク
+
+ローカルに簡易PDSを立ち上げ、createRecord に固定ウィンドウのポイント制限
+（1リクエスト3ポイント、ratelimit-* ヘッダー付き）をかける。
+複数プロセス × 複数スレッドから createRecord を送り、次の2通りを比較する。
+  - スケジューラーあり: rate_limit.RateLimiter で送信前にペースを決める（記録ファイルをプロセス間で共有）
+  - スケジューラーなし: 429 を受けてからリセットまで待つ
+理論上の最短時間（最後のウィンドウは即座に送れるものとする）も表示する。
+スケジューラーありでは残りが予備分（上限の10%）を割ると間隔を空けて送るため、最後のウィンドウの分だけ長くなる。
+
+使い方:
+  python bench/bench_rate_limit.py
+  python bench/bench_rate_limit.py --requests 120 --processes 3 --threads 4 --limit 60 --window 4
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import atproto  # noqa: E402
+import rate_limit  # noqa: E402
+
+_COST = 3  # createRecord 1回あたりのポイント
+
+
+class _Window:
+    """固定ウィンドウのポイント制限（プロセス内のスレッド間で共有）"""
+
+    def __init__(self, limit: int, window: int):
+        self.limit = limit
+        self.window = window
+        self.lock = threading.Lock()
+        self.start = 0
+        self.used = 0
+        self.accepted = 0
+        self.rejected = 0
+
+    def take(self) -> tuple[bool, dict]:
+        with self.lock:
+            now = time.time()
+            start = int(now) // self.window * self.window
+            if start != self.start:
+                self.start, self.used = start, 0
+            ok = self.used + _COST <= self.limit
+            if ok:
+                self.used += _COST
+                self.accepted += 1
+            else:
+                self.rejected += 1
+            headers = {"ratelimit-limit": str(self.limit),
+                       "ratelimit-remaining": str(self.limit - self.used),
+                       "ratelimit-reset": str(start + self.window)}
+            return ok, headers
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    limiter: _Window
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        ok, headers = self.limiter.take()
+        body = json.dumps({"uri": "at://did:plc:bench/app.bsky.feed.post/3bench", "cid": "bafy"}
+                          if ok else {"error": "RateLimitExceeded"}).encode()
+        self.send_response(200 if ok else 429)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _NoScheduler:
+    """送信前に待たない（429 を受けてから待つ）"""
+
+    def reserve(self, url):
+        return 0.0
+
+    def observe(self, url, status, headers):
+        pass
+
+    def release(self, url):
+        pass
+
+
+def _worker(host: str, state_path: str | None, count: int, threads: int) -> None:
+    atproto.PDS_HOST = host
+    atproto._rate_limiter = rate_limit.RateLimiter(Path(state_path)) if state_path else _NoScheduler()
+    url = f"{host}/xrpc/com.atproto.repo.createRecord"
+
+    def create(_):
+        resp = atproto.api_request("POST", url, json={"record": {}}, timeout=15)
+        assert resp.ok, resp.status_code
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(create, range(count)))
+
+
+def run(args, scheduler: bool) -> tuple[float, _Window]:
+    window = _Window(args.limit, args.window)
+    _Handler.limiter = window
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"http://127.0.0.1:{server.server_port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state_path = str(Path(tmp) / "ratelimit.json") if scheduler else None
+        per_process = math.ceil(args.requests / args.processes)
+        # 最初のウィンドウの途中から始めないよう、次の境界まで待つ
+        time.sleep(args.window - time.time() % args.window)
+        started = time.monotonic()
+        procs = [multiprocessing.Process(target=_worker, args=(host, state_path, per_process, args.threads))
+                 for _ in range(args.processes)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        elapsed = time.monotonic() - started
+    server.shutdown()
+    return elapsed, window
+
+
+def main():
+    parser = argparse.ArgumentParser(description="レート制限下での一括書き込みのスループットを計測する")
+    parser.add_argument("--requests", type=int, default=60, help="createRecord の総数 (default: 60)")
+    parser.add_argument("--processes", type=int, default=2, help="同時に動かすプロセス数 (default: 2)")
+    parser.add_argument("--threads", type=int, default=4, help="プロセスあたりのスレッド数 (default: 4)")
+    parser.add_argument("--limit", type=int, default=45, help="ウィンドウあたりのポイント上限 (default: 45)")
+    parser.add_argument("--window", type=int, default=3, help="ウィンドウの長さ（秒） (default: 3)")
+    args = parser.parse_args()
+
+    per_window = args.limit // _COST
+    ideal = (math.ceil(args.requests / per_window) - 1) * args.window  # 最後のウィンドウは即座に送れる
+
+    print(f"\n{'─'*60}")
+    print(f"  制限: {args.limit}ポイント / {args.window}秒（1リクエスト{_COST}ポイント → {per_window}件）")
+    print(f"  送信: {args.requests}件（{args.processes}プロセス × {args.threads}スレッド）")
+    print(f"  理論上の最短時間: {ideal:.1f} s")
+    print(f"{'─'*60}")
+    for scheduler in (True, False):
+        elapsed, window = run(args, scheduler)
+        label = "スケジューラーあり" if scheduler else "スケジューラーなし"
+        print(f"  {label}: {elapsed:6.2f} s  成功 {window.accepted}件  429 {window.rejected}回")
+    print(f"{'─'*60}")
+
+
+if __name__ == "__main__":
+    main()
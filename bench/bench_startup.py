@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+bench_startup.py - 通信しないコマンドの起動時間を計測し、予算内に収まっているか確認するベンチマーク
+
+スクリプトや git フックから何千回も呼び出す場合、import の固定費が実行時間の大半になる。
+次のコマンドをそれぞれ別プロセスで繰り返し実行し、実時間の中央値から
+インタープリター自体の起動時間（python -c pass）を引いたものを「スクリプトの起動コスト」とする。
+  - whtwnd_post.py --help / bsky_post.py --help
+  - 引数エラー（whtwnd_post.py post にファイルを指定しない）
+  - 変更のない sync（マニフェストと一致するディレクトリ。ログインもしない）
+あわせて -X importtime で読み込まれたモジュールを調べ、通信用の重いモジュール
+（requests・ssl・asyncio など）が読み込まれていないことを確認する。
+--help と引数エラーでは、キャッシュ・記事索引用の sqlite3 も読み込まれていないことを確認する。
+どれかが予算を超えるか重いモジュールを読み込んでいれば終了コード 1 で終わる（CI での退行検知用）。
+
+起動コストには import のほか、スクリプト本体のコンパイル（直接実行したスクリプトは .pyc にキャッシュされない）と
+argparse のパーサー構築が含まれる。これ以上縮める必要がある場合はデーモン（daemon.py）を使う。
+
+キャッシュは一時ディレクトリに作る（XDG_CACHE_HOME を差し替える）。
+
+使い方:
+  python bench/bench_startup.py
+  python bench/bench_startup.py --runs 50 --budget 40
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+_TMP = tempfile.mkdtemp()
+os.environ["XDG_CACHE_HOME"] = _TMP  # atproto を import する前に差し替える
+sys.path.insert(0, str(ROOT))
+
+import blob_cache  # noqa: E402
+import whtwnd_post  # noqa: E402
+
+DEFAULT_BUDGET = 60.0  # スクリプトの起動コストの上限（ms）
+# 通信するコマンドでだけ必要なモジュール
+HEAVY_MODULES = ("requests", "urllib3", "ssl", "asyncio", "aiohttp", "concurrent.futures", "PIL", "mimetypes")
+# キャッシュ・記事索引を使うコマンドでだけ必要なモジュール（--help・引数エラーでは読み込まない）
+CACHE_MODULES = ("sqlite3",)
+
+
+def make_synced_dir() -> Path:
+    """マニフェストと内容が一致している（sync しても何も書き込まない）ディレクトリを作る"""
+    root = Path(_TMP) / "posts"
+    root.mkdir()
+    cache = blob_cache.BlobCache()
+    entries = {}
+    for i in range(20):
+        md_file = root / f"post{i:02d}.md"
+        md_file.write_text(f"# 記事 {i}\n\n本文です。\n", encoding="utf-8")
+        title = whtwnd_post.extract_h1_title(md_file.read_text(encoding="utf-8"))
+        fingerprint, images = whtwnd_post.source_fingerprint(
+            md_file.read_text(encoding="utf-8"), root, title, "public", cache)
+        entries[md_file.name] = {"rkey": f"3bench{i:02d}", "title": title, "sourceHash": fingerprint,
+                                 "images": images, "renderedHash": "", "createdAt": "", "cid": None}
+    whtwnd_post.save_manifest(root / whtwnd_post.MANIFEST_NAME,
+                              {"version": 1, "did": "did:plc:bench", "entries": entries})
+    return root
+
+
+def timed_runs(command: list[str], runs: int) -> list[float]:
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, cwd=_TMP, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def imported_modules(command: list[str]) -> list[tuple[str, int, bool]]:
+    """-X importtime の出力から (モジュール名, 累積 µs, トップレベルの import か) を読み込み順に返す"""
+    proc = subprocess.run([command[0], "-X", "importtime", *command[1:]], cwd=_TMP,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        modules.append((name.strip(), int(cumulative), not name[1:].startswith(" ")))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="通信しないコマンドの起動時間を計測する")
+    parser.add_argument("--runs", type=int, default=20, help="それぞれの実行回数 (default: 20)")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET,
+                        help=f"スクリプトの起動コストの上限 ms (default: {DEFAULT_BUDGET:g})")
+    args = parser.parse_args()
+
+    python = sys.executable
+    synced = make_synced_dir()
+    # (表示名, コマンド, 読み込んではいけないモジュール)
+    scenarios = [
+        ("whtwnd_post.py --help", [python, str(ROOT / "whtwnd_post.py"), "--help"],
+         HEAVY_MODULES + CACHE_MODULES),
+        ("bsky_post.py --help", [python, str(ROOT / "bsky_post.py"), "--help"],
+         HEAVY_MODULES + CACHE_MODULES),
+        ("whtwnd_post.py post（引数エラー）", [python, str(ROOT / "whtwnd_post.py"), "post"],
+         HEAVY_MODULES + CACHE_MODULES),
+        ("whtwnd_post.py sync（変更なし）", [python, str(ROOT / "whtwnd_post.py"), "sync", str(synced)],
+         HEAVY_MODULES),
+    ]
+
+    baseline = statistics.median(timed_runs([python, "-c", "pass"], args.runs))
+    interpreter_modules = {name for name, _, _ in imported_modules([python, "-c", "pass"])}
+    print(f"\n{'─'*56}")
+    print(f"  インタープリターの起動 (python -c pass): {baseline * 1000:6.1f} ms")
+    print(f"  予算: スクリプトの起動コスト {args.budget:g} ms 以内（{args.runs}回の中央値）")
+    print(f"{'─'*56}")
+
+    failed = False
+    for label, command, forbidden in scenarios:
+        overhead = (statistics.median(timed_runs(command, args.runs)) - baseline) * 1000
+        modules = imported_modules(command)
+        names = {name for name, _, _ in modules}
+        heavy = [m for m in forbidden if m in names]
+        ok = overhead <= args.budget and not heavy
+        failed |= not ok
+        print(f"  {'✓' if ok else '✗'} +{overhead:6.1f} ms  {label}")
+        if heavy:
+            print(f"      不要なモジュールを読み込んでいます: {', '.join(heavy)}")
+        # スクリプトが読み込んだトップレベルのモジュールのうち時間のかかったもの
+        top = sorted(((us, name) for name, us, toplevel in modules
+                      if toplevel and name not in interpreter_modules), reverse=True)[:4]
+        print("      " + ", ".join(f"{name} {us / 1000:.1f} ms" for us, name in top))
+    print(f"{'─'*56}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+bench_upload_memory.py - upload_blob のピークメモリ（RSS）を計測するベンチマーク
+
+ローカルの簡易PDS（受信データを読み捨てる）に対して大きなファイルをアップロードし、
+アップロード前後のピークRSSの増分とスループットを表示する。
+比較のため、旧実装相当（f.read() で全体を読み込んでから送信）も別プロセスで計測する。
+
+使い方:
+  python bench/bench_upload_memory.py            # 100 MB
+  python bench/bench_upload_memory.py --mb 500
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import atproto  # noqa: E402
+
+_FAKE_CID = "bafkreihdwdcefgh4dqkjv67uzcmw7ojee6xedzdetojuzjevtenxquvyku"
+
+
+class _DiscardHandler(BaseHTTPRequestHandler):
+    """受信したボディを64KBずつ読み捨てる uploadBlob"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        remaining = int(self.headers.get("Content-Length") or 0)
+        size = remaining
+        while remaining:
+            remaining -= len(self.rfile.read(min(remaining, 1 << 16)))
+        data = json.dumps({"blob": {"$type": "blob", "ref": {"$link": _FAKE_CID},
+                                    "mimeType": "application/octet-stream", "size": size}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _peak_rss_mb() -> float:
+    # Linux の ru_maxrss は KB 単位
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_one(mode: str, file_path: Path) -> None:
+    """1つのモードを計測して結果をJSONで標準出力に書く（子プロセスで実行される）"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _DiscardHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    atproto.PDS_HOST = f"http://127.0.0.1:{server.server_port}"
+    session = {"did": "did:plc:bench", "handle": "bench.test", "accessJwt": "a", "refreshJwt": "r"}
+
+    before = _peak_rss_mb()
+    started = time.monotonic()
+    if mode == "stream":
+        atproto.upload_blob(session, file_path)
+    else:
+        data = file_path.read_bytes()
+        atproto.api_request("POST", f"{atproto.PDS_HOST}/xrpc/com.atproto.repo.uploadBlob",
+                            auth=session, data=data, timeout=60)
+    elapsed = time.monotonic() - started
+    print(json.dumps({"rss_delta": _peak_rss_mb() - before, "elapsed": elapsed}))
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="upload_blob のピークRSSを計測する")
+    parser.add_argument("--mb", type=int, default=100, help="アップロードするファイルサイズ (default: 100)")
+    parser.add_argument("--mode", choices=["stream", "read"], help=argparse.SUPPRESS)
+    parser.add_argument("--file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_one(args.mode, Path(args.file))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = Path(tmp) / "large.bin"
+        with open(file_path, "wb") as f:
+            chunk = bytes(range(256)) * 4096  # 1 MB
+            for _ in range(args.mb):
+                f.write(chunk)
+
+        results = {}
+        for mode in ("read", "stream"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--file", str(file_path)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            results[mode] = json.loads(out.strip().splitlines()[-1])
+
+    size = args.mb * 1024 * 1024
+    print(f"\n{'─'*60}")
+    print(f"{'方式':<20} {'ピークRSS増分':>14} {'スループット':>20}")
+    print(f"{'─'*60}")
+    for mode, label in (("read", "全体読み込み (旧)"), ("stream", "ストリーム送信")):
+        r = results[mode]
+        print(f"{label:<20} {r['rss_delta']:>11.1f} MB {atproto.format_throughput(size, r['elapsed']):>20}")
+    print(f"{'─'*60}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+mock_pds.py - ベンチマーク用のローカル模擬 PDS / WhiteWind AppView
+
+本番の PDS に接続せずに投稿・更新・検索の処理を計測するための簡易サーバー。
+レコードと blob はメモリ上に保持し、CID は本物と同じ方法（dag_cbor / sha256）で計算する。
+
+対応エンドポイント:
+  com.atproto.server.createSession / refreshSession
+  com.atproto.repo.uploadBlob / createRecord / putRecord / applyWrites / deleteRecord / getRecord / listRecords
+  com.atproto.sync.getBlob（HEAD・GET。Range: bytes=N- に対応）/ listBlobs
+  com.atproto.sync.getRepo（since 対応。MST は全レコードを1つのノードに並べる）
+  com.atproto.identity.resolveHandle（"*.test" のハンドルを解決する）
+  com.whtwnd.blog.notifyOfNewEntry
+
+オプション:
+  latency / jitter : 応答前の待ち時間（秒）。jitter 分だけ一様乱数で上乗せする
+  rate_limit       : (ポイント上限, ウィンドウ秒)。全リクエストに ratelimit-* ヘッダーを付け、超えたら 429 を返す
+  inject_429       : この確率で 429（1秒後にリセット）を返す
+  access_ttl       : accessJwt の有効期限（秒）。短くすると refreshSession の経路を計測できる
+
+単体でも起動できる（CLI を向けるには環境変数 WHTWND_PDS_HOST / WHTWND_WHITEWIND_HOST を設定する）:
+  python bench/mock_pds.py --port 2583 --latency 20 --rate-limit 300/60
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import atproto  # noqa: E402
+import dag_cbor  # noqa: E402
+
+_AUTH_FREE = {"com.atproto.server.createSession", "com.atproto.server.refreshSession",
+              "com.atproto.identity.resolveHandle", "com.atproto.sync.getBlob", "com.atproto.sync.getRepo",
+              "com.atproto.sync.listBlobs"}
+
+
+def _token(kind: str, did: str, ttl: float) -> str:
+    """exp 付きの JWT 形式のトークン（署名は検証しない）"""
+    def part(obj):
+        return base64.urlsafe_b64encode(json.dumps(obj).encode()).decode().rstrip("=")
+    nonce = random.getrandbits(32)
+    return ".".join([part({"alg": "none"}), part({"sub": did, "scope": kind, "exp": time.time() + ttl,
+                                                 "n": nonce}), "sig"])
+
+
+def _token_payload(token: str) -> dict | None:
+    try:
+        payload = token.split(".")[1]
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (IndexError, ValueError):
+        return None
+
+
+class MockPDS:
+    """メモリ上にリポジトリを持つ模擬 PDS。start() でバックグラウンドのスレッドで待ち受ける"""
+
+    def __init__(self, *, handle: str = "bench.test", did: str = "did:plc:bench",
+                 latency: float = 0.0, jitter: float = 0.0,
+                 rate_limit: tuple[int, int] | None = None, inject_429: float = 0.0,
+                 access_ttl: float = 3600):
+        self.handle = handle
+        self.did = did
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.inject_429 = inject_429
+        self.access_ttl = access_ttl
+        self.lock = threading.Lock()
+        self.records: dict[str, dict[str, dict]] = {}  # コレクション → rkey → {"cid", "value"}
+        self.revs: dict[tuple[str, str], str] = {}     # (コレクション, rkey) → 書き込んだリビジョン
+        self.blobs: dict[str, dict] = {}               # CID → {"mimeType", "size", "data"}
+        self.window_start = 0
+        self.window_used = 0
+        self.reset_stats()
+        self._server: ThreadingHTTPServer | None = None
+
+    # ── 状態 ──
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {"requests": Counter(), "status": Counter(), "bytes_in": 0, "bytes_out": 0}
+
+    def snapshot(self) -> dict:
+        """統計のコピー {"requests": NSID → 回数, "status": ステータス → 回数, "bytes_in", "bytes_out"}"""
+        with self.lock:
+            return {"requests": Counter(self.stats["requests"]), "status": Counter(self.stats["status"]),
+                    "bytes_in": self.stats["bytes_in"], "bytes_out": self.stats["bytes_out"]}
+
+    def seed_entries(self, count: int, title_format: str = "記事 {:04d}") -> list[str]:
+        """WhiteWind の記事を count 件、リクエストを介さずに作成してタイトルのリストを返す"""
+        titles = []
+        for i in range(count):
+            title = title_format.format(i)
+            record = {"$type": "com.whtwnd.blog.entry", "title": title, "content": f"# {title}\n\n本文",
+                      "createdAt": "2026-01-01T00:00:00.000Z", "visibility": "public"}
+            self._put("com.whtwnd.blog.entry", atproto.generate_tid(), record)
+            titles.append(title)
+        return titles
+
+    def seed_posts(self, count: int):
+        """Bluesky の投稿を count 件、リクエストを介さずに作成する"""
+        for i in range(count):
+            record = {"$type": "app.bsky.feed.post", "text": f"投稿 {i:05d}", "langs": ["ja"],
+                      "createdAt": "2026-01-01T00:00:00.000Z"}
+            self._put("app.bsky.feed.post", atproto.generate_tid(), record)
+
+    def seed_blobs(self, count: int, size: int) -> list[str]:
+        """size バイトのランダムな blob を count 件、リクエストを介さずに作成して CID のリストを返す"""
+        cids = []
+        for _ in range(count):
+            data = random.randbytes(size)
+            cid = atproto.cid_from_sha256(hashlib.sha256(data).digest())
+            self.blobs[cid] = {"mimeType": "image/png", "size": size, "data": data}
+            cids.append(cid)
+        return cids
+
+    def _put(self, collection: str, rkey: str, value: dict) -> dict:
+        cid = dag_cbor.record_cid(value)
+        self.records.setdefault(collection, {})[rkey] = {"cid": cid, "value": value}
+        self.revs[(collection, rkey)] = atproto.generate_tid()
+        return {"uri": f"at://{self.did}/{collection}/{rkey}", "cid": cid}
+
+    # ── 起動・停止 ──
+
+    def start(self, port: int = 0) -> str:
+        """待ち受けを開始してホストの URL（http://127.0.0.1:PORT）を返す"""
+        pds = self
+
+        class Handler(_Handler):
+            server_pds = pds
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    # ── レート制限 ──
+
+    def _take(self) -> tuple[bool, dict]:
+        """1ポイント消費して (許可されたか, ratelimit-* ヘッダー) を返す"""
+        now = time.time()
+        if self.inject_429 and random.random() < self.inject_429:
+            return False, {"ratelimit-limit": "1", "ratelimit-remaining": "0",
+                           "ratelimit-reset": str(int(now) + 1)}
+        if self.rate_limit is None:
+            return True, {}
+        limit, window = self.rate_limit
+        with self.lock:
+            start = int(now) // window * window
+            if start != self.window_start:
+                self.window_start, self.window_used = start, 0
+            ok = self.window_used < limit
+            if ok:
+                self.window_used += 1
+            headers = {"ratelimit-limit": str(limit), "ratelimit-remaining": str(limit - self.window_used),
+                       "ratelimit-reset": str(start + window), "ratelimit-policy": f"{limit};w={window}"}
+        return ok, headers
+
+    # ── エンドポイント ──
+
+    def respond(self, method: str, nsid: str, query: dict, body: bytes, headers) -> tuple[int, dict | bytes | None, dict]:
+        """(ステータス, JSON ボディ（getBlob・getRepo はバイト列）, 追加ヘッダー) を返す。HEAD ではボディは送らない"""
+        if nsid not in _AUTH_FREE:
+            token = (headers.get("Authorization") or "").removeprefix("Bearer ")
+            payload = _token_payload(token)
+            if payload is None or payload.get("scope") != "access":
+                return 401, {"error": "AuthenticationRequired", "message": "Invalid token"}, {}
+            if payload["exp"] < time.time():
+                return 400, {"error": "ExpiredToken", "message": "Token has expired"}, {}
+
+        if nsid == "com.atproto.server.createSession":
+            return 200, self._session(), {}
+        if nsid == "com.atproto.server.refreshSession":
+            payload = _token_payload((headers.get("Authorization") or "").removeprefix("Bearer "))
+            if payload is None or payload.get("scope") != "refresh":
+                return 400, {"error": "InvalidToken", "message": "Invalid refresh token"}, {}
+            return 200, self._session(), {}
+        if nsid == "com.atproto.identity.resolveHandle":
+            handle = query.get("handle", "")
+            if not handle.endswith(".test"):
+                return 400, {"error": "InvalidRequest", "message": "Unable to resolve handle"}, {}
+            return 200, {"did": "did:plc:" + hashlib.sha256(handle.encode()).hexdigest()[:24]}, {}
+        if nsid == "com.whtwnd.blog.notifyOfNewEntry":
+            return 200, {}, {}
+        if nsid == "com.atproto.sync.getBlob":
+            blob = self.blobs.get(query.get("cid", ""))
+            if blob is None:
+                return 404, {"error": "BlobNotFound", "message": "Blob not found"}, {}
+            if method == "HEAD":
+                return 200, None, {"Content-Type": blob["mimeType"], "Content-Length": str(blob["size"])}
+            start = 0
+            if (headers.get("Range") or "").startswith("bytes="):
+                start = int(headers["Range"][6:].partition("-")[0])
+                if start >= blob["size"]:
+                    return 416, None, {"Content-Range": f"bytes */{blob['size']}", "Content-Length": "0"}
+                return 206, blob["data"][start:], {
+                    "Content-Type": blob["mimeType"],
+                    "Content-Range": f"bytes {start}-{blob['size'] - 1}/{blob['size']}"}
+            return 200, blob["data"], {"Content-Type": blob["mimeType"]}
+        if nsid == "com.atproto.sync.listBlobs":
+            limit = min(int(query.get("limit", 500)), 1000)
+            with self.lock:
+                cids = sorted(c for c in self.blobs if c > query.get("cursor", ""))[:limit]
+            return 200, {"cids": cids, **({"cursor": cids[-1]} if len(cids) == limit else {})}, {}
+        if nsid == "com.atproto.sync.getRepo":
+            if query.get("did") != self.did:
+                return 400, {"error": "RepoNotFound", "message": "Could not find repo"}, {}
+            return 200, self._repo_car(query.get("since")), {"Content-Type": "application/vnd.ipld.car"}
+        if nsid == "com.atproto.repo.uploadBlob":
+            cid = atproto.cid_from_sha256(hashlib.sha256(body).digest())
+            mime_type = headers.get("Content-Type") or "application/octet-stream"
+            with self.lock:
+                self.blobs[cid] = {"mimeType": mime_type, "size": len(body), "data": body}
+            return 200, {"blob": {"$type": "blob", "ref": {"$link": cid},
+                                  "mimeType": mime_type, "size": len(body)}}, {}
+
+        request = json.loads(body) if body else {}
+        if nsid in ("com.atproto.repo.createRecord", "com.atproto.repo.putRecord"):
+            rkey = request.get("rkey") or atproto.generate_tid()
+            with self.lock:
+                if nsid.endswith("createRecord") and rkey in self.records.get(request["collection"], {}):
+                    return 400, {"error": "InvalidRequest", "message": "Record already exists"}, {}
+                return 200, self._put(request["collection"], rkey, request["record"]), {}
+        if nsid == "com.atproto.repo.deleteRecord":
+            with self.lock:
+                self.records.get(request["collection"], {}).pop(request["rkey"], None)
+            return 200, {}, {}
+        if nsid == "com.atproto.repo.applyWrites":
+            results = []
+            with self.lock:
+                for write in request.get("writes", []):
+                    kind = write["$type"].rsplit("#", 1)[-1]
+                    if kind == "delete":
+                        self.records.get(write["collection"], {}).pop(write["rkey"], None)
+                        results.append({"$type": "com.atproto.repo.applyWrites#deleteResult"})
+                        continue
+                    result = self._put(write["collection"], write.get("rkey") or atproto.generate_tid(),
+                                       write["value"])
+                    results.append({"$type": f"com.atproto.repo.applyWrites#{kind}Result", **result})
+            return 200, {"results": results}, {}
+        if nsid == "com.atproto.repo.getRecord":
+            with self.lock:
+                entry = self.records.get(query.get("collection", ""), {}).get(query.get("rkey", ""))
+            if entry is None:
+                return 400, {"error": "RecordNotFound", "message": "Could not locate record"}, {}
+            return 200, {"uri": f"at://{self.did}/{query['collection']}/{query['rkey']}", **entry}, {}
+        if nsid == "com.atproto.repo.listRecords":
+            return 200, self._list(query), {}
+        return 501, {"error": "MethodNotImplemented", "message": nsid}, {}
+
+    def _session(self) -> dict:
+        return {"did": self.did, "handle": self.handle,
+                "accessJwt": _token("access", self.did, self.access_ttl),
+                "refreshJwt": _token("refresh", self.did, 90 * 86400)}
+
+    def _repo_car(self, since: str | None) -> bytes:
+        """
+        リポジトリの CAR（コミット・since より後に書いたレコード・MST のノードの順）を組み立てる。
+        レコードを先に置くのは、パスより先にレコードが届く場合の読み取りを計測するため。
+        since より後の変更がなければ、ヘッダー（root）だけでブロックのない CAR を返す
+        """
+        def section(value) -> tuple[str, bytes]:
+            block = dag_cbor.encode(value)
+            cid = dag_cbor.record_cid(value)
+            data = dag_cbor.cid_to_bytes(cid) + block
+            return cid, _varint(len(data)) + data
+
+        with self.lock:
+            entries = sorted((f"{c}/{k}".encode(), r["cid"], self.revs[(c, k)])
+                             for c, records in self.records.items() for k, r in records.items())
+            values = {r["cid"]: r["value"] for records in self.records.values() for r in records.values()}
+        node = {"l": None, "e": []}
+        previous = b""
+        for key, cid, _ in entries:
+            prefix = next((i for i, (a, b) in enumerate(zip(previous, key)) if a != b), min(len(previous), len(key)))
+            node["e"].append({"p": prefix, "k": {"$bytes": base64.b64encode(key[prefix:]).decode()},
+                              "v": {"$link": cid}, "t": None})
+            previous = key
+        node_cid, node_section = section(node)
+        rev = max((r for *_, r in entries), default=atproto.generate_tid())
+        commit_cid, commit_section = section({"did": self.did, "version": 3, "data": {"$link": node_cid},
+                                              "rev": rev, "prev": None, "sig": {"$bytes": "AA"}})
+        header = dag_cbor.encode({"version": 1, "roots": [{"$link": commit_cid}]})
+        if since is not None and rev <= since:
+            return _varint(len(header)) + header
+        parts = [_varint(len(header)), header, commit_section]
+        written = set()
+        for _, cid, record_rev in entries:
+            if (since is None or record_rev > since) and cid not in written:
+                written.add(cid)
+                parts.append(section(values[cid])[1])
+        parts.append(node_section)
+        return b"".join(parts)
+
+    def _list(self, query: dict) -> dict:
+        collection = query.get("collection", "")
+        limit = min(int(query.get("limit", 50)), 100)
+        reverse = query.get("reverse") == "true"
+        cursor = query.get("cursor")
+        with self.lock:
+            records = self.records.get(collection, {})
+            rkeys = sorted(records, reverse=not reverse)  # 既定は新しい順（rkey 降順）
+            if cursor:
+                rkeys = [k for k in rkeys if (k > cursor if reverse else k < cursor)]
+            page = rkeys[:limit]
+            result = {"records": [{"uri": f"at://{self.did}/{collection}/{k}", **records[k]} for k in page]}
+        if len(page) == limit:
+            result["cursor"] = page[-1]
+        return result
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_pds: MockPDS
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self):
+        pds = self.server_pds
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        url = urlparse(self.path)
+        nsid = url.path.split("/xrpc/")[-1]
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if pds.latency or pds.jitter:
+            time.sleep(pds.latency + random.uniform(0, pds.jitter))
+
+        ok, limit_headers = pds._take()
+        if ok:
+            status, payload, extra = pds.respond(self.command, nsid, query, body, self.headers)
+        else:
+            status, payload, extra = 429, {"error": "RateLimitExceeded", "message": "Rate Limit Exceeded"}, {}
+        data = b"" if payload is None else payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        with pds.lock:
+            pds.stats["requests"][nsid] += 1
+            pds.stats["status"][status] += 1
+            pds.stats["bytes_in"] += length
+            pds.stats["bytes_out"] += len(data)
+
+        self.send_response(status)
+        for name, value in {**limit_headers, **extra}.items():
+            self.send_header(name, value)
+        if payload is not None:
+            if "Content-Type" not in extra:
+                self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    do_GET = do_POST = do_HEAD = _dispatch
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def parse_rate_limit(value: str) -> tuple[int, int]:
+    """"300/60" → (300, 60)"""
+    limit, _, window = value.partition("/")
+    return int(limit), int(window or 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ベンチマーク用のローカル模擬 PDS / WhiteWind AppView")
+    parser.add_argument("--port", type=int, default=2583, help="待ち受けポート (default: 2583)")
+    parser.add_argument("--latency", type=float, default=0, metavar="MS", help="応答前の待ち時間 ms (default: 0)")
+    parser.add_argument("--jitter", type=float, default=0, metavar="MS", help="待ち時間に上乗せする乱数の幅 ms")
+    parser.add_argument("--rate-limit", type=parse_rate_limit, metavar="N/SEC",
+                        help="ウィンドウあたりのリクエスト上限（例: 300/60）")
+    parser.add_argument("--inject-429", type=float, default=0, metavar="P", help="この確率で 429 を返す")
+    parser.add_argument("--seed-entries", type=int, default=0, metavar="N", help="起動時に作成しておく記事数")
+    args = parser.parse_args()
+
+    pds = MockPDS(latency=args.latency / 1000, jitter=args.jitter / 1000,
+                  rate_limit=args.rate_limit, inject_429=args.inject_429)
+    pds.seed_entries(args.seed_entries)
+    host = pds.start(args.port)
+    print(f"✓ 模擬PDS起動: {host}  (handle: {pds.handle}, パスワードは任意)")
+    print(f"  export WHTWND_PDS_HOST={host} WHTWND_WHITEWIND_HOST={host}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stats = pds.snapshot()
+        print(f"\n  リクエスト {sum(stats['requests'].values())}件  受信 {stats['bytes_in']:,} B  "
+              f"送信 {stats['bytes_out']:,} B")
+        for nsid, count in stats["requests"].most_common():
+            print(f"    {nsid:<40} {count:6d}")
+    finally:
+        pds.stop()
+
+
+if __name__ == "__main__":
+    main()
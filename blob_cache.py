@@ -0,0 +1,177 @@
+"""
+blob_cache.py - アップロード済み blob の永続キャッシュ
+
+ローカルファイルの内容（sha256）から、DIDごとにアップロード済みの blob オブジェクトを引けるようにする。
+同じ画像を含む記事を再投稿・更新する際に uploadBlob を省略するために使う。
+
+保存先: atproto.CACHE_DIR / "blobs.sqlite3"
+  files : パス → (サイズ, mtime, sha256)   サイズとmtimeが変わらなければ再ハッシュしない
+  blobs : (DID, sha256) → blob オブジェクト
+
+※ PDS はどのレコードからも参照されない blob を GC で削除するため、
+  レコード作成に失敗した場合や記事を削除した場合は forget() でキャッシュから取り除くこと。
+  それ以外の理由で消えた blob にも対応するため、最後に PDS 上の存在を確かめてから VERIFY_AFTER 秒を過ぎたエントリは
+  lookup() で返さない（呼び出し側の getBlob の HEAD で存在を確かめ直し、store() で確認時刻を更新する）。
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import atproto
+
+DEFAULT_PATH = atproto.CACHE_DIR / "blobs.sqlite3"
+VERIFY_AFTER = 86400  # PDS 上の存在を確かめ直すまでの秒数
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path     TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256   TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    did       TEXT NOT NULL,
+    sha256    TEXT NOT NULL,
+    cid       TEXT NOT NULL,
+    blob      TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    verified  REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (did, sha256)
+);
+"""
+
+
+class BlobCache:
+    """アップロード済み blob の SQLite キャッシュ（スレッドセーフ）"""
+
+    def __init__(self, path: Path = DEFAULT_PATH):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(blobs)")}
+        if "verified" not in columns:  # 確認時刻のない旧形式（既存のエントリは次回の lookup で確かめ直す）
+            with self._db:
+                self._db.execute("ALTER TABLE blobs ADD COLUMN verified REAL NOT NULL DEFAULT 0")
+
+    def close(self):
+        self._db.close()
+
+    def digest(self, file_path: Path) -> str:
+        """ファイルの sha256 を返す。サイズとmtimeが前回と同じならハッシュ計算を省略する"""
+        st = file_path.stat()
+        key = str(file_path.resolve())
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, sha256 FROM files WHERE path = ?", (key,),
+            ).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+
+        sha256 = atproto.file_sha256(file_path).hex()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (key, st.st_size, st.st_mtime_ns, sha256),
+            )
+        return sha256
+
+    def lookup(self, did: str, file_path: Path) -> dict | None:
+        """
+        キャッシュ済みの blob オブジェクトを返す。
+        なければ、または PDS 上の存在を最後に確かめてから VERIFY_AFTER 秒を過ぎていれば None
+        """
+        sha256 = self.digest(file_path)
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT blob FROM blobs WHERE did = ? AND sha256 = ? AND verified >= ?",
+                (did, sha256, time.time() - VERIFY_AFTER),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE blobs SET last_used = ? WHERE did = ? AND sha256 = ?",
+                (time.time(), did, sha256),
+            )
+        return json.loads(row[0])
+
+    def store(self, did: str, file_path: Path, blob: dict):
+        """アップロード結果（または PDS 上に存在を確かめた blob）を記録する"""
+        sha256 = self.digest(file_path)
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO blobs (did, sha256, cid, blob, size, last_used, verified) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (did, sha256, blob["ref"]["$link"], json.dumps(blob), blob.get("size", 0), now, now),
+            )
+
+    def forget(self, did: str, cids: list[str]):
+        """指定 CID の blob をキャッシュから取り除く（レコード作成失敗時・記事の削除時など）"""
+        with self._lock, self._db:
+            self._db.executemany(
+                "DELETE FROM blobs WHERE did = ? AND cid = ?", [(did, cid) for cid in cids],
+            )
+
+    def stats(self) -> dict:
+        """キャッシュの統計情報を返す"""
+        with self._lock:
+            blobs, total = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs",
+            ).fetchone()
+            dids = self._db.execute("SELECT COUNT(DISTINCT did) FROM blobs").fetchone()[0]
+            files = self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        return {
+            "path": str(self.path),
+            "db_bytes": self.path.stat().st_size,
+            "blobs": blobs,
+            "blob_bytes": total,
+            "dids": dids,
+            "files": files,
+        }
+
+    def prune(self, older_than_days: float | None = None, clear: bool = False) -> tuple[int, int]:
+        """
+        不要なエントリを削除し、(削除した blob 数, 削除したファイル数) を返す。
+          - 存在しなくなったファイルのハッシュ記録は常に削除
+          - older_than_days 指定時は最終使用がそれより古い blob を削除
+          - clear=True なら全削除
+        """
+        with self._lock, self._db:
+            if clear:
+                removed_blobs = self._db.execute("DELETE FROM blobs").rowcount
+                removed_files = self._db.execute("DELETE FROM files").rowcount
+            else:
+                removed_blobs = 0
+                if older_than_days is not None:
+                    cutoff = time.time() - older_than_days * 86400
+                    removed_blobs = self._db.execute(
+                        "DELETE FROM blobs WHERE last_used < ?", (cutoff,),
+                    ).rowcount
+                missing = [
+                    (path,) for (path,) in self._db.execute("SELECT path FROM files")
+                    if not Path(path).exists()
+                ]
+                self._db.executemany("DELETE FROM files WHERE path = ?", missing)
+                removed_files = len(missing)
+        with self._lock:
+            self._db.execute("VACUUM")
+        return removed_blobs, removed_files
+
+
+_shared: BlobCache | None = None
+_shared_lock = threading.Lock()
+
+
+def shared() -> BlobCache:
+    """既定の保存先のインスタンスをプロセス内で共有する（デーモンではジョブをまたいで接続を保持する）"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = BlobCache()
+        return _shared
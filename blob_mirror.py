@@ -0,0 +1,213 @@
+"""
+blob_mirror.py - blob のローカルミラー（mirror-blobs コマンド）
+
+記事が参照している blob（または com.atproto.sync.listBlobs で得たアカウントの全 blob）を
+getBlob で並列にダウンロードし、内容アドレスのストアに保存する。
+
+ストアの構成:
+  <store>/<CID の末尾2文字>/<CID>        検証済みの blob（CID が同じなら内容も同じなので、あれば取得しない）
+  <store>/<CID の末尾2文字>/<CID>.part   ダウンロード途中のファイル（次回は Range で続きから取得する）
+CID の先頭（"bafkrei"）はどの blob も同じなので、ディレクトリは末尾で分ける。
+
+受信しながら sha256 を計算し、CID と一致したものだけを .part から rename する。
+一致しなければ .part を削除して最初から1回だけ取り直し、それでも一致しなければ失敗として数えるため、
+途中で止めてもストアには検証済みのファイルしか現れない。
+"""
+
+import hashlib
+import re
+import time
+from pathlib import Path
+
+import atproto
+import dag_cbor
+
+DEFAULT_JOBS = 8  # 同時ダウンロード数
+CHUNK_SIZE = 1 << 20
+MAX_ATTEMPTS = 3  # 受信が途中で切れた場合に続きから取り直す回数
+TIMEOUT = 30  # getBlob 1回の接続・受信待ちの上限（秒）
+_RAW_SHA256 = bytes([0x01, 0x55, 0x12, 0x20])  # CIDv1・raw コーデック・sha2-256・32バイト
+_BLOB_URL = re.compile(r"com\.atproto\.sync\.getBlob\?did=([^&\s)\"'<>]+)&cid=([a-z2-7]+)")
+
+
+def blob_path(store: Path, cid: str) -> Path:
+    return store / cid[-2:] / cid
+
+
+def expected_digest(cid: str) -> bytes | None:
+    """blob の CID から sha256 ダイジェストを取り出す（raw・sha2-256 以外の CID なら None）"""
+    try:
+        raw = dag_cbor.cid_to_bytes(cid)
+    except ValueError:
+        return None
+    if raw[:4] != _RAW_SHA256 or len(raw) != 36:
+        return None
+    return raw[4:]
+
+
+# ──────────────────────────────────────────────
+# 対象の blob の収集
+# ──────────────────────────────────────────────
+
+def entry_blob_cids(session: dict) -> list[str]:
+    """
+    記事が参照している blob の CID を初出順に返す。
+    レコードの blobs と、本文中の自分の DID の getBlob URL（blob_to_public_url() の形式）の両方から集める。
+    """
+    cids: dict[str, None] = {}
+    for record in atproto.iter_records(session, "com.whtwnd.blog.entry"):
+        value = record["value"]
+        for blob in value.get("blobs", []):
+            link = (blob.get("blobref") or {}).get("ref", {}).get("$link")
+            if link:
+                cids[link] = None
+        for m in _BLOB_URL.finditer(value.get("content", "")):
+            if m.group(1) == session["did"]:
+                cids[m.group(2)] = None
+    return list(cids)
+
+
+def list_blob_cids(did: str) -> list[str]:
+    """com.atproto.sync.listBlobs でアカウントの全 blob の CID を返す。失敗時は RuntimeError を送出する"""
+    cids = []
+    cursor = None
+    while True:
+        params = {"did": did, "limit": 1000}
+        if cursor:
+            params["cursor"] = cursor
+        resp = atproto.api_request(
+            "GET",
+            f"{atproto.PDS_HOST}/xrpc/com.atproto.sync.listBlobs",
+            params=params,
+            timeout=30,
+        )
+        if not resp.ok:
+            raise RuntimeError(f"blob 一覧の取得に失敗しました: {resp.status_code} {resp.text}")
+        page = resp.json()
+        cids.extend(page.get("cids", []))
+        cursor = page.get("cursor")
+        if not cursor or not page.get("cids"):
+            return cids
+
+
+# ──────────────────────────────────────────────
+# ダウンロード
+# ──────────────────────────────────────────────
+
+def download_blob(did: str, cid: str, store: Path, verify_existing: bool = False) -> tuple[str, int]:
+    """
+    blob を1つストアに取得し、(結果, 受信バイト数) を返す。
+    結果は "present"（取得済み）/ "downloaded" / "resumed"（.part の続きから取得）。
+    verify_existing=True なら取得済みのファイルも sha256 を確かめ、壊れていれば取り直す。
+    内容が CID と一致しなければ（古い・壊れた .part の続きだった場合など）.part を削除して最初から1回だけ取り直す。
+    失敗時は RuntimeError を送出する（受信の中断なら .part は残すので、次回は続きから取得する）。
+    """
+    digest = expected_digest(cid)
+    if digest is None:
+        raise RuntimeError("raw・sha2-256 以外の CID には対応していません")
+    path = blob_path(store, cid)
+    if path.exists():
+        if not verify_existing or atproto.file_sha256(path) == digest:
+            return "present", 0
+        path.unlink()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    part = path.with_name(cid + ".part")
+
+    received = 0
+    resumed = False
+    for restarted in (False, True):
+        hasher = None  # .part の内容の sha256（続きから受信する場合は既存の部分を先に読む）
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            offset = part.stat().st_size if part.exists() else 0
+            resp = _request_blob(did, cid, offset)
+            try:
+                if resp.status_code == 416:  # .part が既に全体を含んでいる（長すぎる場合は下の検証で取り直す）
+                    break
+                if resp.status_code in (400, 404):
+                    raise RuntimeError(f"PDS にありません ({resp.status_code})")
+                if not resp.ok:
+                    raise RuntimeError(f"取得に失敗しました: {resp.status_code}")
+                append = resp.status_code == 206
+                if not append:
+                    hasher = hashlib.sha256()
+                elif hasher is None:
+                    hasher = _hash_file(part)
+                resumed |= append
+                with open(part, "ab" if append else "wb") as f:
+                    for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+                        hasher.update(chunk)
+                        received += len(chunk)
+                break
+            except OSError as e:  # 受信の途中で切れた（requests の例外も OSError の派生）
+                if attempt == MAX_ATTEMPTS:
+                    raise RuntimeError(f"受信が中断しました: {e}") from e
+                time.sleep(2 ** (attempt - 1))
+            finally:
+                resp.close()
+
+        if (hasher or _hash_file(part)).digest() == digest:
+            break
+        part.unlink()
+        if restarted:
+            raise RuntimeError("内容が CID と一致しません")
+        resumed = False  # 最初から取り直す
+
+    part.replace(path)
+    return ("resumed" if resumed else "downloaded"), received
+
+
+def _request_blob(did: str, cid: str, offset: int):
+    """
+    getBlob を送る（offset が 0 でなければ Range で続きを求める）。
+    api_request はタイムアウト・接続エラーが続いたり 429 の待ち時間が長すぎたりすると sys.exit() するので、
+    ミラー全体を止めずにこの blob だけの失敗として数えられるよう RuntimeError に置き換える。
+    """
+    try:
+        return atproto.api_request(
+            "GET",
+            f"{atproto.PDS_HOST}/xrpc/com.atproto.sync.getBlob",
+            params={"did": did, "cid": cid},
+            headers={"Range": f"bytes={offset}-"} if offset else None,
+            stream=True,
+            timeout=TIMEOUT,
+        )
+    except SystemExit as e:
+        raise RuntimeError("通信エラーが続いたため取得できませんでした") from e
+
+
+def _hash_file(path: Path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher
+
+
+def mirror(did: str, cids: list[str], store: Path, jobs: int = DEFAULT_JOBS, verify_existing: bool = False) -> dict:
+    """
+    cids を最大 jobs 並列でストアに取得し、件数の集計を返す。
+    完了件数が全体の 5% 進むごとに経過を表示し、失敗した blob はその場で表示する。
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    atproto.ensure_pool_size(jobs)
+    counts = {"present": 0, "downloaded": 0, "resumed": 0, "failed": 0}
+    received = 0
+    step = max(1, len(cids) // 20)
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(download_blob, did, cid, store, verify_existing): cid for cid in cids}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                result, size = future.result()
+            except Exception as e:  # 1件の失敗（mkdir・rename の OSError なども）で全体を止めない
+                counts["failed"] += 1
+                print(f"  ✗ {futures[future]}: {e}")
+            else:
+                counts[result] += 1
+                received += size
+            if done % step == 0 or done == len(cids):
+                elapsed = time.monotonic() - started
+                print(f"  … {done}/{len(cids)}件 ({atproto.format_throughput(received, elapsed)})")
+    return {**counts, "bytes": received, "elapsed": time.monotonic() - started}
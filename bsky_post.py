@@ -5,6 +5,7 @@ bsky_post.py - CLIからBlueskyにスキートを投稿するスクリプト
 使い方:
   python bsky_post.py post "テキスト内容"
   python bsky_post.py post "テキスト" --image photo.jpg
+  python bsky_post.py post "テキスト" --video clip.mp4 --alt "説明"
   python bsky_post.py post --file message.txt
 
 設定 (.bsky_config.json または ~/.bsky_config.json):
@@ -16,95 +17,401 @@ bsky_post.py - CLIからBlueskyにスキートを投稿するスクリプト
 Bluesky の仕様:
   - 投稿上限: 300 grapheme（日本語も1文字=1grapheme）
   - 画像: 最大4枚（JPEG / PNG / WebP / GIF）
+  - 動画: 1本（100MB・3分まで。画像と同時には添付できない）
   - URL・@メンション・#ハッシュタグはリッチテキスト（facet）として自動認識
 """
 
+import os
+import sys
+
+if __name__ == "__main__" and os.environ.get("WHTWND_DAEMON"):
+    # 重いモジュールを読み込む前にデーモンへ転送する（daemon.py）
+    import daemon
+    daemon.forward("bsky_post")
+
 import argparse
+import json
 import re
-import sys
-from datetime import datetime, timezone
+import time
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 import atproto
+import dag_cbor
+import image_prep
+import request_trace
 
 MAX_GRAPHEMES = 300  # Bluesky の投稿文字数上限
+MAX_RESOLVE_JOBS = 8  # ハンドル解決の同時実行数
 
 
 # ──────────────────────────────────────────────
 # Facet 検出（リッチテキスト）
 # ──────────────────────────────────────────────
 
-def detect_facets(text: str) -> list:
+_URL_PATTERN = (
+    r'https?://'
+    r'[^\s\u3000\u3001\u3002\uff0c\uff0e\u300c-\u301f\uff08\uff09\uff3b\uff3d\u300a\u300b]+'
+)
+_MENTION_PATTERN = (
+    r'(?<![a-zA-Z0-9])'
+    r'@([a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?'
+    r'(?:\.[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?)+)'
+)
+_TAG_PATTERN = r'(?<!\w)#([\w\u3040-\u30ff\u4e00-\u9fff]+)'
+
+MENTION_RE = re.compile(_MENTION_PATTERN)
+
+# URL・メンション・タグを1回の走査で検出する。
+# 各パターンは先頭文字（h / @ / #）が異なるので位置ごとにどれか1つしか一致しない。
+# 先読み (?=...) で幅0の一致にしているのは、URL 内の #fragment や @ のように
+# 種類の異なる facet が重なる場合も種類別に走査したときと同じ結果を得るため。
+# 先頭の (?=[h@#]) は候補にならない位置を1文字の判定だけで読み飛ばすためのもの。
+FACET_RE = re.compile(
+    r'(?=[h@#])'
+    rf'(?=(?P<url>{_URL_PATTERN})'
+    rf'|(?P<mention>{_MENTION_PATTERN.replace("@(", "@(?P<handle>", 1)})'
+    rf'|(?P<tag>{_TAG_PATTERN.replace("#(", "#(?P<tagname>", 1)}))'
+)
+
+
+def find_mentions(text: str) -> list[str]:
+    """テキスト内の @メンションのハンドルを重複なしで出現順に返す"""
+    return list(dict.fromkeys(m.group(1) for m in MENTION_RE.finditer(text)))
+
+
+def resolve_mentions(
+    handles: list[str],
+    cache: "handle_cache.HandleCache | None" = None,
+) -> dict[str, str | None]:
+    """
+    ハンドルを DID に解決して {ハンドル: DID または None} を返す。
+    キャッシュにないハンドルだけを並列に解決し、結果が確定したもの（解決不能を含む）をキャッシュに記録する。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    handles = list(dict.fromkeys(handles))
+    resolved = cache.lookup(handles) if cache is not None else {}
+    misses = [h for h in handles if h not in resolved]
+    if not misses:
+        return resolved
+
+    jobs = min(MAX_RESOLVE_JOBS, len(misses))
+    atproto.ensure_pool_size(jobs)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(atproto.resolve_handle, misses))
+    for handle, (did, definitive) in zip(misses, results):
+        resolved[handle] = did
+        if cache is not None and definitive:
+            cache.store(handle, did)
+    return resolved
+
+
+async def resolve_mentions_async(
+    client,
+    handles: list[str],
+    cache: "handle_cache.HandleCache | None" = None,
+) -> dict[str, str | None]:
+    """resolve_mentions の asyncio 版（client は atproto_async.AsyncClient）"""
+    import asyncio
+
+    import atproto_async
+
+    handles = list(dict.fromkeys(handles))
+    resolved = cache.lookup(handles) if cache is not None else {}
+    misses = [h for h in handles if h not in resolved]
+    results = await asyncio.gather(*(atproto_async.resolve_handle(client, h) for h in misses))
+    for handle, (did, definitive) in zip(misses, results):
+        resolved[handle] = did
+        if cache is not None and definitive:
+            cache.store(handle, did)
+    return resolved
+
+
+def _byte_offsets(text: str, positions: set[int]) -> dict[int, int]:
+    """文字位置 → UTF-8 バイト位置の対応を返す（位置の間の区間だけをエンコードするので全体で線形時間）"""
+    if text.isascii():
+        return {p: p for p in positions}
+    offsets = {}
+    prev = byte = 0
+    for p in sorted(positions):
+        byte += len(text[prev:p].encode("UTF-8"))
+        offsets[p] = byte
+        prev = p
+    return offsets
+
+
+def detect_facets(text: str, resolved: dict[str, str | None] | None = None) -> list:
     """
     テキスト内の URL・@メンション・#ハッシュタグを検出して facets を返す。
 
     Bluesky の facet はバイト位置（UTF-8）で指定する必要がある。
+    resolved（ハンドル → DID）を渡すとメンションの解決にそれを使い、ネットワークにアクセスしない。
+    渡さない場合はテキスト内のハンドルをまとめて resolve_mentions() で解決する。
+    facets は URL・メンション・タグの順に、それぞれ出現順で並ぶ。
     """
-    facets = []
+    if resolved is None:
+        resolved = resolve_mentions(find_mentions(text))
+
+    # (開始, 終了, feature) を種類別に集める
+    found: dict[str, list[tuple[int, int, dict]]] = {"url": [], "mention": [], "tag": []}
+    url_end = 0
+    for m in FACET_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == "url":
+            # URL どうしは重ならない（単独で走査した場合と同じく前の URL の末尾から探す）
+            if m.start() < url_end:
+                continue
+            url_end = m.end("url")
+            feature = {"$type": "app.bsky.richtext.facet#link", "uri": m.group("url")}
+        elif kind == "mention":
+            did = resolved.get(m.group("handle"))
+            if did is None:
+                continue  # 解決できないハンドルはスキップ
+            feature = {"$type": "app.bsky.richtext.facet#mention", "did": did}
+        else:
+            feature = {"$type": "app.bsky.richtext.facet#tag", "tag": m.group("tagname")}
+        found[kind].append((m.start(), m.end(kind), feature))
+
+    spans = found["url"] + found["mention"] + found["tag"]
+    offsets = _byte_offsets(text, {p for start, end, _ in spans for p in (start, end)})
+    return [
+        {
+            "index": {"byteStart": offsets[start], "byteEnd": offsets[end]},
+            "features": [feature],
+        }
+        for start, end, feature in spans
+    ]
+
+
+# ──────────────────────────────────────────────
+# 動画アップロード
+# ──────────────────────────────────────────────
+
+# 動画サービス。設定ファイルの "video_service" / "video_service_did" で変更できる（ローカルの代替サーバーでの検証用）
+VIDEO_SERVICE = "https://video.bsky.app"
+VIDEO_SERVICE_DID = "did:web:video.bsky.app"
+VIDEO_EXTENSIONS = ["mp4", "mov", "m4v", "mpg", "mpeg", "webm"]
+MAX_VIDEO_BYTES = 100 * 1024 * 1024
+MAX_VIDEO_SECONDS = 180
+VIDEO_JOB_TIMEOUT = 300  # ジョブ完了待機のタイムアウト（秒）
+_POLL_MIN = 0.5  # getJobStatus のポーリング間隔の下限・上限（秒）
+_POLL_MAX = 8.0
+
+
+def validate_video(file_path: Path):
+    """拡張子とファイルサイズを確認する。対応していなければ RuntimeError"""
+    ext = file_path.suffix.lower().lstrip(".")
+    if ext not in VIDEO_EXTENSIONS:
+        raise RuntimeError(f"「{ext}」は対応していません。対応形式: {', '.join(VIDEO_EXTENSIONS)}")
+    size = file_path.stat().st_size
+    if size >= MAX_VIDEO_BYTES:
+        raise RuntimeError(f"ファイルサイズが100MBを超えています（{size / 1024 / 1024:.1f}MB）")
+
 
-    # URL: http:// または https:// から空白・句読点・括弧まで
-    url_re = re.compile(
-        r'https?://'
-        r'[^\s\u3000\u3001\u3002\uff0c\uff0e\u300c-\u301f\uff08\uff09\uff3b\uff3d\u300a\u300b]+'
+def probe_video(file_path: Path) -> dict | None:
+    """
+    ffprobe で動画の幅・高さ・長さ（秒）を取得して {"width", "height", "duration"} を返す。
+    ffprobe がない・解析に失敗した場合は警告を表示して None を返す。
+    """
+    import shutil
+    import subprocess
+
+    if shutil.which("ffprobe") is None:
+        print("  ⚠ ffprobe が見つかりません。aspectRatio なしで続行します。")
+        return None
+    proc = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "stream=width,height:format=duration", "-of", "json", str(file_path)],
+        capture_output=True, text=True,
     )
-    for m in url_re.finditer(text):
-        byte_start = len(text[:m.start()].encode("UTF-8"))
-        byte_end = len(text[:m.end()].encode("UTF-8"))
-        facets.append({
-            "index": {"byteStart": byte_start, "byteEnd": byte_end},
-            "features": [{"$type": "app.bsky.richtext.facet#link", "uri": m.group()}],
-        })
-
-    # @メンション: @handle.domain 形式
-    mention_re = re.compile(
-        r'(?<![a-zA-Z0-9])'
-        r'@([a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?'
-        r'(?:\.[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?)+)'
+    try:
+        info = json.loads(proc.stdout)
+        stream = info["streams"][0]
+        duration = info.get("format", {}).get("duration")
+        return {"width": int(stream["width"]), "height": int(stream["height"]),
+                "duration": float(duration) if duration else None}
+    except (ValueError, KeyError, IndexError):
+        print(f"  ⚠ ffprobe で動画を解析できませんでした。aspectRatio なしで続行します。{proc.stderr.strip()}")
+        return None
+
+
+def check_upload_limits(session: dict, service: str = VIDEO_SERVICE,
+                        service_did: str = VIDEO_SERVICE_DID) -> dict:
+    """app.bsky.video.getUploadLimits で日次制限を確認する。アップロードできなければ RuntimeError"""
+    token = atproto.get_service_auth(session, service_did, "app.bsky.video.getUploadLimits")
+    resp = atproto.api_request(
+        "GET",
+        f"{service}/xrpc/app.bsky.video.getUploadLimits",
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=15,
     )
-    for m in mention_re.finditer(text):
-        handle = m.group(1)
-        did = atproto.resolve_handle_to_did(handle)
-        if did is None:
-            continue  # 解決できないハンドルはスキップ
-        byte_start = len(text[:m.start()].encode("UTF-8"))
-        byte_end = len(text[:m.end()].encode("UTF-8"))
-        facets.append({
-            "index": {"byteStart": byte_start, "byteEnd": byte_end},
-            "features": [{"$type": "app.bsky.richtext.facet#mention", "did": did}],
-        })
-
-    # #ハッシュタグ: 先頭・空白の後の # から英数字・日本語の連続
-    tag_re = re.compile(r'(?<!\w)#([\w\u3040-\u30ff\u4e00-\u9fff]+)')
-    for m in tag_re.finditer(text):
-        byte_start = len(text[:m.start()].encode("UTF-8"))
-        byte_end = len(text[:m.end()].encode("UTF-8"))
-        facets.append({
-            "index": {"byteStart": byte_start, "byteEnd": byte_end},
-            "features": [{"$type": "app.bsky.richtext.facet#tag", "tag": m.group(1)}],
-        })
-
-    return facets
+    if not resp.ok:
+        raise RuntimeError(f"アップロード制限の確認に失敗しました: {resp.status_code} {resp.text}")
+    limits = resp.json()
+    if not limits.get("canUpload", False):
+        videos = limits.get("remainingDailyVideos", 0)
+        gb = limits.get("remainingDailyBytes", 0) / 1024 ** 3
+        message = limits.get("message") or limits.get("error")
+        raise RuntimeError(f"本日の動画アップロード上限に達しています（残り{videos}本 / {gb:.0f} GB）"
+                           + (f": {message}" if message else ""))
+    return limits
+
+
+def wait_for_video_job(job_id: str, service: str = VIDEO_SERVICE,
+                       timeout: float = VIDEO_JOB_TIMEOUT) -> dict:
+    """
+    app.bsky.video.getJobStatus をポーリングして、処理が完了したら blob オブジェクトを返す。
+
+    間隔は固定ではなく、状態が変わった直後は短く、変化がなければ倍々に延ばす（_POLL_MIN〜_POLL_MAX）。
+    進捗（progress %）が得られる場合は、進み具合から見積もった残り時間の半分を次の間隔にする。
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    interval = _POLL_MIN
+    last = None            # 前回の (状態, 進捗)
+    first_progress = None  # 最初に進捗を観測した (時刻, 進捗)
+    while True:
+        resp = atproto.api_request(
+            "GET",
+            f"{service}/xrpc/app.bsky.video.getJobStatus",
+            params={"jobId": job_id},
+            timeout=15,
+        )
+        if not resp.ok:
+            raise RuntimeError(f"動画処理の状態を取得できません: {resp.status_code} {resp.text}")
+        data = resp.json()
+        status = data.get("jobStatus", data)
+        state = status.get("state")
+        progress = status.get("progress")
+
+        if state == "JOB_STATE_COMPLETED" and status.get("blob"):
+            print(f"  ✓ 動画処理完了 ({time.monotonic() - started:.1f}秒)")
+            return status["blob"]
+        if state == "JOB_STATE_FAILED":
+            raise RuntimeError(f"動画処理に失敗しました: {status.get('error') or status.get('message')}")
+
+        now = time.monotonic()
+        if (state, progress) != last:
+            print(f"  処理中: {state}" + (f" {progress}%" if progress is not None else ""))
+            interval = _POLL_MIN
+        else:
+            interval = min(interval * 2, _POLL_MAX)
+        if progress:
+            if first_progress is None or progress < first_progress[1]:
+                first_progress = (now, progress)
+            elif progress > first_progress[1]:
+                rate = (progress - first_progress[1]) / (now - first_progress[0])
+                interval = min(max((100 - progress) / rate / 2, _POLL_MIN), _POLL_MAX)
+        last = (state, progress)
+
+        if now + interval > deadline:
+            raise RuntimeError(f"動画処理がタイムアウトしました（{timeout / 60:.0f}分）")
+        time.sleep(interval)
+
+
+def upload_video(session: dict, file_path: Path, *, service: str = VIDEO_SERVICE,
+                 service_did: str = VIDEO_SERVICE_DID) -> tuple[dict, dict | None]:
+    """
+    動画を動画サービスにアップロードし、処理完了を待って (blob オブジェクト, aspectRatio または None) を返す。
+    失敗時は RuntimeError を送出する。
+
+    ffprobe による解析と日次制限の確認はアップロードと同時に別スレッドで実行する。
+    どちらかでアップロードできないと分かった時点で送信を中断する（ファイルはストリーム送信で、メモリに読み込まない）。
+    """
+    import mimetypes
+    from concurrent.futures import ThreadPoolExecutor
+
+    validate_video(file_path)
+    mime_type = mimetypes.guess_type(str(file_path))[0] or "video/mp4"
+    size = file_path.stat().st_size
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        probe_future = pool.submit(probe_video, file_path)
+        limits_future = pool.submit(check_upload_limits, session, service, service_did)
+
+        def check_background():
+            """完了済みの解析・制限確認の結果を確認し、アップロードできなければ RuntimeError"""
+            if limits_future.done():
+                limits_future.result()
+            if probe_future.done():
+                probe = probe_future.result()
+                if probe and probe["duration"] and probe["duration"] > MAX_VIDEO_SECONDS:
+                    raise RuntimeError(f"動画が3分を超えています（{probe['duration']:.0f}秒）")
+
+        token = atproto.get_service_auth(session, atproto.pds_service_did(session),
+                                         "com.atproto.repo.uploadBlob", expires_in=30 * 60)
+        started = time.monotonic()
+        try:
+            with open(file_path, "rb") as f:
+                resp = atproto.api_request(
+                    "POST",
+                    f"{service}/xrpc/app.bsky.video.uploadVideo",
+                    params={"did": session["did"], "name": file_path.name},
+                    headers={"Authorization": f"Bearer {token}", "Content-Type": mime_type,
+                             "Content-Length": str(size)},
+                    data=atproto.FileBody(f, size, lambda sent, total: check_background()),
+                    timeout=(15, 300),
+                )
+        finally:
+            # 中断時に残りの確認を待たない
+            pool.shutdown(wait=False, cancel_futures=True)
+        elapsed = time.monotonic() - started
+        limits_future.result()
+        probe = probe_future.result()
+        check_background()
+
+    # 成功時と 409（同じ動画を処理済み。jobId が返る）だけ JSON として読む。
+    # それ以外の応答や JSON でない応答（プロキシのエラーページなど）は失敗として扱う
+    status: dict = {}
+    if resp.ok or resp.status_code == 409:
+        try:
+            data = resp.json()
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            status = data.get("jobStatus", data)
+    completed = status.get("state") == "JOB_STATE_COMPLETED" and status.get("blob")
+    if not status.get("jobId") and not completed:
+        raise RuntimeError(f"動画のアップロードに失敗しました: {resp.status_code} {resp.text}")
+    print(f"  ✓ アップロード完了: {file_path.name} ({atproto.format_throughput(size, elapsed)})")
+
+    if completed:
+        blob = status["blob"]
+    else:
+        blob = wait_for_video_job(status["jobId"], service)
+    aspect_ratio = {"width": probe["width"], "height": probe["height"]} if probe else None
+    return blob, aspect_ratio
+
+
+def build_video_embed(blob: dict, aspect_ratio: dict | None = None, alt: str | None = None) -> dict:
+    """app.bsky.embed.video を組み立てる"""
+    embed: dict = {"$type": "app.bsky.embed.video", "video": blob}
+    if aspect_ratio:
+        embed["aspectRatio"] = aspect_ratio
+    if alt:
+        embed["alt"] = alt
+    return embed
 
 
 # ──────────────────────────────────────────────
 # スキート投稿
 # ──────────────────────────────────────────────
 
-def post_skeet(
-    session: dict,
-    text: str,
-    images: list[Path] | None = None,
-    langs: list[str] | None = None,
-) -> str:
-    """app.bsky.feed.post レコードを作成して AT URI を返す"""
+def build_post_record(text: str, facets: list, langs: list[str] | None, blobs: list[dict],
+                      embed: dict | None = None, alts: list[str] | None = None,
+                      created_at: str | None = None) -> dict:
+    """
+    app.bsky.feed.post レコードの値を組み立てる。embed（動画等）を渡すと画像の代わりに埋め込む。
+    alts は画像ごとの代替テキスト。created_at を省略すると現在時刻を使う。
+    """
     record: dict = {
         "$type": "app.bsky.feed.post",
         "text": text,
-        "createdAt": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        "createdAt": created_at or datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
     }
 
     # リッチテキスト（URL・メンション・タグ）
-    facets = detect_facets(text)
     if facets:
         record["facets"] = facets
 
@@ -113,46 +420,319 @@ def post_skeet(
         record["langs"] = langs
 
     # 画像埋め込み（最大4枚）
-    if images:
-        embed_images = []
-        for img_path in images[:4]:
-            blob = atproto.upload_blob(session, img_path)
-            embed_images.append({
-                "image": blob,
-                "alt": "",  # alt テキストは空（指定する場合は --alt オプションを追加）
-            })
+    if embed:
+        record["embed"] = embed
+    elif blobs:
         record["embed"] = {
             "$type": "app.bsky.embed.images",
-            "images": embed_images,
+            "images": [
+                {
+                    "image": blob,
+                    "alt": alts[i] if alts and i < len(alts) else "",
+                }
+                for i, blob in enumerate(blobs[:4])
+            ],
         }
+    return record
 
+
+def create_post_record(session: dict, record: dict, rkey: str | None = None) -> dict:
+    """
+    com.atproto.repo.createRecord で投稿を1件作成し、{"uri", "cid"} を返す。失敗時は RuntimeError。
+    rkey を省略すると PDS が決める。
+    """
+    body = {"repo": session["did"], "collection": "app.bsky.feed.post", "record": record}
+    if rkey:
+        body["rkey"] = rkey
     resp = atproto.api_request(
         "POST",
         f"{atproto.PDS_HOST}/xrpc/com.atproto.repo.createRecord",
-        headers={"Authorization": f"Bearer {session['accessJwt']}"},
-        json={
-            "repo": session["did"],
-            "collection": "app.bsky.feed.post",
-            "record": record,
-        },
+        auth=session,
+        json=body,
         timeout=15,
     )
     if resp.status_code == 401:
-        print("投稿失敗: 認証トークンが無効です。再ログインしてください。")
-        sys.exit(1)
+        raise RuntimeError("投稿失敗: 認証トークンが無効です。再ログインしてください。")
     if not resp.ok:
-        print(f"投稿失敗: {resp.status_code} {resp.text}")
+        raise RuntimeError(f"投稿失敗: {resp.status_code} {resp.text}")
+    data = resp.json()
+    return {"uri": data["uri"], "cid": data.get("cid")}
+
+
+def post_skeet(
+    session: dict,
+    text: str,
+    images: list[Path] | None = None,
+    langs: list[str] | None = None,
+    cache: "handle_cache.HandleCache | None" = None,
+    prep: dict | None = None,
+    embed: dict | None = None,
+) -> str:
+    """
+    app.bsky.feed.post レコードを作成して AT URI を返す。
+    prep（image_prep の設定）を渡すと、画像を縮小・再圧縮してからアップロードする。
+    embed（build_video_embed() の結果等）を渡すと画像の代わりに埋め込む。
+    """
+    facets = detect_facets(text, resolved=resolve_mentions(find_mentions(text), cache))
+    images = (images or [])[:4]
+    if prep and images:
+        sources = image_prep.prepare_images(images, prep, jobs=len(images))
+        images = [sources[p] for p in images]
+    try:
+        blobs = [atproto.upload_blob(session, img_path, skip_existing=True) for img_path in images]
+        record = build_post_record(text, facets, langs, blobs, embed)
+        return create_post_record(session, record)["uri"]
+    except RuntimeError as e:
+        print(f"エラー: {e}")
         sys.exit(1)
 
+
+async def post_skeet_async(
+    session: dict,
+    text: str,
+    images: list[Path] | None = None,
+    langs: list[str] | None = None,
+    cache: "handle_cache.HandleCache | None" = None,
+    prep: dict | None = None,
+    embed: dict | None = None,
+) -> str:
+    """
+    post_skeet の asyncio 版。メンションのハンドル解決と画像アップロードを同時に実行してから投稿する。
+    失敗時は RuntimeError を送出する。
+    """
+    import asyncio
+
+    import atproto_async  # aiohttp は --async 指定時のみ必要
+
+    images = (images or [])[:4]
+    if prep and images:
+        sources = await asyncio.to_thread(image_prep.prepare_images, images, prep, len(images))
+        images = [sources[p] for p in images]
+
+    async with atproto_async.AsyncClient() as client:
+        resolved, blobs = await asyncio.gather(
+            resolve_mentions_async(client, find_mentions(text), cache),
+            asyncio.gather(*(atproto_async.upload_blob(client, session, p, skip_existing=True)
+                             for p in images)),
+        )
+        facets = detect_facets(text, resolved=resolved)
+        record = build_post_record(text, facets, langs, list(blobs), embed)
+
+        resp = await atproto_async.api_request(
+            client,
+            "POST",
+            f"{atproto.PDS_HOST}/xrpc/com.atproto.repo.createRecord",
+            auth=session,
+            json={
+                "repo": session["did"],
+                "collection": "app.bsky.feed.post",
+                "record": record,
+            },
+        )
+    if resp.status_code == 401:
+        raise RuntimeError("投稿失敗: 認証トークンが無効です。再ログインしてください。")
+    if not resp.ok:
+        raise RuntimeError(f"投稿失敗: {resp.status_code} {resp.text}")
     return resp.json()["uri"]
 
 
+# ──────────────────────────────────────────────
+# スレッド投稿
+# ──────────────────────────────────────────────
+
+DEFAULT_JOBS = 4  # スレッドの画像の同時アップロード数
+
+# スレッド原稿の書式: 単独行の「---」で投稿を区切り、単独行の ![alt](path) で直前の文章の投稿に画像を添付する
+_THREAD_BREAK_LINE = re.compile(r'^\s*-{3,}\s*$')
+_THREAD_IMAGE_LINE = re.compile(r'^\s*!\[([^\]]*)\]\(([^)]+)\)\s*$')
+# 文: 句点・感嘆符・疑問符（後続の閉じ括弧を含む）か、空白の前のピリオドまで
+_SENTENCE_RE = re.compile(r'.+?(?:[。．！？!?…]+[」』）)\]"]*|\.(?=\s|$)|$)\s*')
+# 長すぎる文を分ける位置: 読点・カンマ・空白
+_CLAUSE_RE = re.compile(r'.+?(?:[、，,;；:：]\s*|\s+|$)')
+
+
+def _split_long(sentence: str, limit: int) -> list[str]:
+    """limit を超える文を読点・空白の位置で、それでも超える部分は文字数で分割する"""
+    parts: list[str] = []
+    current = ""
+    for clause in _CLAUSE_RE.findall(sentence):
+        if len(current) + len(clause.rstrip()) <= limit:
+            current += clause
+            continue
+        if current.strip():
+            parts.append(current.rstrip())
+        current = ""
+        while len(clause.rstrip()) > limit:
+            parts.append(clause[:limit])
+            clause = clause[limit:]
+        current = clause
+    if current.strip():
+        parts.append(current.rstrip())
+    return parts
+
+
+def _thread_units(text: str, base_dir: Path) -> list[tuple]:
+    """
+    原稿を (種類, ...) の列に分解する。
+      ("text", 区切り, 文)    区切りは前の文との間に入れる文字列（同じ行なら ""、改行・空行なら "\\n" / "\\n\\n"）
+      ("image", パス, alt)
+      ("break",)
+    """
+    units: list[tuple] = []
+    newlines = 0
+    for line in text.splitlines():
+        if _THREAD_BREAK_LINE.match(line):
+            units.append(("break",))
+            newlines = 0
+            continue
+        m = _THREAD_IMAGE_LINE.match(line)
+        if m:
+            units.append(("image", base_dir / m.group(2).strip(), m.group(1)))
+            continue
+        if not line.strip():
+            newlines += 1
+            continue
+        sep = "\n\n" if newlines > 0 else "\n"
+        for sentence in _SENTENCE_RE.findall(line.strip()):
+            units.append(("text", sep, sentence))
+            sep = ""
+        newlines = 0
+    return units
+
+
+def _pack_thread(units: list[tuple], limit: int) -> list[dict]:
+    """文を limit 文字以内に詰めて投稿に分ける"""
+    posts: list[dict] = []
+    text, images = "", []
+
+    def flush():
+        nonlocal text, images
+        if text.strip() or images:
+            posts.append({"text": text.strip(), "images": images})
+        text, images = "", []
+
+    for unit in units:
+        if unit[0] == "break":
+            flush()
+        elif unit[0] == "image":
+            if len(images) == 4:
+                flush()
+            images.append((unit[1], unit[2]))
+        else:
+            _, sep, sentence = unit
+            candidate = text + sep + sentence if text.strip() else sentence
+            if len(candidate.rstrip()) <= limit:
+                text = candidate
+                continue
+            flush()
+            parts = _split_long(sentence.strip(), limit)
+            for part in parts[:-1]:
+                posts.append({"text": part, "images": []})
+            text = parts[-1] if parts else ""
+    flush()
+    return posts
+
+
+def split_thread(text: str, base_dir: Path = Path("."), limit: int = MAX_GRAPHEMES,
+                 numbering: bool = False) -> list[dict]:
+    """
+    長文を文の区切りで limit 文字以内の投稿に分割し、[{"text", "images": [(パス, alt), ...]}, ...] を返す。
+    numbering=True なら各投稿の末尾に「 1/n」を付ける（その分の文字数を空けて分割する）。
+    """
+    units = _thread_units(text, base_dir)
+    reserve = len(" 9/9") if numbering else 0
+    while True:
+        posts = _pack_thread(units, limit - reserve)
+        if not numbering:
+            return posts
+        need = len(f" {len(posts)}/{len(posts)}")
+        if need <= reserve:
+            break
+        reserve = need  # 投稿数の桁が増えたら空ける文字数を増やして分割し直す
+    n = len(posts)
+    for i, post in enumerate(posts, 1):
+        post["text"] = f"{post['text']} {i}/{n}".lstrip()
+    return posts
+
+
+def post_thread(session: dict, posts: list[dict], langs: list[str] | None = None,
+                cache: "handle_cache.HandleCache | None" = None, prep: dict | None = None,
+                jobs: int = DEFAULT_JOBS) -> list[dict]:
+    """
+    split_thread() の結果をスレッドとして投稿し、各投稿の {"uri", "cid"} を返す。
+    失敗時（posts が空の場合を含む）は RuntimeError を送出する（それまでに作成した投稿は残る）。
+
+      1. 全投稿の画像のアップロードを並列に開始する（前の投稿を作成している間も後ろの投稿の画像を送り続ける）
+      2. 先頭の投稿を createRecord で作成し、返された CID がローカルで計算した CID（dag_cbor）と一致するか確かめる
+      3. 一致すれば、残りの投稿は返信先（root / parent）の CID をローカルで計算して埋め、applyWrites でまとめて作成する
+         一致しなければ 1件ずつ createRecord し、返された CID で次の投稿の返信先を作る
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if not posts:
+        raise RuntimeError("投稿する本文がありません")
+    resolved = resolve_mentions(find_mentions("\n".join(p["text"] for p in posts)), cache)
+    all_images = list(dict.fromkeys(path for post in posts for path, _ in post["images"]))
+    sources = image_prep.prepare_images(all_images, prep, jobs) if prep and all_images else {}
+    rkeys = [atproto.generate_tid() for _ in posts]
+    started = datetime.now(timezone.utc)
+
+    atproto.ensure_pool_size(jobs)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        uploads = {path: pool.submit(atproto.upload_blob, session, sources.get(path, path), skip_existing=True)
+                   for path in all_images}
+
+        def build(i: int, root: dict | None, parent: dict | None) -> dict:
+            post = posts[i]
+            blobs = [uploads[path].result() for path, _ in post["images"]]
+            # createdAt を1ミリ秒ずつずらしてスレッド内の順序を保つ
+            created = started + timedelta(milliseconds=i)
+            record = build_post_record(
+                post["text"], detect_facets(post["text"], resolved), langs, blobs,
+                alts=[alt for _, alt in post["images"]],
+                created_at=created.strftime("%Y-%m-%dT%H:%M:%S.") + f"{created.microsecond // 1000:03d}Z",
+            )
+            if root is not None:
+                record["reply"] = {"root": root, "parent": parent}
+            return record
+
+        record = build(0, None, None)
+        root = create_post_record(session, record, rkeys[0])
+        print(f"  ✓ 1/{len(posts)} {root['uri']}")
+        results = [root]
+        if len(posts) == 1:
+            return results
+
+        if root["cid"] == dag_cbor.record_cid(record):
+            parent = root
+            writes = []
+            for i in range(1, len(posts)):
+                record = build(i, root, parent)
+                parent = {"uri": f"at://{session['did']}/app.bsky.feed.post/{rkeys[i]}",
+                          "cid": dag_cbor.record_cid(record)}
+                writes.append({"$type": "com.atproto.repo.applyWrites#create",
+                               "collection": "app.bsky.feed.post", "rkey": rkeys[i], "value": record})
+                results.append(parent)
+            for i, result in enumerate(atproto.apply_writes(session, writes), 1):
+                if result.get("cid") and result["cid"] != results[i]["cid"]:
+                    print(f"  ⚠ {i + 1}/{len(posts)} の CID がローカルの計算と一致しません: {result['cid']}")
+            print(f"  ✓ 2〜{len(posts)}/{len(posts)} を applyWrites で作成")
+        else:
+            print("  ローカルで計算した CID が PDS の結果と一致しないため、1件ずつ投稿します")
+            parent = root
+            for i in range(1, len(posts)):
+                parent = create_post_record(session, build(i, root, parent), rkeys[i])
+                results.append(parent)
+                print(f"  ✓ {i + 1}/{len(posts)} {parent['uri']}")
+    return results
+
+
 # ──────────────────────────────────────────────
 # サブコマンド
 # ──────────────────────────────────────────────
 
-def cmd_post(args):
-    # テキスト取得: 引数 → ファイル → stdin の順
+def read_text(args) -> str:
+    """投稿テキストを 引数 → ファイル → stdin の順で取得する"""
     if args.text:
         text = args.text
     elif args.file:
@@ -168,6 +748,15 @@ def cmd_post(args):
     if not text:
         print("テキストが空です。")
         sys.exit(1)
+    return text
+
+
+def cmd_post(args):
+    import asyncio
+
+    import handle_cache
+
+    text = read_text(args)
 
     # 文字数チェック（grapheme 単位の簡易計算）
     grapheme_count = len(text)
@@ -188,13 +777,52 @@ def cmd_post(args):
                 sys.exit(1)
             images.append(img_path)
 
+    # 動画ファイルの検証
+    video = Path(args.video) if args.video else None
+    if video:
+        if not video.exists():
+            print(f"動画ファイルが見つかりません: {video}")
+            sys.exit(1)
+        try:
+            validate_video(video)
+        except RuntimeError as e:
+            print(f"エラー: {e}")
+            sys.exit(1)
+
     langs = args.lang if args.lang else None
 
     config = atproto.load_config()
-    session = atproto.create_session(config["handle"], config["password"])
+    session = atproto.login(config["handle"], config["password"])
+
+    cache = None if args.no_cache else handle_cache.shared()
+    prep = image_prep.options_from_args(args)
+
+    embed = None
+    if video:
+        print("\n[動画のアップロード]")
+        try:
+            blob, aspect_ratio = upload_video(
+                session, video,
+                service=config.get("video_service", VIDEO_SERVICE),
+                service_did=config.get("video_service_did", VIDEO_SERVICE_DID),
+            )
+        except RuntimeError as e:
+            print(f"エラー: {e}")
+            sys.exit(1)
+        embed = build_video_embed(blob, aspect_ratio, args.alt)
 
     print("\n[スキートの投稿]")
-    at_uri = post_skeet(session, text, images=images or None, langs=langs)
+    if args.use_async:
+        try:
+            at_uri = asyncio.run(post_skeet_async(session, text, images=images or None,
+                                                langs=langs, cache=cache, prep=prep,
+                                                embed=embed))
+        except RuntimeError as e:
+            print(f"エラー: {e}")
+            sys.exit(1)
+    else:
+        at_uri = post_skeet(session, text, images=images or None, langs=langs, cache=cache, prep=prep,
+                            embed=embed)
 
     rkey = at_uri.split("/")[-1]
     url = f"https://bsky.app/profile/{config['handle']}/post/{rkey}"
@@ -204,11 +832,62 @@ def cmd_post(args):
     print(f"   文字数 : {grapheme_count}文字")
     if images:
         print(f"   画像数 : {len(images)}枚")
+    if video:
+        print(f"   動画   : {video.name}")
     print(f"   URL    : {url}")
     print(f"   AT URI : {at_uri}")
     print(f"{'='*50}\n")
 
 
+def cmd_thread(args):
+    import handle_cache
+
+    text = read_text(args)
+    base_dir = Path(args.file).parent if args.file else Path(".")
+    posts = split_thread(text, base_dir, numbering=args.numbering)
+    if not posts:  # 空白や区切り線（---）だけの原稿
+        print("エラー: 投稿する本文がありません")
+        sys.exit(1)
+
+    # 画像ファイルの検証
+    for post in posts:
+        for img_path, _ in post["images"]:
+            if not img_path.exists():
+                print(f"画像ファイルが見つかりません: {img_path}")
+                sys.exit(1)
+
+    if args.dry_run:
+        for i, post in enumerate(posts, 1):
+            print(f"\n── {i}/{len(posts)} ({len(post['text'])}文字) ──")
+            print(post["text"])
+            for img_path, alt in post["images"]:
+                print(f"  [画像] {img_path}" + (f" alt={alt}" if alt else ""))
+        print()
+        return
+
+    langs = args.lang if args.lang else None
+
+    config = atproto.load_config()
+    session = atproto.login(config["handle"], config["password"])
+
+    cache = None if args.no_cache else handle_cache.shared()
+    prep = image_prep.options_from_args(args)
+
+    print(f"\n[スレッドの投稿] {len(posts)}件")
+    try:
+        results = post_thread(session, posts, langs=langs, cache=cache, prep=prep, jobs=args.jobs)
+    except RuntimeError as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+
+    print(f"\n{'='*50}")
+    print(f"✅ スレッド投稿完了! ({len(results)}件)")
+    for result in results:
+        rkey = result["uri"].split("/")[-1]
+        print(f"   https://bsky.app/profile/{config['handle']}/post/{rkey}")
+    print(f"{'='*50}\n")
+
+
 # ──────────────────────────────────────────────
 # メイン
 # ──────────────────────────────────────────────
@@ -234,37 +913,82 @@ def main():
   # 複数画像・複数言語
   python bsky_post.py post "テスト" --image a.jpg --image b.jpg --lang ja --lang en
 
+  # 動画付き（alt テキストつき）
+  python bsky_post.py post "動画です" --video clip.mp4 --alt "猫が走っている動画"
+
+  # 長文をスレッドに分割して投稿（各投稿の末尾に 1/n を付ける）
+  python bsky_post.py thread --file long.txt --numbering
+
+  # 分割結果の確認のみ
+  python bsky_post.py thread --file long.txt --dry-run
+
 リッチテキスト（自動検出）:
   - URL (https://...) → クリック可能なリンク
   - @ハンドル.ドメイン  → メンションリンク
   - #ハッシュタグ       → タグリンク
+
+スレッドの原稿（thread）:
+  - 文の区切り（。！？ など）で 300 文字以内に分割
+  - 単独行の ---           → そこで投稿を区切る
+  - 単独行の ![alt](画像)  → 直前の文章の投稿に画像を添付（1投稿4枚まで）
         """,
     )
+    parser.add_argument("--trace", metavar="FILE",
+                        help="通信の記録を FILE に保存し、終了時に集計を表示 (.json: Chrome トレース形式, それ以外: JSONL)")
     sub = parser.add_subparsers(dest="command")
 
     p_post = sub.add_parser("post", help="スキートを投稿")
     p_post.add_argument("text", nargs="?", help="投稿テキスト（省略時は --file またはstdinから読み込む）")
     p_post.add_argument("--file", "-f", metavar="FILE", help="テキストファイルのパス")
-    p_post.add_argument(
+    media = p_post.add_mutually_exclusive_group()
+    media.add_argument(
         "--image", "-i",
         action="append",
         metavar="FILE",
         help="添付画像のパス（最大4枚、複数回指定可）",
     )
+    media.add_argument("--video", metavar="FILE",
+                       help=f"添付動画のパス（{', '.join(VIDEO_EXTENSIONS)}。100MB・3分まで。--image と排他）")
+    p_post.add_argument("--alt", metavar="TEXT", help="動画の代替テキスト（アクセシビリティ用）")
     p_post.add_argument(
         "--lang", "-l",
         action="append",
         metavar="LANG",
         help="言語コード（例: ja, en）複数回指定可",
     )
+    p_post.add_argument("--no-cache", action="store_true",
+                        help="ハンドル → DID の解決キャッシュを使わない")
+    p_post.add_argument("--async", dest="use_async", action="store_true",
+                        help="ハンドル解決と画像アップロードを asyncio クライアントで同時に実行 (要 aiohttp)")
+    image_prep.add_arguments(p_post, default_max_bytes=image_prep.BSKY_MAX_BYTES)
     p_post.set_defaults(func=cmd_post)
 
+    p_thread = sub.add_parser("thread", help="長文をスレッドに分割して投稿")
+    p_thread.add_argument("text", nargs="?", help="投稿テキスト（省略時は --file またはstdinから読み込む）")
+    p_thread.add_argument("--file", "-f", metavar="FILE",
+                          help="テキストファイルのパス（画像のパスはこのファイルからの相対パス）")
+    p_thread.add_argument("--numbering", action="store_true", help="各投稿の末尾に「1/n」を付ける")
+    p_thread.add_argument(
+        "--lang", "-l",
+        action="append",
+        metavar="LANG",
+        help="言語コード（例: ja, en）複数回指定可",
+    )
+    p_thread.add_argument("--jobs", "-j", type=int, default=DEFAULT_JOBS,
+                          help=f"画像の同時アップロード数 (default: {DEFAULT_JOBS})")
+    p_thread.add_argument("--no-cache", action="store_true",
+                          help="ハンドル → DID の解決キャッシュを使わない")
+    p_thread.add_argument("--dry-run", action="store_true", help="投稿せずに分割結果を表示する")
+    image_prep.add_arguments(p_thread, default_max_bytes=image_prep.BSKY_MAX_BYTES)
+    p_thread.set_defaults(func=cmd_thread)
+
     args = parser.parse_args()
     if not args.command:
         parser.print_help()
         sys.exit(0)
 
-    args.func(args)
+    with request_trace.recording(args.trace):
+        args.func(args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+daemon.py - セッション・接続・キャッシュを保持し続ける常駐プロセス（任意）
+
+whtwnd_post.py / bsky_post.py は呼び出しのたびにインタープリターの起動、requests 等の import、
+設定の読み込み、ログイン、TLS 接続の確立を行う。CI などで何百回も呼び出す場合、
+デーモンを起動しておくと、各コマンドはジョブを Unix ドメインソケットで送って出力を受け取るだけになる。
+デーモン側では共有HTTPクライアント（keep-alive 済みの接続）、セッション、
+blob キャッシュ・記事索引・ハンドル解決キャッシュの SQLite 接続をジョブをまたいで使い回す。
+
+使い方:
+  python daemon.py start              # バックグラウンドで起動（ログ: ~/.cache/whtwnd-cli/daemon.log）
+  python daemon.py start --foreground # フォアグラウンドで起動
+  python daemon.py status
+  python daemon.py stop
+
+  export WHTWND_DAEMON=1              # 以降の whtwnd_post.py / bsky_post.py はデーモンで実行される
+  python whtwnd_post.py post article.md
+
+WHTWND_DAEMON を設定していてもデーモンに接続できない場合は、通常どおりその場で実行する。
+
+プロトコル（1行1 JSON）:
+  クライアント → {"script", "argv", "cwd", "tty": [stdin, stdout]}  または {"control": "status" | "stop"}
+  デーモン     → {"out": 文字列} / {"err": 文字列} を逐次、最後に {"exit": 終了コード}
+                 標準入力が必要になると {"read": "all" | "line"} を送り、クライアントは {"data": 文字列} を返す
+ジョブは受け付けた順に1件ずつ実行する（カレントディレクトリ・標準入出力をジョブごとに切り替えるため）。
+
+クライアント側は重いモジュールを読み込む前に転送するため、このモジュールのトップレベルでは標準ライブラリの
+軽いモジュールだけを import する。
+"""
+
+import json
+import os
+import socket
+import sys
+import time
+
+# atproto.CACHE_DIR と同じ場所（クライアントは atproto を import しない）
+_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "whtwnd-cli")
+SOCKET_PATH = os.environ.get("WHTWND_DAEMON_SOCKET") or os.path.join(_CACHE_DIR, "daemon.sock")
+LOG_PATH = os.path.join(_CACHE_DIR, "daemon.log")
+SCRIPTS = ("whtwnd_post", "bsky_post")
+LOCAL_COMMANDS = ("watch",)  # 終了しないコマンドはデーモンを占有するため、その場で実行する
+_VALUE_OPTIONS = ("--trace",)  # サブコマンドの前に指定でき、値を1つ取るオプション（両 CLI 共通）
+_START_TIMEOUT = 10
+
+
+# ──────────────────────────────────────────────
+# クライアント
+# ──────────────────────────────────────────────
+
+def _connect() -> socket.socket | None:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(SOCKET_PATH)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def _send_message(sock: socket.socket, message: dict):
+    sock.sendall(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+
+
+def _subcommand(argv: list[str]) -> str | None:
+    """
+    引数からサブコマンドを取り出す（サブコマンドの前のオプションとその値は読み飛ばす）。
+    argparse と同じく、"--trace=FILE" の形と一意な省略形（"--tr FILE"）も扱う。
+    """
+    args = iter(argv)
+    for arg in args:
+        if arg == "--":
+            return next(args, None)
+        if not arg.startswith("-"):
+            return arg
+        if "=" not in arg and len(arg) > 2 and any(opt.startswith(arg) for opt in _VALUE_OPTIONS):
+            next(args, None)
+    return None
+
+
+def forward(script: str):
+    """
+    環境変数 WHTWND_DAEMON が設定されていれば、コマンドライン引数をデーモンに送って実行し、
+    その終了コードで終了する。未設定・LOCAL_COMMANDS のコマンド・デーモンに接続できない場合は何もせずに戻る。
+    """
+    if not os.environ.get("WHTWND_DAEMON") or _subcommand(sys.argv[1:]) in LOCAL_COMMANDS:
+        return
+    sock = _connect()
+    if sock is None:
+        print("  デーモンに接続できないため、その場で実行します（python daemon.py start で起動）", file=sys.stderr)
+        return
+
+    with sock:
+        _send_message(sock, {
+            "script": script,
+            "argv": sys.argv[1:],
+            "cwd": os.getcwd(),
+            "tty": [sys.stdin.isatty(), sys.stdout.isatty()],
+        })
+        for line in sock.makefile("r", encoding="utf-8"):
+            message = json.loads(line)
+            if "out" in message:
+                sys.stdout.write(message["out"])
+                sys.stdout.flush()
+            elif "err" in message:
+                sys.stderr.write(message["err"])
+                sys.stderr.flush()
+            elif "read" in message:
+                data = sys.stdin.read() if message["read"] == "all" else sys.stdin.readline()
+                _send_message(sock, {"data": data})
+            elif "exit" in message:
+                sys.exit(message["exit"])
+    print("エラー: デーモンとの接続が切れました。", file=sys.stderr)
+    sys.exit(1)
+
+
+def _control(command: str) -> dict | None:
+    sock = _connect()
+    if sock is None:
+        return None
+    with sock:
+        _send_message(sock, {"control": command})
+        line = sock.makefile("r", encoding="utf-8").readline()
+    return json.loads(line) if line else None
+
+
+# ──────────────────────────────────────────────
+# サーバー
+# ──────────────────────────────────────────────
+
+class _RemoteOutput:
+    """書き込みをクライアントに転送する標準出力・標準エラー出力"""
+
+    def __init__(self, job: "_Job", kind: str, tty: bool):
+        self._job = job
+        self._kind = kind
+        self._tty = tty
+        self.encoding = "utf-8"
+
+    def write(self, text: str) -> int:
+        if text:
+            self._job.send({self._kind: text})
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return self._tty
+
+
+class _RemoteInput:
+    """読み込みのたびにクライアントの標準入力を取り寄せる標準入力"""
+
+    def __init__(self, job: "_Job", tty: bool):
+        self._job = job
+        self._tty = tty
+        self.encoding = "utf-8"
+
+    def read(self, size: int = -1) -> str:
+        return self._job.request_input("all")
+
+    def readline(self, size: int = -1) -> str:
+        return self._job.request_input("line")
+
+    def isatty(self) -> bool:
+        return self._tty
+
+
+class _Job:
+    """1接続分のジョブ。クライアントとのメッセージの送受信を受け持つ"""
+
+    def __init__(self, conn: socket.socket):
+        self.conn = conn
+        self.reader = conn.makefile("r", encoding="utf-8")
+        self.connected = True
+
+    def receive(self) -> dict | None:
+        line = self.reader.readline()
+        return json.loads(line) if line else None
+
+    def send(self, message: dict):
+        if not self.connected:
+            return
+        try:
+            _send_message(self.conn, message)
+        except OSError:
+            self.connected = False  # クライアントが終了しても処理は最後まで続ける
+
+    def request_input(self, mode: str) -> str:
+        self.send({"read": mode})
+        reply = self.receive() if self.connected else None
+        return reply["data"] if reply else ""
+
+
+def _run_job(job: _Job, request: dict) -> int:
+    """スクリプトの main() をクライアントのカレントディレクトリ・引数・標準入出力で実行し、終了コードを返す"""
+    import contextlib
+    import importlib
+    import traceback
+
+    script = request.get("script")
+    if script not in SCRIPTS:
+        job.send({"err": f"不明なスクリプトです: {script}\n"})
+        return 2
+    module = importlib.import_module(script)
+    stdin_tty, stdout_tty = request.get("tty") or (False, False)
+
+    saved_cwd, saved_argv, saved_stdin = os.getcwd(), sys.argv, sys.stdin
+    try:
+        os.chdir(request["cwd"])
+        sys.argv = [f"{script}.py", *request["argv"]]
+        sys.stdin = _RemoteInput(job, stdin_tty)
+        with contextlib.redirect_stdout(_RemoteOutput(job, "out", stdout_tty)), \
+                contextlib.redirect_stderr(_RemoteOutput(job, "err", stdout_tty)):
+            try:
+                module.main()
+                return 0
+            except SystemExit as e:
+                if e.code is None or isinstance(e.code, int):
+                    return e.code or 0
+                print(e.code, file=sys.stderr)
+                return 1
+            except Exception:
+                traceback.print_exc()
+                return 1
+    finally:
+        os.chdir(saved_cwd)
+        sys.argv, sys.stdin = saved_argv, saved_stdin
+
+
+def serve():
+    """ソケットで待ち受け、ジョブを1件ずつ実行する（stop を受けるまで戻らない）"""
+    # 最初のジョブを待たせないよう、スクリプトとキャッシュを起動時に読み込んでおく
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import blob_cache
+    import entry_index
+    import handle_cache
+    for script in SCRIPTS:
+        __import__(script)
+    for module in (blob_cache, entry_index, handle_cache):
+        module.shared()
+
+    os.makedirs(_CACHE_DIR, mode=0o700, exist_ok=True)
+    if os.path.exists(SOCKET_PATH):
+        if _control("status") is not None:
+            print(f"デーモンは既に起動しています: {SOCKET_PATH}")
+            sys.exit(1)
+        os.unlink(SOCKET_PATH)  # 前回異常終了したときのソケット
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(SOCKET_PATH)
+    os.chmod(SOCKET_PATH, 0o600)
+    server.listen(64)
+    started = time.time()
+    jobs = 0
+    print(f"✓ デーモン起動: {SOCKET_PATH} (PID {os.getpid()})", flush=True)
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                job = _Job(conn)
+                try:
+                    request = job.receive()
+                except (OSError, ValueError):
+                    continue
+                if request is None:
+                    continue
+                control = request.get("control")
+                if control == "status":
+                    job.send({"pid": os.getpid(), "uptime": time.time() - started, "jobs": jobs})
+                    continue
+                if control == "stop":
+                    job.send({"stopped": True})
+                    break
+                jobs += 1
+                began = time.monotonic()
+                code = _run_job(job, request)
+                job.send({"exit": code})
+                print(f"  job {jobs}: {request.get('script')} {' '.join(request.get('argv', [])[:1])} "
+                      f"→ {code} ({(time.monotonic() - began) * 1000:.0f} ms)", flush=True)
+    finally:
+        server.close()
+        os.unlink(SOCKET_PATH)
+        print("✓ デーモン停止", flush=True)
+
+
+def start_background():
+    """デーモンを別セッションのプロセスとして起動し、ソケットが応答するまで待つ"""
+    import subprocess
+
+    if _control("status") is not None:
+        print(f"デーモンは既に起動しています: {SOCKET_PATH}")
+        return
+    os.makedirs(_CACHE_DIR, mode=0o700, exist_ok=True)
+    with open(LOG_PATH, "a") as log:
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "start", "--foreground"],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+        )
+    deadline = time.monotonic() + _START_TIMEOUT
+    while time.monotonic() < deadline:
+        status = _control("status")
+        if status is not None:
+            print(f"✓ デーモン起動: {SOCKET_PATH} (PID {status['pid']})")
+            return
+        if proc.poll() is not None:
+            break
+        time.sleep(0.05)
+    print(f"エラー: デーモンを起動できませんでした。ログを確認してください: {LOG_PATH}")
+    sys.exit(1)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="whtwnd_post.py / bsky_post.py のジョブを実行する常駐プロセス")
+    sub = parser.add_subparsers(dest="command")
+    p_start = sub.add_parser("start", help="デーモンを起動")
+    p_start.add_argument("--foreground", action="store_true", help="フォアグラウンドで実行する")
+    sub.add_parser("stop", help="デーモンを停止")
+    sub.add_parser("status", help="デーモンの状態を表示")
+    args = parser.parse_args()
+
+    if args.command == "start":
+        if args.foreground:
+            serve()
+        else:
+            start_background()
+    elif args.command == "stop":
+        if _control("stop") is None:
+            print("デーモンは起動していません。")
+            sys.exit(1)
+        print("✓ デーモンを停止しました")
+    elif args.command == "status":
+        status = _control("status")
+        if status is None:
+            print("デーモンは起動していません。")
+            sys.exit(1)
+        print(f"  PID      : {status['pid']}")
+        print(f"  ソケット : {SOCKET_PATH}")
+        print(f"  稼働時間 : {status['uptime']:.0f} 秒")
+        print(f"  実行数   : {status['jobs']}件")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+dag_cbor.py - レコードの DAG-CBOR エンコード・デコードと CID 計算
+
+PDS はレコードを DAG-CBOR にエンコードし、その sha256 から CID（CIDv1, dag-cbor コーデック）を決める。
+同じ計算をローカルで行えば、レコードを書き込む前に CID が分かる。
+スレッド投稿で返信の parent / root に前の投稿の CID を入れた状態で、全投稿を1回の applyWrites に載せるために使う。
+デコードは export（com.atproto.sync.getRepo の CAR の読み取り、repo_car.py）で使う。
+
+JSON 表現からの変換規則（AT Protocol のデータモデル）:
+  {"$link": "<CID文字列>"} → CID（CBOR タグ 42）
+  {"$bytes": "<base64>"}   → バイト列
+  マップのキーは「長さ → バイト列」の順に並べる。浮動小数点数は扱わない（レコードでは使えない）。
+"""
+
+import base64
+import hashlib
+import struct
+
+_CID_TAG = 42
+_DAG_CBOR_CODEC = 0x71
+
+
+def _head(major: int, n: int) -> bytes:
+    """CBOR の型と長さ（または整数値）を最短の形式でエンコードする"""
+    if n < 24:
+        return bytes([(major << 5) | n])
+    if n < 1 << 8:
+        return bytes([(major << 5) | 24, n])
+    if n < 1 << 16:
+        return bytes([(major << 5) | 25]) + struct.pack(">H", n)
+    if n < 1 << 32:
+        return bytes([(major << 5) | 26]) + struct.pack(">I", n)
+    return bytes([(major << 5) | 27]) + struct.pack(">Q", n)
+
+
+def cid_to_bytes(cid: str) -> bytes:
+    """base32（"b" 始まり）の CID 文字列をバイナリ表現に変換する"""
+    if not cid.startswith("b"):
+        raise ValueError(f"base32 以外の CID には対応していません: {cid}")
+    body = cid[1:].upper()
+    return base64.b32decode(body + "=" * (-len(body) % 8))
+
+
+def cid_from_bytes(raw: bytes) -> str:
+    """CID のバイナリ表現を base32（"b" 始まり）の文字列にする"""
+    return "b" + base64.b32encode(raw).decode().lower().rstrip("=")
+
+
+def _encode(value, out: list):
+    if value is True:
+        out.append(b"\xf5")
+    elif value is False:
+        out.append(b"\xf4")
+    elif value is None:
+        out.append(b"\xf6")
+    elif isinstance(value, int):
+        out.append(_head(0, value) if value >= 0 else _head(1, -1 - value))
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        out.append(_head(3, len(data)))
+        out.append(data)
+    elif isinstance(value, (bytes, bytearray)):
+        out.append(_head(2, len(value)))
+        out.append(bytes(value))
+    elif isinstance(value, (list, tuple)):
+        out.append(_head(4, len(value)))
+        for item in value:
+            _encode(item, out)
+    elif isinstance(value, dict):
+        if len(value) == 1 and "$link" in value:
+            # CID は先頭に multibase の identity プレフィックス 0x00 を付けたバイト列としてタグ42で表す
+            raw = b"\x00" + cid_to_bytes(value["$link"])
+            out.append(_head(6, _CID_TAG))
+            out.append(_head(2, len(raw)))
+            out.append(raw)
+            return
+        if len(value) == 1 and "$bytes" in value:
+            data = base64.b64decode(value["$bytes"] + "=" * (-len(value["$bytes"]) % 4))
+            out.append(_head(2, len(data)))
+            out.append(data)
+            return
+        keys = sorted(value, key=lambda k: (len(k.encode("utf-8")), k.encode("utf-8")))
+        out.append(_head(5, len(keys)))
+        for key in keys:
+            _encode(key, out)
+            _encode(value[key], out)
+    else:
+        raise TypeError(f"DAG-CBOR にエンコードできない値です: {type(value).__name__}")
+
+
+def encode(value) -> bytes:
+    """JSON 表現のレコードを DAG-CBOR にエンコードする"""
+    out: list[bytes] = []
+    _encode(value, out)
+    return b"".join(out)
+
+
+def record_cid(value) -> str:
+    """レコードの CID（CIDv1, dag-cbor, sha2-256, base32）を計算する"""
+    digest = hashlib.sha256(encode(value)).digest()
+    return cid_from_bytes(bytes([0x01, _DAG_CBOR_CODEC, 0x12, 0x20]) + digest)
+
+
+# ──────────────────────────────────────────────
+# デコード
+# ──────────────────────────────────────────────
+
+def _read_head(data: bytes, pos: int) -> tuple[int, int, int]:
+    """data[pos:] の型と長さ（または整数値）を読み、(型, 長さ, 次の位置) を返す（_head() の逆）"""
+    initial = data[pos]
+    major, info = initial >> 5, initial & 0x1F
+    if info < 24:
+        return major, info, pos + 1
+    if info == 24:
+        return major, data[pos + 1], pos + 2
+    if info == 25:
+        return major, struct.unpack_from(">H", data, pos + 1)[0], pos + 3
+    if info == 26:
+        return major, struct.unpack_from(">I", data, pos + 1)[0], pos + 5
+    if info == 27:
+        return major, struct.unpack_from(">Q", data, pos + 1)[0], pos + 9
+    raise ValueError(f"DAG-CBOR で使えない長さの指定です: 0x{initial:02x}")
+
+
+def _decode(data: bytes, pos: int, raw: bool):
+    """data[pos:] の値を1つ読み、(JSON 表現の値, 次の位置) を返す（raw なら CID・バイト列は bytes のまま）"""
+    initial = data[pos]
+    if 0x60 <= initial < 0x78:  # 23バイト以下の文字列（キー・短い値。よく現れるので先に扱う）
+        end = pos + 1 + initial - 0x60
+        return data[pos + 1:end].decode("utf-8"), end
+    if initial < 0x18:
+        return initial, pos + 1
+    if initial >> 5 == 7:
+        if initial == 0xF4:
+            return False, pos + 1
+        if initial == 0xF5:
+            return True, pos + 1
+        if initial == 0xF6:
+            return None, pos + 1
+        if initial in (0xF9, 0xFA, 0xFB):  # 浮動小数点数（レコードでは使わないが、読めるようにしておく）
+            size, fmt = {0xF9: (2, ">e"), 0xFA: (4, ">f"), 0xFB: (8, ">d")}[initial]
+            return struct.unpack_from(fmt, data, pos + 1)[0], pos + 1 + size
+        raise ValueError(f"DAG-CBOR で使えない値です: 0x{initial:02x}")
+
+    major, n, pos = _read_head(data, pos)
+    if major == 0:
+        return n, pos
+    if major == 1:
+        return -1 - n, pos
+    if major == 2:
+        if raw:
+            return data[pos:pos + n], pos + n
+        return {"$bytes": base64.b64encode(data[pos:pos + n]).decode().rstrip("=")}, pos + n
+    if major == 3:
+        return data[pos:pos + n].decode("utf-8"), pos + n
+    if major == 4:
+        items = []
+        for _ in range(n):
+            item, pos = _decode(data, pos, raw)
+            items.append(item)
+        return items, pos
+    if major == 5:
+        value = {}
+        for _ in range(n):
+            initial = data[pos]
+            if 0x60 <= initial < 0x78:
+                end = pos + 1 + initial - 0x60
+                key, pos = data[pos + 1:end].decode("utf-8"), end
+            else:
+                key, pos = _decode(data, pos, raw)
+                if not isinstance(key, str):
+                    raise ValueError("DAG-CBOR のマップのキーは文字列のみです")
+            value[key], pos = _decode(data, pos, raw)
+        return value, pos
+    # major == 6: タグは CID（42）のみ。先頭に 0x00 を付けたバイト列が続く
+    if n != _CID_TAG:
+        raise ValueError(f"DAG-CBOR で使えないタグです: {n}")
+    major, n, pos = _read_head(data, pos)
+    if major != 2 or n < 2 or data[pos] != 0:
+        raise ValueError("CID（タグ42）の値が不正です")
+    if raw:
+        return data[pos + 1:pos + n], pos + n
+    return {"$link": cid_from_bytes(data[pos + 1:pos + n])}, pos + n
+
+
+def decode(data: bytes, raw: bool = False):
+    """
+    DAG-CBOR のバイト列を JSON 表現の値にする（encode() の逆。CID → {"$link"}、バイト列 → {"$bytes"}）。
+    raw=True の場合、CID はバイナリ表現（cid_from_bytes() で文字列になる）、バイト列は bytes のまま返す
+    （MST のノードのように、CID やバイト列を多く含むブロックを速く読むため）。
+    """
+    value, pos = _decode(data, 0, raw)
+    if pos != len(data):
+        raise ValueError(f"DAG-CBOR の後に余分なデータがあります（{len(data) - pos} バイト）")
+    return value
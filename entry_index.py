@@ -0,0 +1,159 @@
+"""
+entry_index.py - WhiteWind 記事（com.whtwnd.blog.entry）のローカル索引
+
+タイトル → rkey の検索を listRecords の全件走査なしで行うための SQLite 索引。
+各記事の rkey・タイトル・レコードCID・createdAt を DID ごとに保持する。
+
+保存先: atproto.CACHE_DIR / "entries.sqlite3"
+
+差分同期:
+  listRecords を新しい順（rkey 降順）に取得し、既知の rkey を含むページまで読んだら止める。
+  通常は1リクエストで済む。既知の rkey の CID が索引と異なる場合（他のクライアントで編集された等）は
+  索引を信用せず全件取得で作り直す。
+  停止したページより古い記事の削除・編集は検出できないため、検索結果の rkey は書き込み前に
+  getRecord で確かめること（whtwnd_post.find_rkey_by_title()）。
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import atproto
+
+DEFAULT_PATH = atproto.CACHE_DIR / "entries.sqlite3"
+COLLECTION = "com.whtwnd.blog.entry"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    did        TEXT NOT NULL,
+    rkey       TEXT NOT NULL,
+    title      TEXT,
+    cid        TEXT,
+    created_at TEXT,
+    PRIMARY KEY (did, rkey)
+);
+CREATE INDEX IF NOT EXISTS entries_title ON entries (did, title);
+CREATE TABLE IF NOT EXISTS synced (
+    did       TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL
+);
+"""
+
+
+def _row(did: str, record: dict) -> tuple:
+    value = record["value"]
+    return (did, record["uri"].split("/")[-1], value.get("title"),
+            record.get("cid"), value.get("createdAt"))
+
+
+class EntryIndex:
+    """記事の SQLite 索引"""
+
+    def __init__(self, path: Path = DEFAULT_PATH):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def sync(self, session: dict) -> int:
+        """索引を差分同期し、発行した listRecords のリクエスト数を返す"""
+        did = session["did"]
+        with self._lock:
+            synced = self._db.execute("SELECT 1 FROM synced WHERE did = ?", (did,)).fetchone()
+            known = dict(self._db.execute("SELECT rkey, cid FROM entries WHERE did = ?", (did,)))
+        if not synced:
+            return self.rebuild(session)
+
+        requests_made = 0
+        for page in atproto.iter_pages(session, COLLECTION, prefetch=False):
+            requests_made += 1
+            rows = [_row(did, r) for r in page.get("records", [])]
+            reached_known = False
+            for row in rows:
+                rkey, cid = row[1], row[3]
+                if rkey in known:
+                    reached_known = True
+                    if known[rkey] is not None and known[rkey] != cid:
+                        print("  索引のCIDが一致しないため記事索引を作り直します...")
+                        return requests_made + self.rebuild(session)
+            self._upsert(did, rows)
+            if reached_known:
+                break
+        self._mark_synced(did)
+        return requests_made
+
+    def rebuild(self, session: dict) -> int:
+        """listRecords を全件取得して索引を作り直し、リクエスト数を返す"""
+        did = session["did"]
+        rows = []
+        requests_made = 0
+        for page in atproto.iter_pages(session, COLLECTION):
+            requests_made += 1
+            rows.extend(_row(did, r) for r in page.get("records", []))
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM entries WHERE did = ?", (did,))
+        self._upsert(did, rows)
+        self._mark_synced(did)
+        return requests_made
+
+    def find_by_title(self, did: str, title: str) -> str | None:
+        """タイトルが一致する記事の rkey を返す（複数あれば最新）。なければ None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT rkey FROM entries WHERE did = ? AND title = ? ORDER BY rkey DESC LIMIT 1",
+                (did, title),
+            ).fetchone()
+        return row[0] if row else None
+
+    def get(self, did: str, rkey: str) -> dict | None:
+        """索引上の記事情報 {"rkey", "title", "cid", "createdAt"} を返す。なければ None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT rkey, title, cid, created_at FROM entries WHERE did = ? AND rkey = ?",
+                (did, rkey),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"rkey": row[0], "title": row[1], "cid": row[2], "createdAt": row[3]}
+
+    def put(self, did: str, rkey: str, title: str | None, cid: str | None, created_at: str | None):
+        """
+        このツールで作成・更新した記事を索引に反映する。
+        cid が不明な場合は None を渡す（次回同期時にサーバー側の値で上書きされる）。
+        """
+        self._upsert(did, [(did, rkey, title, cid, created_at)])
+
+    def remove(self, did: str, rkey: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM entries WHERE did = ? AND rkey = ?", (did, rkey))
+
+    def _upsert(self, did: str, rows: list[tuple]):
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO entries (did, rkey, title, cid, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def _mark_synced(self, did: str):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO synced (did, synced_at) VALUES (?, ?)", (did, time.time()),
+            )
+
+
+_shared: EntryIndex | None = None
+_shared_lock = threading.Lock()
+
+
+def shared() -> EntryIndex:
+    """既定の保存先のインスタンスをプロセス内で共有する（デーモンではジョブをまたいで接続を保持する）"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = EntryIndex()
+        return _shared
@@ -0,0 +1,216 @@
+"""
+file_watch.py - ファイルの変更監視（inotify、使えない環境ではポーリング）
+
+whtwnd_post.py watch で Markdown と参照画像の保存を検知するために使う。
+Linux では libc の inotify を ctypes で直接呼び出し（追加の依存なし）、
+ルートディレクトリ配下を再帰的に、追加で指定したディレクトリ（ルート外の画像置き場）を非再帰で監視する。
+inotify が使えない環境（macOS・Windows・監視数の上限超過など）では、
+一定間隔でサイズと mtime を比較するポーリングに切り替える。
+
+どちらも wait(timeout) で「変更があったパスの集合」を返す（タイムアウト時は空集合）。
+イベントの取りこぼし（inotify のキュー溢れ）が起きた場合はルートディレクトリ自体を返すので、
+呼び出し側は全ファイルを再確認すること。
+"""
+
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+DEFAULT_INTERVAL = 1.0  # ポーリング間隔（秒）
+
+# <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+# IN_MODIFY は書き込みのたびに届くので使わず、書き込み完了（IN_CLOSE_WRITE）と
+# 一時ファイルからの rename（IN_MOVED_TO）で保存を検知する
+_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+# ──────────────────────────────────────────────
+# inotify
+# ──────────────────────────────────────────────
+
+class InotifyWatcher:
+    """inotify によるディレクトリ監視。inotify が使えなければ OSError を送出する"""
+
+    name = "inotify"
+
+    def __init__(self, root: Path):
+        import ctypes
+        import ctypes.util
+
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify は Linux でのみ使用できます")
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._ctypes = ctypes
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 に失敗しました")
+        self.root = root.resolve()
+        self._dirs: dict[int, tuple[Path, bool]] = {}  # wd → (ディレクトリ, 再帰監視か)
+        self._watched: dict[Path, int] = {}
+        try:
+            self._add_tree(self.root)
+        except OSError:
+            self.close()
+            raise
+
+    def _add(self, directory: Path, recursive: bool) -> bool:
+        if directory in self._watched:
+            if recursive:
+                self._dirs[self._watched[directory]] = (directory, True)
+            return True
+        wd = self._add_watch(self.fd, os.fsencode(directory), _MASK)
+        if wd < 0:
+            errno = self._ctypes.get_errno()
+            if errno in (2, 20):  # ENOENT / ENOTDIR: 監視を始める前に消えた
+                return False
+            raise OSError(errno, f"inotify_add_watch に失敗しました: {directory} ({os.strerror(errno)})")
+        self._dirs[wd] = (directory, recursive)
+        self._watched[directory] = wd
+        return True
+
+    def _add_tree(self, directory: Path):
+        if not self._add(directory, True):
+            return
+        for dirpath, dirnames, _ in os.walk(directory):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for d in dirnames:
+                self._add(Path(dirpath) / d, True)
+
+    def watch_dirs(self, dirs: set[Path]):
+        """ルート外のディレクトリ（画像置き場など）を非再帰で監視に加える"""
+        for directory in dirs:
+            directory = directory.resolve()
+            if directory.is_dir():
+                self._add(directory, False)
+
+    def wait(self, timeout: float | None) -> set[Path]:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed: set[Path] = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+                offset += _EVENT.size + length
+                if mask & _IN_Q_OVERFLOW:
+                    changed.add(self.root)  # 取りこぼしあり: 呼び出し側で全体を再確認する
+                    continue
+                if mask & _IN_IGNORED:
+                    directory, _ = self._dirs.pop(wd, (None, False))
+                    if directory is not None:
+                        self._watched.pop(directory, None)
+                    continue
+                directory, recursive = self._dirs.get(wd, (None, False))
+                if directory is None or not name:
+                    continue
+                path = directory / os.fsdecode(name)
+                if mask & _IN_ISDIR:
+                    # 新しいサブディレクトリ（またはルートへの移動）は中身ごと監視して、中のファイルを変更扱いにする
+                    if recursive and mask & (_IN_CREATE | _IN_MOVED_TO) and not path.name.startswith("."):
+                        try:
+                            self._add_tree(path)
+                        except OSError as e:
+                            print(f"  ⚠ 監視を追加できません: {path} ({e})")
+                        changed.update(p for p in path.rglob("*") if p.is_file())
+                    continue
+                changed.add(path)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+# ──────────────────────────────────────────────
+# ポーリング
+# ──────────────────────────────────────────────
+
+class PollingWatcher:
+    """サイズと mtime を一定間隔で比較する監視（inotify が使えない環境用）"""
+
+    name = "polling"
+
+    def __init__(self, root: Path, interval: float = DEFAULT_INTERVAL):
+        self.root = root.resolve()
+        self.interval = interval
+        self._extra_dirs: set[Path] = set()
+        self._snapshot = self._scan()
+
+    def _stat_files(self, directory: Path, recursive: bool, out: dict):
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            try:
+                if entry.is_dir():
+                    if recursive:
+                        self._stat_files(Path(entry.path), True, out)
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            out[Path(entry.path)] = (st.st_size, st.st_mtime_ns)
+
+    def _scan(self) -> dict:
+        snapshot: dict = {}
+        self._stat_files(self.root, True, snapshot)
+        for directory in self._extra_dirs:
+            self._stat_files(directory, False, snapshot)
+        return snapshot
+
+    def watch_dirs(self, dirs: set[Path]):
+        added = {d.resolve() for d in dirs} - self._extra_dirs
+        if added:
+            self._extra_dirs |= added
+            for directory in added:
+                self._stat_files(directory, False, self._snapshot)
+
+    def wait(self, timeout: float | None) -> set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            time.sleep(self.interval if remaining is None else max(0.0, min(self.interval, remaining)))
+            snapshot = self._scan()
+            changed = {p for p in snapshot.keys() | self._snapshot.keys()
+                       if snapshot.get(p) != self._snapshot.get(p)}
+            self._snapshot = snapshot
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        pass
+
+
+def create(root: Path, polling: bool = False, interval: float = DEFAULT_INTERVAL):
+    """inotify が使えればそれを、使えなければ（または polling=True なら）ポーリングの監視を返す"""
+    if not polling:
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError) as e:
+            print(f"  inotify を使えないため、ポーリング（{interval:g}秒間隔）で監視します: {e}")
+    return PollingWatcher(root, interval)
@@ -0,0 +1,88 @@
+"""
+handle_cache.py - ハンドル → DID 解決結果の永続キャッシュ
+
+スキートの @メンションを facet にする際の resolveHandle を省略するための SQLite キャッシュ。
+解決できなかったハンドル（resolveHandle が 400 を返したもの）も短い期限で記録し（ネガティブキャッシュ）、
+存在しないハンドルを含む投稿で毎回問い合わせないようにする。
+
+保存先: atproto.CACHE_DIR / "handles.sqlite3"
+  handles : ハンドル（小文字） → (DID または NULL, 解決日時)
+
+有効期限:
+  解決できたハンドル   POSITIVE_TTL（1日）   ハンドルの付け替えに追従するため
+  解決できないハンドル NEGATIVE_TTL（1時間） 後から作成されたハンドルを拾うため
+サーバーエラー等の一時的な失敗は記録しない。
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import atproto
+
+DEFAULT_PATH = atproto.CACHE_DIR / "handles.sqlite3"
+POSITIVE_TTL = 24 * 3600
+NEGATIVE_TTL = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS handles (
+    handle      TEXT PRIMARY KEY,
+    did         TEXT,
+    resolved_at REAL NOT NULL
+);
+"""
+
+
+class HandleCache:
+    """ハンドル → DID の SQLite キャッシュ（スレッドセーフ）"""
+
+    def __init__(self, path: Path = DEFAULT_PATH):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def lookup(self, handles: list[str]) -> dict[str, str | None]:
+        """
+        期限内のキャッシュがあるハンドルについて {ハンドル: DID} を返す。
+        解決できないと記録されているハンドルの値は None。キャッシュにないハンドルは含まない。
+        """
+        now = time.time()
+        keys = {h.lower(): h for h in handles}
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT handle, did, resolved_at FROM handles WHERE handle IN ({','.join('?' * len(keys))})",
+                list(keys),
+            ).fetchall() if keys else []
+        hits = {}
+        for handle, did, resolved_at in rows:
+            ttl = POSITIVE_TTL if did else NEGATIVE_TTL
+            if now - resolved_at < ttl:
+                hits[keys[handle]] = did
+        return hits
+
+    def store(self, handle: str, did: str | None):
+        """解決結果を記録する（did=None は解決できなかったことを表す）"""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO handles (handle, did, resolved_at) VALUES (?, ?, ?)",
+                (handle.lower(), did, time.time()),
+            )
+
+
+_shared: HandleCache | None = None
+_shared_lock = threading.Lock()
+
+
+def shared() -> HandleCache:
+    """既定の保存先のインスタンスをプロセス内で共有する（デーモンではジョブをまたいで接続を保持する）"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = HandleCache()
+        return _shared
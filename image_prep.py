@@ -0,0 +1,212 @@
+"""
+image_prep.py - アップロード前の画像の前処理（縮小・再圧縮・メタデータ除去）
+
+スマートフォンの写真などをそのままアップロードすると、Bluesky の画像サイズ上限（約1MB）を超えたり、
+WhiteWind の記事で無駄な転送量になったりする。アップロード前に次の処理を行った派生ファイルを作る。
+
+  - EXIF の回転情報を画像に反映してから、長辺を max_dimension 以下に縮小
+  - 再エンコード（JPEG → JPEG、WebP → WebP、それ以外 → PNG）。EXIF 等のメタデータは書き出さない
+    （色を保つため ICC プロファイルのみ残す）
+  - max_bytes を超える場合は品質を下げ、それでも超えれば更に縮小する
+    （PNG は透過があれば WebP、なければ JPEG に切り替えてから品質を下げる）。
+    1x1 まで縮小しても超える場合は変換をあきらめ、元ファイルをそのまま使う
+  - アニメーション GIF は変換しない（元ファイルをそのまま使う）
+
+エンコードは CPU 負荷が高いのでプロセスプールで並列に実行する。
+派生ファイルは atproto.CACHE_DIR / "images" / "<元ファイルの sha256>-<設定のハッシュ>" / "<元のファイル名>.<拡張子>"
+に保存し、同じ画像・同じ設定なら再利用する（ファイル名はアップロード時の表示に使われる）。
+変換しなかった画像も同じディレクトリに "<元のファイル名>.skip"（理由を書いた目印）を残し、次回は開かずに元ファイルを使う。
+
+Pillow が必要（任意依存。--optimize 指定時のみ使用）: pip install Pillow
+"""
+
+import glob
+import hashlib
+import io
+import json
+import os
+import sys
+from pathlib import Path
+
+import atproto
+
+CACHE_DIR = atproto.CACHE_DIR / "images"
+DEFAULT_MAX_DIMENSION = 2000
+DEFAULT_QUALITY = 85
+BSKY_MAX_BYTES = 1_000_000  # app.bsky.embed.images の画像サイズ上限
+_MIN_QUALITY = 50
+_EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp", "PNG": ".png"}
+_VERSION = 1  # 変換処理を変えたら上げる（派生ファイルのキャッシュを無効化する）
+_SKIP_SUFFIX = ".skip"  # 変換しなかった画像の目印（中身は理由）
+
+
+def require_pillow():
+    """Pillow がなければ案内を表示して終了する"""
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        print("Pillow が必要です: pip install Pillow")
+        sys.exit(1)
+
+
+def make_options(max_dimension: int = DEFAULT_MAX_DIMENSION, max_bytes: int | None = None,
+                 quality: int = DEFAULT_QUALITY) -> dict:
+    """前処理の設定を返す（max_bytes=None はサイズ上限なし）"""
+    return {"max_dimension": max_dimension, "max_bytes": max_bytes, "quality": quality}
+
+
+def add_arguments(parser, default_max_bytes: int | None = None):
+    """--optimize 関連のオプションを argparse のパーサーに追加する"""
+    parser.add_argument("--optimize", action="store_true",
+                        help="アップロード前に画像を縮小・再圧縮し、メタデータを除去する (要 Pillow)")
+    parser.add_argument("--max-dimension", type=int, default=DEFAULT_MAX_DIMENSION, metavar="PX",
+                        help=f"--optimize 時の長辺の最大ピクセル数 (default: {DEFAULT_MAX_DIMENSION})")
+    parser.add_argument("--max-bytes", type=int, default=default_max_bytes, metavar="N",
+                        help="--optimize 時の1枚あたりの最大バイト数"
+                             + (f" (default: {default_max_bytes})" if default_max_bytes else " (default: 上限なし)"))
+    parser.add_argument("--quality", type=int, default=DEFAULT_QUALITY, metavar="Q",
+                        help=f"--optimize 時の JPEG / WebP の品質 (default: {DEFAULT_QUALITY})")
+
+
+def options_from_args(args) -> dict | None:
+    """add_arguments() で追加したオプションから設定を作る。--optimize がなければ None"""
+    if not args.optimize:
+        return None
+    require_pillow()
+    return make_options(args.max_dimension, args.max_bytes, args.quality)
+
+
+def options_tag(options: dict) -> str:
+    """設定を表す短いハッシュ（派生ファイル名・変更検出に使う）"""
+    payload = json.dumps([_VERSION, options], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+# ──────────────────────────────────────────────
+# 変換（ワーカープロセスで実行）
+# ──────────────────────────────────────────────
+
+def _encode(im, fmt: str, quality: int, icc_profile: bytes | None) -> bytes:
+    buf = io.BytesIO()
+    extra = {"icc_profile": icc_profile} if icc_profile else {}
+    if fmt == "JPEG":
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        im.save(buf, "JPEG", quality=quality, optimize=True, progressive=True, **extra)
+    elif fmt == "WEBP":
+        im.save(buf, "WEBP", quality=quality, method=4, **extra)
+    else:
+        im.save(buf, "PNG", optimize=True, **extra)
+    return buf.getvalue()
+
+
+def _prepare_one(src: str, dest_dir: str, options: dict) -> dict:
+    """
+    1枚を変換して dest_dir / 元のファイル名.拡張子 に書き出し、結果の情報を返す。
+    変換しない画像（アニメーション GIF・max_bytes 以下にできない画像）は元ファイルのパスを返す
+    （reason に "animated" / "max_bytes"）。
+    """
+    from PIL import Image, ImageOps
+
+    src_bytes = os.path.getsize(src)
+    with Image.open(src) as opened:
+        if getattr(opened, "is_animated", False):
+            return {"path": src, "src_bytes": src_bytes, "bytes": src_bytes, "skipped": True, "reason": "animated"}
+        src_format = opened.format
+        icc_profile = opened.info.get("icc_profile")
+        im = ImageOps.exif_transpose(opened)
+        src_dims = im.size
+        im.load()
+
+    max_dim = options["max_dimension"]
+    if max(im.size) > max_dim:
+        im.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
+
+    has_alpha = im.mode in ("RGBA", "LA", "PA") or (im.mode == "P" and "transparency" in im.info)
+    fmt = src_format if src_format in ("JPEG", "WEBP") else "PNG"
+    quality = options["quality"]
+    data = _encode(im, fmt, quality, icc_profile)
+
+    max_bytes = options["max_bytes"]
+    if max_bytes and len(data) > max_bytes and fmt == "PNG":
+        fmt = "WEBP" if has_alpha else "JPEG"
+        data = _encode(im, fmt, quality, icc_profile)
+    while max_bytes and len(data) > max_bytes:
+        if quality > _MIN_QUALITY:
+            quality = max(_MIN_QUALITY, quality - 10)
+        elif im.width == im.height == 1:  # これ以上小さくできない（ヘッダーや ICC プロファイルだけで超える）
+            return {"path": src, "src_bytes": src_bytes, "bytes": src_bytes, "skipped": True, "reason": "max_bytes"}
+        else:
+            im = im.resize((max(1, im.width * 4 // 5), max(1, im.height * 4 // 5)), Image.Resampling.LANCZOS)
+        data = _encode(im, fmt, quality, icc_profile)
+
+    dest = Path(dest_dir) / (Path(src).stem + _EXTENSIONS[fmt])
+    dest.parent.mkdir(exist_ok=True)
+    tmp = dest.with_name(dest.name + f".{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, dest)
+    return {"path": str(dest), "src_bytes": src_bytes, "bytes": len(data),
+            "src_dims": src_dims, "dims": im.size, "skipped": False}
+
+
+# ──────────────────────────────────────────────
+# 一括処理
+# ──────────────────────────────────────────────
+
+def prepare_images(paths: list[Path], options: dict, jobs: int = 4,
+                   cache: "blob_cache.BlobCache | None" = None) -> dict[Path, Path]:
+    """
+    画像を前処理して {元のパス: アップロードするファイルのパス} を返す。
+    派生ファイルがキャッシュにあれば再利用し、ないものだけを最大 jobs プロセスで変換する。
+    変換しなかった画像（アニメーション・max_bytes 以下にできない）もその結果を記録し、次回は変換を試みない。
+    cache（blob_cache.BlobCache）を渡すと元ファイルのハッシュ計算をそのキャッシュで省略する。
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    require_pillow()
+    CACHE_DIR.mkdir(parents=True, exist_ok=True, mode=0o700)
+    tag = options_tag(options)
+
+    result: dict[Path, Path] = {}
+    misses: list[tuple[Path, Path]] = []
+    for path in dict.fromkeys(paths):
+        digest = cache.digest(path) if cache else atproto.file_sha256(path).hex()
+        dest_dir = CACHE_DIR / f"{digest}-{tag}"
+        existing = next((f for f in dest_dir.glob(f"{glob.escape(path.stem)}.*")
+                         if f.suffix in _EXTENSIONS.values() or f.suffix == _SKIP_SUFFIX), None)
+        if existing is None:
+            misses.append((path, dest_dir))
+        elif existing.suffix == _SKIP_SUFFIX:
+            result[path] = path
+            _report_skip(path, existing.read_text(encoding="utf-8").strip(), options)
+        else:
+            result[path] = existing
+    if not misses:
+        return result
+
+    args = ([str(p) for p, _ in misses], [str(d) for _, d in misses], [options] * len(misses))
+    workers = min(jobs, len(misses), os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            infos = list(pool.map(_prepare_one, *args))
+    else:
+        infos = list(map(_prepare_one, *args))
+
+    for (path, dest_dir), info in zip(misses, infos):
+        result[path] = Path(info["path"])
+        if info["skipped"]:
+            dest_dir.mkdir(exist_ok=True)
+            (dest_dir / (path.stem + _SKIP_SUFFIX)).write_text(info["reason"], encoding="utf-8")
+            _report_skip(path, info["reason"], options)
+            continue
+        (w0, h0), (w1, h1) = info["src_dims"], info["dims"]
+        print(f"  ✓ 前処理: {path.name} {info['src_bytes'] / 1024 / 1024:.1f} MB → "
+              f"{info['bytes'] / 1024 / 1024:.1f} MB ({w0}x{h0} → {w1}x{h1})")
+    return result
+
+
+def _report_skip(path: Path, reason: str, options: dict):
+    if reason == "max_bytes":
+        print(f"  ⚠ 前処理なし（{options['max_bytes']} バイト以下にできません）: {path.name}")
+    else:
+        print(f"  - 前処理なし（アニメーション）: {path.name}")
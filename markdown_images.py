@@ -0,0 +1,235 @@
+"""
+markdown_images.py - Markdown 内の画像参照の走査と置換
+
+文書を1回走査して、画像の参照先（パス・URL）が書かれている位置を返す。
+置換は返した位置を使って1回の結合で行う（画像ごとに文書全体を作り直さない）。
+
+対象:
+  インライン画像      ![alt](path) / ![alt](<path>) / ![alt](path "タイトル")
+  参照形式の画像      ![alt][ref] / ![ref][] / ![ref] と、それが参照する定義行 [ref]: path "タイトル"
+  HTML の img タグ    <img src="path" ...>
+対象外（中のサンプルのパスを画像として扱わない）:
+  フェンスで囲まれたコードブロック（``` / ~~~。閉じていなければ文書の最後まで）
+  インラインコード（`...`）
+  HTML コメント（<!-- ... -->。行頭から始まるものは空行をまたいでも閉じるまで）
+
+返す位置は参照先の文字列だけを指す（alt・タイトル・< > や引用符・他の属性は含まない）ので、
+置換しても書式はそのまま残る。参照形式の画像は定義行の参照先を置き換える。
+インデントによるコードブロック（4スペース）と、引用（>）・リストの中のフェンスは区別しない。
+"""
+
+import bisect
+import re
+
+
+def _atomic(name: str, chars: str) -> str:
+    """chars の連続をまとめて1回で読む部分パターン（バックトラックで1文字ずつ戻らない）"""
+    return rf"(?=(?P<{name}>{chars}+))(?P={name})"
+
+
+_NOT_BLANK = r"(?![ \t]*(?:\r?\n|\Z))"  # 続く行が空行でない（インラインの要素は空行をまたがない）
+_CODE_SPAN = (r"`(?P<ticks>`*)(?!`)(?:" + _atomic("code", r"[^`\n]") + r"|\n" + _NOT_BLANK + "|"
+              + _atomic("run", "`") + r")*?(?<!`)`(?P=ticks)(?!`)")
+_ALT = r"(?:" + _atomic("text", r"[^\[\]\\\n]") + r"|\\.|\n" + _NOT_BLANK + r"|\[(?:[^\[\]\\]|\\.)*\])*"
+_DEST = r"(?:" + _atomic("path", r"[^\s()\\]") + r"|\\.|\((?:[^\s()\\]|\\.)*\))+"
+_TITLE = r"""(?:"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|\((?:[^()\\]|\\.)*\))"""
+_IMAGE = (r"!\[(?P<alt>" + _ALT + r")\](?:\([ \t]*\n?[ \t]*(?:<(?P<bracketed>(?:[^<>\n\\]|\\.)*)>|(?P<dest>" + _DEST
+          + r"))(?:[ \t]*\n?[ \t]+" + _TITLE + r")?[ \t]*\n?[ \t]*\)|\[(?P<label>(?:[^\[\]\\]|\\.){0,999})\])?")
+# 属性に < は含まない（閉じない < で次の <img まで読み進めないため）
+_IMG_TAG = r"""<[iI][mM][gG](?=[\s/>])(?P<attrs>(?:""" + _atomic("attr", r"""[^<>"']""") + r"""|"[^"<]*"|'[^'<]*')*)>"""
+
+# 段落の中: エスケープ / コードスパン / 閉じないバッククォート / コメントの開始 / 画像 / img タグ
+# （finditer で読み飛ばす部分も含めて順に拾い、コメント・画像・img タグだけを Python 側で処理する）
+_INLINE = re.compile(r"\\.|" + _CODE_SPAN + r"|``*|<!--|" + _IMAGE + "|" + _IMG_TAG, re.DOTALL)
+_IMG_SRC = re.compile(r"""\ssrc\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+))""", re.IGNORECASE)
+_FENCE = re.compile(r"`{3,}|~{3,}")
+_REF_DEF_LINE = re.compile(r"\n {0,3}\[")
+_REF_DEF = re.compile(
+    r" {0,3}\[((?:[^\[\]\\]|\\.){1,999})\]:[ \t]*(?:<((?:[^<>\n\\]|\\.)*)>|([^\s<]\S*))"
+    r"""(?:[ \t]+""" + _TITLE + r")?[ \t]*(?:\r?\n|\Z)")
+_ESCAPE = re.compile(r"\\([!-/:-@\[-`{-~])")
+_fence_closers: dict[tuple[str, int], re.Pattern] = {}
+
+
+def _unescape(text: str) -> str:
+    """バックスラッシュエスケープ（\\_ など）を外す"""
+    return _ESCAPE.sub(r"\1", text).strip() if "\\" in text else text.strip()
+
+
+def _normalize_label(label: str) -> str:
+    """参照ラベルの比較用の形（大文字小文字と連続する空白を区別しない）"""
+    return " ".join(label.split()).casefold()
+
+
+# ──────────────────────────────────────────────
+# 走査
+# ──────────────────────────────────────────────
+
+def scan(content: str) -> list[tuple[int, int, str, str]]:
+    """
+    画像参照を文書中の出現順に (開始位置, 終了位置, 参照先, 種類) のリストで返す。
+    content[開始位置:終了位置] が参照先の文字列で、参照先はエスケープを外したもの。
+    種類は "inline"（![alt](path)）/ "reference"（定義行 [ref]: path）/ "html"（<img src>）。
+
+    コードブロックと行頭の HTML コメントを str.find で探して文書を区切り、
+    その間をまとめて正規表現1本の finditer で走査する（行ごと・文字ごとの処理はしない）。
+    参照の定義行は、参照形式の画像があったときだけ探す。
+    """
+    refs: list[tuple[int, int, str, str]] = []
+    used_labels: set[str] = set()
+    skipped = _skipped_blocks(content)
+    region = 0
+    for start, end in skipped:
+        _scan_inline(content, region, start, refs, used_labels)
+        region = end
+    _scan_inline(content, region, len(content), refs, used_labels)
+
+    if used_labels:
+        definitions = _definitions(content, skipped)
+        for label in used_labels:
+            if label in definitions:
+                refs.append((*definitions[label], "reference"))
+        refs.sort()
+    return refs
+
+
+def _line_start(content: str, pos: int) -> int | None:
+    """pos が行頭（3文字までのスペースのインデントを除く）なら、その行の開始位置を返す"""
+    newline = content.rfind("\n", max(0, pos - 4), pos)
+    if newline < 0 and pos > 3:
+        return None
+    start = newline + 1
+    if content.count(" ", start, pos) != pos - start:
+        return None
+    return start
+
+
+def _skipped_blocks(content: str) -> list[tuple[int, int]]:
+    """
+    走査しない範囲（フェンスで囲まれたコードブロックと、行頭から始まる HTML コメント）を
+    (開始位置, 終了位置) のリストで返す。閉じていなければ文書の最後まで
+    """
+    blocks = []
+    length = len(content)
+    ticks = tildes = comment = -1  # 各文字列の次の出現位置（無ければ length）
+    pos = 0
+    while pos < length:
+        if ticks < pos:
+            ticks = content.find("```", pos) % (length + 1)
+        if tildes < pos:
+            tildes = content.find("~~~", pos) % (length + 1)
+        if comment < pos:
+            comment = content.find("<!--", pos) % (length + 1)
+        found = min(ticks, tildes, comment)
+        if found == length:
+            break
+        start = _line_start(content, found)
+        if start is None:
+            pos = found + 3
+            continue
+        newline = content.find("\n", found)
+        line_end = length if newline < 0 else newline + 1
+        if content[found] == "<":
+            close = content.find("-->", found + 4)
+            newline = -1 if close < 0 else content.find("\n", close)
+            end = length if newline < 0 else newline + 1
+        else:
+            fence = _FENCE.match(content, found).group()
+            if fence[0] == "`" and "`" in content[found + len(fence):line_end]:
+                pos = found + len(fence)  # バッククォートを含む情報文字列はフェンスではない（インラインコード）
+                continue
+            closing = _fence_closer(fence[0], len(fence)).search(content, line_end - 1)
+            end = length if closing is None else closing.end()
+        blocks.append((start, end))
+        pos = end
+    return blocks
+
+
+def _fence_closer(char: str, length: int) -> re.Pattern:
+    """長さ length 以上の同じ文字だけの行（閉じるフェンス）。直前の改行から一致させる"""
+    key = (char, length)
+    if key not in _fence_closers:
+        _fence_closers[key] = re.compile(rf"\n {{0,3}}{re.escape(char)}{{{length},}}[ \t]*(?:\r?\n|\Z)")
+    return _fence_closers[key]
+
+
+def _scan_inline(content: str, start: int, end: int, refs: list, used_labels: set):
+    """content[start:end] の中のインライン画像・参照形式の画像・img タグを探す（コードスパンとコメントは飛ばす）"""
+    pos = start
+    unclosed_comment = False  # これ以降に "-->" がない（閉じないコメントの開始は文字として扱う）
+    while pos < end:
+        for m in _INLINE.finditer(content, pos, end):
+            alt, attrs = m.group("alt", "attrs")
+            if alt is not None:
+                group = "dest" if m.group("dest") is not None else "bracketed"
+                if m.group(group) is not None:
+                    refs.append((m.start(group), m.end(group), _unescape(m.group(group)), "inline"))
+                elif m.group("label") and m.group("label").strip():
+                    used_labels.add(_normalize_label(m.group("label")))  # ![alt][ref]
+                else:
+                    used_labels.add(_normalize_label(alt))  # ![ref][] / ![ref]
+            elif attrs is not None:
+                src = _IMG_SRC.search(content, m.start("attrs"), m.end("attrs"))
+                if src is not None:
+                    group = next(g for g in (1, 2, 3) if src.group(g) is not None)
+                    path = src.group(group)
+                    if "&" in path:
+                        import html
+                        path = html.unescape(path)
+                    refs.append((src.start(group), src.end(group), path.strip(), "html"))
+            elif m.group() == "<!--" and not unclosed_comment:
+                close = content.find("-->", m.end(), end)
+                if close >= 0:
+                    pos = close + 3  # コメントの後から走査し直す
+                    break
+                unclosed_comment = True
+        else:
+            break
+
+
+def _definitions(content: str, skipped: list[tuple[int, int]]) -> dict[str, tuple[int, int, str]]:
+    """
+    参照の定義行 [ref]: path を探し、ラベル → (開始位置, 終了位置, 参照先) を返す（最初の定義が有効）。
+    定義は段落を途中から始められないので、直前の行が空行・定義行・走査しない範囲の終わりのものだけを使う
+    """
+    definitions: dict[str, tuple[int, int, str]] = {}
+    ends = {end for _, end in skipped}
+    starts = [start for start, _ in skipped]
+    previous_definition = -1  # 直前に読んだ定義行の終わり
+    for m in _REF_DEF_LINE.finditer("\n" + content):
+        line_start = m.start()  # 先頭に付けた改行の分だけずれるので、そのまま content の行頭になる
+        i = bisect.bisect_right(starts, line_start) - 1
+        if i >= 0 and line_start < skipped[i][1]:
+            continue
+        if line_start and line_start not in ends and line_start != previous_definition:
+            previous = content.rfind("\n", 0, line_start - 1) + 1
+            if content[previous:line_start].strip():
+                continue
+        d = _REF_DEF.match(content, line_start)
+        if d is None:
+            continue
+        previous_definition = d.end()
+        group = 2 if d.group(2) is not None else 3
+        label = _normalize_label(d.group(1))
+        if label and label not in definitions:
+            definitions[label] = (d.start(group), d.end(group), _unescape(d.group(group)))
+    return definitions
+
+
+# ──────────────────────────────────────────────
+# 置換
+# ──────────────────────────────────────────────
+
+def splice(content: str, refs: list[tuple[int, int, str, str]], replacements: dict[str, str]) -> str:
+    """scan() の結果のうち、参照先が replacements にあるものを置き換えた文書を返す"""
+    parts = []
+    last = 0
+    for start, end, path, _ in refs:
+        new = replacements.get(path)
+        if new is None:
+            continue
+        parts.append(content[last:start])
+        parts.append(new)
+        last = end
+    parts.append(content[last:])
+    return "".join(parts)
@@ -0,0 +1,232 @@
+"""
+rate_limit.py - PDS のレート制限ヘッダーに基づく送信ペース制御
+
+PDS は応答に次のヘッダーを付けて、そのリクエストに適用された制限の残りを知らせる。
+  ratelimit-limit     : 期間内の上限（ポイント数）
+  ratelimit-remaining : 残りポイント数
+  ratelimit-reset     : 期間がリセットされる時刻（UNIX 秒）
+429 を受けてから待つのではなく、この値を記録しておき、送信前に残りを見てペースを決める（トークンバケット）。
+
+  - 残りに余裕があるうちは待たずに送る（送信ごとに推定コストを差し引いておく）
+  - 残りが予備分（上限の RESERVE_RATIO）を割ったら、残りをリセットまでの時間に均等に割り振った間隔で送る
+  - 1回分のコストも残っていなければリセットまで待つ
+
+制限はエンドポイントの種類ごとに別々にかかるため、ホストと種類（session / write / blob / other）ごとに記録する。
+1リクエストあたりのコスト（書き込みは種類によって複数ポイント消費する）は、応答ごとの残りの減り幅のうち
+最小のものから推定する（並列に送ると減り幅はコストの倍数になるため）。推定値は期間をまたいで引き継ぐ。
+
+記録はメモリ上に持ち、SYNC_INTERVAL ごと（と終了時）に atproto.CACHE_DIR / "ratelimit.json" と突き合わせる。
+ファイルの読み書きはファイルロック（fcntl.flock）の中で行い、他のプロセスが観測した残りを取り込んでから書き戻すので、
+同時に動いている複数の CLI プロセスが1つの予算を共有する（fcntl がない環境ではロックなし）。
+送信中の件数と送信間隔はプロセスごとに数える。
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+RESERVE_RATIO = 0.1  # 残りがこの割合を割ったら間隔を空けて送る
+_PROVISIONAL_PERIOD = 60  # リセット後、新しい期間の応答が届くまでの仮の期間（秒）
+_RECHECK_INTERVAL = 0.2   # 送信中のリクエストの応答を待って残りを確認し直す間隔（秒）
+SYNC_INTERVAL = 1.0       # 記録ファイルと同期する間隔（秒）
+_LOCAL_FIELDS = ("pending", "next_at")  # ファイルに書かないプロセスごとの値
+_FIELDS = {"limit", "remaining", "reset", "cost", "min_drop"}
+
+# NSID → 制限の種類
+_CLASSES = {
+    "com.atproto.server.createSession": "session",
+    "com.atproto.repo.createRecord": "write",
+    "com.atproto.repo.putRecord": "write",
+    "com.atproto.repo.deleteRecord": "write",
+    "com.atproto.repo.applyWrites": "write",
+    "com.atproto.repo.uploadBlob": "blob",
+}
+
+
+def limit_key(url: str) -> str:
+    """URL から記録のキー「ホスト 種類」を作る"""
+    parsed = urlparse(url)
+    nsid = parsed.path.rsplit("/xrpc/", 1)[-1]
+    return f"{parsed.netloc} {_CLASSES.get(nsid, 'other')}"
+
+
+def parse_headers(headers) -> dict | None:
+    """ratelimit-* ヘッダーを {"limit", "remaining", "reset"} にする。なければ None"""
+    try:
+        limit = int(headers["ratelimit-limit"])
+        remaining = int(headers["ratelimit-remaining"])
+        reset = float(headers["ratelimit-reset"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if reset < 1e9:
+        reset += time.time()  # リセットまでの秒数で返すサーバー向け
+    return {"limit": limit, "remaining": remaining, "reset": reset}
+
+
+def _current(entry: dict, now: float) -> bool:
+    """ヘッダーで観測した期間の途中にある記録か"""
+    return entry["limit"] is not None and not entry.get("provisional") and entry["reset"] > now
+
+
+def _merge(entry: dict | None, shared: dict, now: float) -> dict:
+    """記録ファイル上の shared を手元の entry に取り込んだ記録を返す（送信中の件数と間隔は手元の値を残す）"""
+    local = {k: entry[k] for k in _LOCAL_FIELDS} if entry else {"pending": 0, "next_at": 0.0}
+    if entry is None or (_current(shared, now)
+                         and (not _current(entry, now) or shared["reset"] > entry["reset"] + 1)):
+        return {**shared, **local}  # 手元に記録がないか、他のプロセスが新しい期間を観測した
+    if _current(shared, now) and _current(entry, now) and abs(shared["reset"] - entry["reset"]) <= 1:
+        # 同じ期間: 残りは少ない方、コストは小さい方の推定を使う
+        entry["remaining"] = min(entry["remaining"], shared["remaining"])
+        drops = [d for d in (entry["min_drop"], shared["min_drop"]) if d is not None]
+        if drops:
+            entry["min_drop"] = entry["cost"] = min(drops)
+    return entry
+
+
+class RateLimiter:
+    """
+    ホスト・種類ごとの残り予算を記録し、送信してよいかを判断する（スレッド間で共有し、記録ファイルでプロセス間でも共有）。
+
+      reserve(url)  送信前に呼ぶ。待つべき秒数を返す（0 なら予算を確保済みなので送信してよい）
+      observe(url, status, headers)  応答を受けたら呼ぶ（ヘッダーの値で記録を更新）
+      release(url)  応答を受けられなかったときに呼ぶ（確保した予算を戻す）
+    0 を返した reserve には、例外で中断した場合も含めて必ず observe か release を対応させること。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state: dict = {}
+        self._synced_at: float | None = None  # 最後に記録ファイルと同期した時刻（time.monotonic）
+        atexit.register(self.flush)
+
+    def _update(self, func):
+        """
+        ロックを取り、func(state, now) で記録を書き換える（前回の同期から SYNC_INTERVAL 経っていれば先に同期する）。
+        送信のたびに呼ばれ、asyncio 版ではイベントループの中で呼ばれるため、同期はファイルロックを待たない。
+        """
+        with self._lock:
+            now = time.time()
+            if self._synced_at is None or time.monotonic() - self._synced_at >= SYNC_INTERVAL:
+                self._sync(now)
+            return func(self._state, now)
+
+    def flush(self) -> None:
+        """手元の記録を記録ファイルに書き出す（終了時に自動で呼ばれる）"""
+        with self._lock:
+            self._sync(time.time(), wait=True)
+
+    def _sync(self, now: float, wait: bool = False) -> None:
+        """
+        記録ファイルの内容を手元の記録に取り込み、合わせた結果を書き戻す（self._lock の中で呼ぶ）。
+        wait=False なら、他のプロセスがファイルロックを持っているときは待たずに今回の同期を見送る。
+        """
+        self._synced_at = time.monotonic()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            with os.fdopen(fd, "r+") as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                try:
+                    shared = json.loads(f.read() or "{}")
+                except json.JSONDecodeError:
+                    shared = {}
+                if not isinstance(shared, dict):
+                    shared = {}
+                for key, entry in shared.items():
+                    if isinstance(entry, dict) and _FIELDS <= entry.keys():
+                        self._state[key] = _merge(self._state.get(key), entry, now)
+                merged = {key: {k: v for k, v in entry.items() if k not in _LOCAL_FIELDS}
+                          for key, entry in self._state.items()}
+                after = json.dumps(merged, sort_keys=True)
+                if after != json.dumps(shared, sort_keys=True):
+                    f.seek(0)
+                    f.truncate()
+                    f.write(after)
+        except OSError:
+            pass  # 記録ファイルを使えない・ロック中でもプロセス内の記録で続ける（BlockingIOError も OSError）
+
+    def reserve(self, url: str) -> float:
+        key = limit_key(url)
+
+        def take(state: dict, now: float) -> float:
+            entry = state.get(key)
+            if entry is None:
+                # 未観測: 上限が分かるまでは待たずに送り、送信中の件数だけ数えておく
+                entry = state[key] = {"limit": None, "remaining": None, "reset": now + _PROVISIONAL_PERIOD,
+                                      "cost": 1, "min_drop": None, "pending": 0, "next_at": 0.0,
+                                      "provisional": True}
+            if entry["limit"] is None:
+                entry["pending"] += 1
+                return 0.0
+            if entry["reset"] <= now:
+                # 期間がリセットされた: 新しい期間の応答が届くまでは上限いっぱいまで使える仮の期間とする
+                entry.update(remaining=entry["limit"], reset=now + _PROVISIONAL_PERIOD,
+                             pending=0, next_at=0.0, provisional=True)
+            cost = entry["cost"]
+            tokens = entry["remaining"] - entry["pending"] * cost
+            if tokens < cost:
+                # 送信中のリクエストがあれば（仮の期間も同様）、応答で残りが分かるので短い間隔で確認し直す
+                if entry["pending"] or entry.get("provisional"):
+                    return min(_RECHECK_INTERVAL, entry["reset"] - now + 0.1)
+                return entry["reset"] - now + 0.1
+            if tokens - cost < entry["limit"] * RESERVE_RATIO and not entry.get("provisional"):
+                # 予備分に入ったら、残りをリセットまでの時間に均等に割り振る
+                if now < entry["next_at"]:
+                    return entry["next_at"] - now
+                entry["next_at"] = now + (entry["reset"] - now) * cost / (tokens + cost)  # 最後の1回もリセット前に送る
+            entry["pending"] += 1
+            return 0.0
+
+        return self._update(take)
+
+    def observe(self, url: str, status: int, headers) -> None:
+        key = limit_key(url)
+        values = parse_headers(headers)
+
+        def record(state: dict, now: float) -> None:
+            entry = state.get(key)
+            if entry is not None:
+                entry["pending"] = max(0, entry["pending"] - 1)
+            if values is None:
+                return
+            if status == 429:
+                values["remaining"] = 0
+            if values["reset"] <= now:
+                return  # 既に終わった期間の応答
+            current = entry is not None and entry["reset"] > now
+            provisional = current and entry.get("provisional", False)
+            if current and not provisional and values["reset"] < entry["reset"] - 1:
+                return  # 前の期間に処理された応答が遅れて届いた
+            if not current or provisional or abs(entry["reset"] - values["reset"]) > 1:  # 秒の丸めの揺れは同じ期間
+                # 新しい期間: コストの推定値と送信中の件数は引き継ぐ
+                state[key] = {**values, "cost": entry["cost"] if entry else 1,
+                              "min_drop": entry["min_drop"] if entry else None,
+                              "pending": entry["pending"] if current else 0, "next_at": 0.0}
+                return
+            spent = entry["remaining"] - values["remaining"]
+            if spent > 0 and (entry["min_drop"] is None or spent < entry["min_drop"]):
+                entry["min_drop"] = entry["cost"] = spent
+            entry["limit"] = values["limit"]
+            entry["remaining"] = min(entry["remaining"], values["remaining"])  # 応答の順序が前後しても減る方向のみ
+
+        self._update(record)
+
+    def release(self, url: str) -> None:
+        key = limit_key(url)
+
+        def give_back(state: dict, now: float) -> None:
+            if key in state:
+                state[key]["pending"] = max(0, state[key]["pending"] - 1)
+
+        self._update(give_back)
@@ -0,0 +1,184 @@
+"""
+repo_car.py - リポジトリの CAR（com.atproto.sync.getRepo の応答）のストリーム読み取り
+
+getRepo の応答は CARv1 形式で、ヘッダー（DAG-CBOR の {"version": 1, "roots": [コミットの CID]}）の後に
+「varint の長さ + CID + ブロック」の区画が並ぶ。ブロックはコミット・MST（Merkle Search Tree）のノード・レコード。
+受信したチャンクから区画を1つずつ取り出して読むため、ファイル全体をメモリに載せない。
+各ブロックは sha256 を CID と照合する。
+
+レコードのパス（コレクション/rkey）は MST のノードにだけ書かれている。
+ブロックの並び順は PDS の実装次第なので、パスがまだ分からないレコードは一時ファイルに退避し、
+そのレコードを指す MST のノードを読んだ時点で返す。対象外のコレクションのレコードは読み捨てる。
+
+since（リビジョン）を指定した getRepo の応答はそのリビジョンからの差分で、
+以降に書き込まれたレコードと、それを指す MST のノードだけを含む（削除されたレコードは分からない）。
+"""
+
+import hashlib
+import tempfile
+
+import dag_cbor
+
+_SHA2_256 = 0x12
+_MST_NODE = b"\xa2\x61e"  # MST のノードは {"e": [...], "l": ...}（キーは長さ・バイト順に並ぶので "e" が先）
+
+
+def _varint(data: bytes, pos: int) -> tuple[int, int]:
+    """data[pos:] の unsigned varint を読み、(値, 次の位置) を返す"""
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class _ChunkReader:
+    """受信したチャンクの列から、必要なバイト数ずつ取り出す"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buf = b""
+        self._pos = 0
+
+    def _fill(self, n: int) -> bool:
+        while len(self._buf) - self._pos < n:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return False
+            self._buf = self._buf[self._pos:] + chunk
+            self._pos = 0
+        return True
+
+    def read(self, n: int) -> bytes:
+        if not self._fill(n):
+            raise ValueError("CAR が途中で終わっています")
+        data = self._buf[self._pos:self._pos + n]
+        self._pos += n
+        return data
+
+    def varint(self) -> int | None:
+        """先頭の varint を読む。データがもう無ければ None"""
+        value = shift = 0
+        while True:
+            if not self._fill(1):
+                if shift:
+                    raise ValueError("CAR が途中で終わっています")
+                return None
+            byte = self._buf[self._pos]
+            self._pos += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+
+def read_blocks(chunks):
+    """
+    CAR のバイト列（チャンクの iterable）から (CID のバイナリ表現, ブロックのバイト列) を順に返すジェネレーター。
+    最初に1度だけ (None, ヘッダー) を返す（ヘッダーは {"version", "roots"}。roots は CID のバイナリ表現のリスト）。
+    CID と内容が一致しないブロックがあれば ValueError を送出する。
+    """
+    reader = _ChunkReader(chunks)
+    length = reader.varint()
+    if length is None:
+        raise ValueError("CAR が空です")
+    header = dag_cbor.decode(reader.read(length), raw=True)
+    if not isinstance(header, dict) or header.get("version") != 1:
+        raise ValueError(f"CARv1 ではありません: {header!r:.100}")
+    yield None, header
+
+    while (length := reader.varint()) is not None:
+        section = reader.read(length)
+        if section[:2] == b"\x12\x20":
+            raise ValueError("CIDv0 のブロックには対応していません")
+        _, pos = _varint(section, 0)  # CID のバージョン（1）
+        _, pos = _varint(section, pos)  # コーデック
+        hash_code, pos = _varint(section, pos)
+        digest_size, pos = _varint(section, pos)
+        cid_end = pos + digest_size
+        block = section[cid_end:]
+        if hash_code == _SHA2_256 and hashlib.sha256(block).digest() != section[pos:cid_end]:
+            raise ValueError(f"ブロックの内容が CID と一致しません: {dag_cbor.cid_from_bytes(section[:cid_end])}")
+        yield section[:cid_end], block
+
+
+class RepoReader:
+    """
+    getRepo の CAR から、指定したコレクションのレコードを
+    {"collection", "rkey", "uri", "cid", "value"} の形で1件ずつ返すイテレーター。
+    読み終えると commit にコミット（{"did", "rev", "data", ...}）が入る。
+    ブロックが1つもない CAR（since 付きの getRepo で変更がなかった場合）はエラーにせず、commit は None のまま終わる。
+
+    DAG-CBOR をデコードするのはコミット・MST のノード・対象のコレクションのレコードだけで、
+    それ以外のレコード（いいね・フォローなど）は "$type" の値をバイト列で探して読み飛ばす。
+    """
+
+    def __init__(self, chunks, did: str, collections):
+        self.chunks = chunks
+        self.did = did
+        self.collections = set(collections)
+        self.commit: dict | None = None
+        self.blocks = 0
+        self.unresolved = 0  # パスの分からないまま終わったレコード（対象のコレクションのもの）
+
+    def __iter__(self):
+        paths: dict[bytes, list[tuple[str, str]]] = {}  # レコードの CID → まだ本体を読んでいないパス
+        pending: dict[bytes, tuple[int, int]] = {}  # パスより先に読んだレコードの CID → 一時ファイル上の位置
+        types = [dag_cbor.encode("$type") + dag_cbor.encode(c) for c in self.collections]
+        spool = None
+        root = None
+        try:
+            for cid, block in read_blocks(self.chunks):
+                if cid is None:
+                    root = (block.get("roots") or [None])[0]
+                    continue
+                self.blocks += 1
+                if cid == root:
+                    self.commit = dag_cbor.decode(block)
+                elif block.startswith(_MST_NODE):
+                    for collection, rkey, record_cid in self._entries(dag_cbor.decode(block, raw=True)):
+                        if record_cid in pending:
+                            offset, size = pending.pop(record_cid)
+                            spool.seek(offset)
+                            yield self._record(collection, rkey, record_cid, dag_cbor.decode(spool.read(size)))
+                            spool.seek(0, 2)
+                        else:
+                            paths.setdefault(record_cid, []).append((collection, rkey))
+                elif any(t in block for t in types):
+                    value = dag_cbor.decode(block)
+                    if not isinstance(value, dict) or value.get("$type") not in self.collections:
+                        continue  # 入れ子の値に同じ "$type" があっただけ
+                    if cid in paths:
+                        for collection, rkey in paths.pop(cid):
+                            yield self._record(collection, rkey, cid, value)
+                    else:
+                        if spool is None:
+                            spool = tempfile.TemporaryFile()
+                        pending[cid] = (spool.tell(), len(block))
+                        spool.write(block)
+        finally:
+            if spool is not None:
+                spool.close()
+        if self.commit is None:
+            if self.blocks == 0:
+                return  # 変更のない差分（ヘッダーだけの CAR）
+            raise ValueError("CAR にコミットが含まれていません")
+        if self.commit.get("did") != self.did:
+            raise ValueError(f"別のアカウントのリポジトリです: {self.commit.get('did')}")
+        self.unresolved = len(pending)
+
+    def _entries(self, node: dict):
+        """MST のノードの各エントリを (コレクション, rkey, レコードの CID) で返す（対象のコレクションのみ）"""
+        key = b""
+        for entry in node["e"]:
+            key = key[:entry["p"]] + entry["k"]
+            collection, _, rkey = key.decode("utf-8").partition("/")
+            if collection in self.collections:
+                yield collection, rkey, entry["v"]
+
+    def _record(self, collection: str, rkey: str, cid: bytes, value: dict) -> dict:
+        return {"collection": collection, "rkey": rkey, "uri": f"at://{self.did}/{collection}/{rkey}",
+                "cid": dag_cbor.cid_from_bytes(cid), "value": value}
@@ -0,0 +1,173 @@
+"""
+request_trace.py - api_request のトレース記録（--trace FILE）
+
+atproto.add_request_hook() で api_request（atproto_async を含む）の試行ごとの記録を受け取り、
+ファイルに書き出して、終了時にエンドポイント別の集計表を標準エラー出力に表示する。
+記録の項目は atproto.trace_event() を参照（NSID・ステータス・送受信バイト数・所要時間・試行回数・待機時間など）。
+
+出力形式はファイルの拡張子で決まる:
+  .json : Chrome のトレースイベント形式（chrome://tracing・Perfetto で開く）。
+          スレッド（asyncio ではタスク）ごとのレーンに、送信前の待機・リクエスト・バックオフを並べる
+  その他: 1行1試行の JSONL（受け取るたびに追記するため、watch のような長時間のコマンドでも途中経過を読める）
+
+時間のかかった publish の内訳（どのエンドポイントに時間を使い、レート制限やリトライでどれだけ待ったか）を見たり、
+--jobs などの並列数を調整したり、PDS の運用者に負荷の出どころを示すために使う。
+"""
+
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from pathlib import Path
+
+import atproto
+
+
+class Recorder:
+    """試行ごとの記録を集める。JSONL の場合は受け取るたびにファイルへ追記する"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.chrome = path.suffix == ".json"
+        self.events: list[dict] = []
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = None if self.chrome else open(path, "w", encoding="utf-8")
+
+    def __call__(self, event: dict):
+        with self._lock:
+            self.events.append(event)
+            if self._file is not None:
+                self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            elif self.chrome:
+                self.path.write_text(json.dumps(chrome_trace(self.events, self.started), ensure_ascii=False),
+                                     encoding="utf-8")
+
+
+@contextlib.contextmanager
+def recording(path: str | None):
+    """with の間の api_request を path に記録し、抜けるときに集計表を表示する（path が None なら何もしない）"""
+    if not path:
+        yield None
+        return
+    recorder = Recorder(Path(path))
+    atproto.add_request_hook(recorder)
+    try:
+        yield recorder
+    finally:
+        atproto.remove_request_hook(recorder)
+        recorder.close()
+        print_summary(recorder.events, time.monotonic() - recorder.started, recorder.path)
+
+
+# ──────────────────────────────────────────────
+# Chrome トレースイベント形式
+# ──────────────────────────────────────────────
+
+def chrome_trace(events: list[dict], origin: float) -> dict:
+    """
+    記録を Chrome のトレースイベント形式に変換する（時刻は origin からのマイクロ秒）。
+    1試行を「待機」（送信前のレート制限待ち）・リクエスト・「バックオフ」（次の試行までの待ち）の3つの区間にする。
+    """
+    pid = os.getpid()
+    lanes: dict[str, int] = {}
+    trace = []
+
+    def us(t: float) -> float:
+        return round((t - origin) * 1e6, 1)
+
+    for e in sorted(events, key=lambda e: e["start"]):
+        tid = lanes.setdefault(e["thread"], len(lanes) + 1)
+        if e["wait"] >= 0.001:
+            trace.append({"name": "待機", "cat": "wait", "ph": "X", "pid": pid, "tid": tid,
+                          "ts": us(e["start"] - e["wait"]), "dur": round(e["wait"] * 1e6, 1)})
+        args = {k: e[k] for k in ("method", "host", "status", "error", "bytes_out", "bytes_in", "attempt", "ttfb")
+                if e[k] is not None}
+        trace.append({"name": e["nsid"], "cat": "http", "ph": "X", "pid": pid, "tid": tid,
+                      "ts": us(e["start"]), "dur": round(e["elapsed"] * 1e6, 1), "args": args})
+        if e["backoff"]:
+            trace.append({"name": "バックオフ", "cat": "backoff", "ph": "X", "pid": pid, "tid": tid,
+                          "ts": us(e["start"] + e["elapsed"]), "dur": round(e["backoff"] * 1e6, 1),
+                          "args": {"status": e["status"], "error": e["error"]}})
+    for name, tid in lanes.items():
+        trace.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+    return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+
+# ──────────────────────────────────────────────
+# 集計表
+# ──────────────────────────────────────────────
+
+def _rjust(text: str, width: int) -> str:
+    """全角文字を2桁として右寄せする（表の見出し用）"""
+    used = sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+    return " " * max(0, width - used) + text
+
+
+def _size(n: int) -> str:
+    if n >= 1024 * 1024:
+        return f"{n / 1024 / 1024:.1f} MB"
+    if n >= 1024:
+        return f"{n / 1024:.1f} KB"
+    return f"{n} B"
+
+
+def summarize(events: list[dict]) -> list[dict]:
+    """NSID ごとの集計（合計時間の長い順）"""
+    import statistics
+
+    groups: dict[str, list[dict]] = defaultdict(list)
+    for e in events:
+        groups[e["nsid"]].append(e)
+    rows = []
+    for nsid, group in groups.items():
+        times = [e["elapsed"] for e in group]
+        rows.append({
+            "nsid": nsid,
+            "count": len(group),
+            "failed": sum(1 for e in group if e["error"] or (e["status"] or 0) >= 400),
+            "bytes_out": sum(e["bytes_out"] or 0 for e in group),
+            "bytes_in": sum(e["bytes_in"] or 0 for e in group),
+            "total": sum(times),
+            "p50": statistics.median(times),
+            "max": max(times),
+            "wait": sum(e["wait"] for e in group),
+            "backoff": sum(e["backoff"] for e in group),
+        })
+    return sorted(rows, key=lambda r: r["total"], reverse=True)
+
+
+def print_summary(events: list[dict], wall: float, path: Path, file=None):
+    """エンドポイント別の集計表を表示する（既定は標準エラー出力。標準出力の JSON などを汚さないため）"""
+    file = file or sys.stderr
+    rows = summarize(events)
+    print(f"\n{'─'*98}", file=file)
+    print(f"  トレース: {len(events)}件のリクエスト / 実時間 {wall:.2f}秒 → {path}", file=file)
+    print(f"{'─'*98}", file=file)
+    if not rows:
+        print("  リクエストはありませんでした", file=file)
+        print(f"{'─'*98}", file=file)
+        return
+    widths = (("件数", 4), ("≥400", 4), ("送信", 9), ("受信", 9), ("合計", 8), ("p50", 8), ("最大", 8))
+    print(f"  {'NSID':<38}" + "".join(" " + _rjust(label, width) for label, width in widths), file=file)
+    for r in rows:
+        print(f"  {r['nsid']:<38} {r['count']:>4} {r['failed']:>4} {_size(r['bytes_out']):>9}"
+              f" {_size(r['bytes_in']):>9} {r['total']:>7.2f}s {r['p50'] * 1000:>6.0f}ms {r['max'] * 1000:>6.0f}ms",
+              file=file)
+    busy = sum(r["total"] for r in rows)
+    wait = sum(r["wait"] for r in rows)
+    backoff = sum(r["backoff"] for r in rows)
+    print(f"  通信 {busy:.2f}秒（並列分を含む）/ 送信前の待機 {wait:.2f}秒 / リトライ前のバックオフ {backoff:.2f}秒",
+          file=file)
+    print(f"{'─'*98}", file=file)
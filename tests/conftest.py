@@ -0,0 +1,40 @@
+"""
+pytest の共通設定
+
+各モジュールはリポジトリ直下のスクリプトとして import するため、ルートと bench/（模擬 PDS）をパスに加える。
+キャッシュ（セッション・blob キャッシュ・記事索引など）はテストごとに一時ディレクトリに置く。
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "bench"))
+
+# atproto.CACHE_DIR は import 時に決まるので、どのモジュールよりも先に設定する
+os.environ["XDG_CACHE_HOME"] = tempfile.mkdtemp(prefix="whtwnd-cli-test-")
+os.environ.pop("WHTWND_DAEMON", None)
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def pds(monkeypatch):
+    """模擬 PDS（bench/mock_pds.py）を起動し、atproto の接続先をそこに向ける"""
+    import atproto
+    from mock_pds import MockPDS
+
+    server = MockPDS()
+    monkeypatch.setattr(atproto, "PDS_HOST", server.start())
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def session(pds):
+    import atproto
+
+    return atproto.login(pds.handle, "password")
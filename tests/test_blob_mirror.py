@@ -0,0 +1,29 @@
+"""blob_mirror.mirror(): 1件の失敗で全体を止めない"""
+
+import time
+
+import atproto
+import blob_mirror
+
+
+def test_timed_out_blob_is_counted_and_others_finish(pds, monkeypatch, tmp_path):
+    cids = pds.seed_blobs(5, 4096)
+    stalled = cids[2]
+    respond = pds.respond
+
+    def stall(method, nsid, query, body, headers):
+        if nsid == "com.atproto.sync.getBlob" and query.get("cid") == stalled:
+            time.sleep(1)  # TIMEOUT を超えて応答しない
+        return respond(method, nsid, query, body, headers)
+
+    monkeypatch.setattr(pds, "respond", stall)
+    monkeypatch.setattr(blob_mirror, "TIMEOUT", 0.2)
+    monkeypatch.setattr(atproto, "_backoff", lambda *args, **kwargs: None)
+
+    counts = blob_mirror.mirror(pds.did, cids, tmp_path, jobs=2)
+
+    assert (counts["downloaded"], counts["failed"]) == (4, 1)
+    assert not blob_mirror.blob_path(tmp_path, stalled).exists()
+    for cid in cids:
+        if cid != stalled:
+            assert blob_mirror.blob_path(tmp_path, cid).read_bytes() == pds.blobs[cid]["data"]
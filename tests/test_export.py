@@ -0,0 +1,29 @@
+"""whtwnd_post.py export: 差分の書き出し"""
+
+import json
+
+import whtwnd_post
+
+
+def test_incremental_export_without_changes_is_a_no_op(pds, session, tmp_path):
+    pds.seed_entries(3)
+    first = whtwnd_post.export_repo(session, tmp_path)
+    assert first["entries"] == 3
+
+    # since 以降に変更がなければ PDS はブロックのない CAR を返す
+    second = whtwnd_post.export_repo(session, tmp_path, since=first["rev"])
+    assert (second["entries"], second["posts"], second["rev"]) == (0, 0, first["rev"])
+    state = json.loads((tmp_path / whtwnd_post.EXPORT_STATE_NAME).read_text(encoding="utf-8"))
+    assert state["rev"] == first["rev"]
+    assert len(state["entries"]) == 3
+    assert len(list((tmp_path / "entries").glob("*.md"))) == 3
+
+
+def test_incremental_export_writes_only_changed_entries(pds, session, tmp_path):
+    pds.seed_entries(3)
+    first = whtwnd_post.export_repo(session, tmp_path)
+    pds.seed_entries(1, title_format="追加 {}")
+    second = whtwnd_post.export_repo(session, tmp_path, since=first["rev"])
+    assert second["entries"] == 1
+    assert second["rev"] > first["rev"]
+    assert len(list((tmp_path / "entries").glob("*.md"))) == 4
@@ -0,0 +1,30 @@
+"""bsky_post.py thread: 投稿に分割できない原稿の扱い"""
+
+import sys
+
+import pytest
+
+import bsky_post
+
+
+@pytest.mark.parametrize("text", ["---", "---\n\n---\n", "   "])
+def test_split_thread_without_body_is_empty(text):
+    assert bsky_post.split_thread(text) == []
+
+
+@pytest.mark.parametrize("text", ["---\n", "  \n---\n\n---\n  "])
+def test_cmd_thread_without_body_exits(monkeypatch, capsys, tmp_path, text):
+    source = tmp_path / "thread.txt"
+    source.write_text(text, encoding="utf-8")
+    monkeypatch.setattr(sys, "argv", ["bsky_post.py", "thread", "--file", str(source)])
+    # 本文がなければログインする前に終了する
+    monkeypatch.setattr(bsky_post.atproto, "load_config", lambda: pytest.fail("ログインしてはいけない"))
+    with pytest.raises(SystemExit) as exc:
+        bsky_post.main()
+    assert exc.value.code == 1
+    assert "エラー: 投稿する本文がありません" in capsys.readouterr().out
+
+
+def test_post_thread_rejects_empty_posts():
+    with pytest.raises(RuntimeError, match="投稿する本文がありません"):
+        bsky_post.post_thread({"did": "did:plc:test"}, [])
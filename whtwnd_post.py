@@ -22,76 +22,190 @@ Markdownの画像について:
     ![図1](images/fig1.jpg)
 """
 
+import os
+import sys
+
+if __name__ == "__main__" and os.environ.get("WHTWND_DAEMON"):
+    # 重いモジュールを読み込む前にデーモンへ転送する（daemon.py）
+    import daemon
+    daemon.forward("whtwnd_post")
+
 import argparse
+import glob
+import hashlib
+import json
 import re
-import sys
+import time
 from datetime import datetime, timezone
 from pathlib import Path
 
 import atproto
+import image_prep
+import request_trace
+
+# WhiteWind（AppView とWebサイト）。環境変数 WHTWND_WHITEWIND_HOST で差し替えられる（ベンチマーク用）
+WHITEWIND_HOST = os.environ.get("WHTWND_WHITEWIND_HOST", "https://whtwnd.com").rstrip("/")
 
 
 # ──────────────────────────────────────────────
 # Markdown 処理 (画像パスの置換)
 # ──────────────────────────────────────────────
 
-def process_markdown_images(content: str, md_dir: Path, session: dict) -> tuple[str, list]:
+DEFAULT_JOBS = 4  # 画像の同時アップロード数
+
+
+def local_image_paths(refs: list) -> list[str]:
+    """markdown_images.scan() の結果からローカルの参照先を重複なく初出順に返す（リモートURLは除く）"""
+    paths = dict.fromkeys(path for _, _, path, _ in refs if path)
+    return [p for p in paths if not p.startswith(("http://", "https://", "data:"))]
+
+
+def scan_markdown_images(content: str, md_dir: Path) -> tuple[list, dict, list[Path]]:
+    """
+    Markdown内の画像参照を走査してローカルパスを解決する。
+    (markdown_images.scan() の結果, 参照先 → 解決済みパス（存在しなければ None）,
+     アップロード対象のユニークなファイル（初出順）) を返す。
+    """
+    import markdown_images
+
+    refs = markdown_images.scan(content)
+    resolved: dict[str, Path | None] = {}
+    unique_files: list[Path] = []
+    for path_str in local_image_paths(refs):
+        img_path = (md_dir / path_str).resolve()
+        if not img_path.exists():
+            print(f"  ⚠ 画像ファイルが見つかりません (スキップ): {img_path}")
+            resolved[path_str] = None
+            continue
+        resolved[path_str] = img_path
+        if img_path not in unique_files:
+            unique_files.append(img_path)
+    return refs, resolved, unique_files
+
+
+def substitute_images(content: str, did: str, refs: list, resolved: dict, unique_files: list[Path],
+                      uploaded: dict) -> tuple[str, list]:
+    """アップロード結果（パス → blob）で画像の参照先を公開URLに一括置換し、(content, blobs) を返す"""
+    import markdown_images
+
+    blobs = [{"blobref": uploaded[p], "name": p.name} for p in unique_files]
+    public_urls = {
+        p: atproto.blob_to_public_url(did, blob_obj["ref"]["$link"])
+        for p, blob_obj in uploaded.items()
+    }
+    replacements = {path_str: public_urls[p] for path_str, p in resolved.items() if p is not None}
+    return markdown_images.splice(content, refs, replacements), blobs
+
+
+def process_markdown_images(content: str, md_dir: Path, session: dict,
+                            cache: "blob_cache.BlobCache | None" = None,
+                            jobs: int = DEFAULT_JOBS, prep: dict | None = None) -> tuple[str, list]:
     """
     Markdown内のローカル画像参照を検出してアップロードし、
     公開URLに置き換えたcontent文字列とblobsリストを返す。
 
-    対象: ![alt](./relative/path.png) 形式のローカルパス
-    対象外: ![alt](https://...) 形式のリモートURL (そのまま)
+    対象: ローカルパスを参照する画像（![alt](./path.png)・参照形式の画像・<img src>。markdown_images を参照）
+    対象外: リモートURL (そのまま)・コードブロックやインラインコードの中の画像
+
+    処理は3段階:
+      1. 文書を1回走査して画像参照とその位置を集め、ローカルパスを解決（重複ファイルは1つにまとめる）
+      2. ユニークなファイルを最大 jobs 並列でアップロード
+      3. 参照先の位置を公開URLに差し替えて1回で結合（alt・タイトルはそのまま）
+    blobs リストは本文中の初出順に並ぶ（並列アップロードの完了順に依存しない）。
+
+    cache を渡すと、内容が同じ画像は過去のアップロード結果を再利用してアップロードを省略する。
+    キャッシュにない画像もローカルで計算した CID の blob が PDS に既にあればアップロードしない。
+    prep（image_prep の設定）を渡すと、アップロード前に画像を縮小・再圧縮した派生ファイルに差し替える。
+    アップロード失敗時は RuntimeError を送出する。
     """
-    blobs = []
-    uploaded_cache = {}  # 同じファイルを重複アップロードしないキャッシュ
+    from concurrent.futures import ThreadPoolExecutor
+
+    refs, resolved, unique_files = scan_markdown_images(content, md_dir)
+    sources = image_prep.prepare_images(unique_files, prep, jobs, cache) if prep and unique_files else {}
+
+    def upload(img_path: Path) -> dict:
+        img_path = sources.get(img_path, img_path)
+        cid = None
+        if cache:
+            blob_obj = cache.lookup(session["did"], img_path)
+            if blob_obj is not None:
+                print(f"  ✓ キャッシュ済み: {img_path.name} → CID: {blob_obj['ref']['$link'][:16]}…")
+                return blob_obj
+            cid = atproto.cid_from_sha256(bytes.fromhex(cache.digest(img_path)))
+        blob_obj = atproto.upload_blob(session, img_path, skip_existing=True, cid=cid)
+        if cache:
+            cache.store(session["did"], img_path, blob_obj)
+        return blob_obj
+
+    if len(unique_files) > 1 and jobs > 1:
+        atproto.ensure_pool_size(jobs)
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            uploaded = dict(zip(unique_files, pool.map(upload, unique_files)))
+    else:
+        uploaded = {img_path: upload(img_path) for img_path in unique_files}
 
-    pattern = re.compile(r'!\[([^\]]*)\]\(([^)]+)\)')
+    return substitute_images(content, session["did"], refs, resolved, unique_files, uploaded)
 
-    def replace_image(match):
-        alt = match.group(1)
-        path_str = match.group(2).strip()
 
-        # リモートURLはそのまま
-        if path_str.startswith(("http://", "https://", "data:")):
-            return match.group(0)
+async def process_markdown_images_async(content: str, md_dir: Path, session: dict,
+                                        cache: "blob_cache.BlobCache | None" = None,
+                                        jobs: int = DEFAULT_JOBS, prep: dict | None = None) -> tuple[str, list]:
+    """
+    process_markdown_images の asyncio 版。アップロードは atproto_async で最大 jobs 件を同時に行う。
+    アップロード失敗時は RuntimeError を送出する。
+    """
+    import asyncio
 
-        # ローカルパスを解決
-        img_path = (md_dir / path_str).resolve()
-        if not img_path.exists():
-            print(f"  ⚠ 画像ファイルが見つかりません (スキップ): {img_path}")
-            return match.group(0)
+    import atproto_async  # aiohttp は --async 指定時のみ必要
 
-        path_key = str(img_path)
-        if path_key in uploaded_cache:
-            blob_obj, public_url = uploaded_cache[path_key]
-        else:
-            blob_obj = atproto.upload_blob(session, img_path)
-            cid = blob_obj["ref"]["$link"]
-            public_url = atproto.blob_to_public_url(session["did"], cid)
-            uploaded_cache[path_key] = (blob_obj, public_url)
-            blobs.append({"blobref": blob_obj, "name": img_path.name})
+    refs, resolved, unique_files = scan_markdown_images(content, md_dir)
+    sources = {}
+    if prep and unique_files:
+        sources = await asyncio.to_thread(image_prep.prepare_images, unique_files, prep, jobs, cache)
+
+    async def upload(client, img_path: Path) -> dict:
+        img_path = sources.get(img_path, img_path)
+        cid = None
+        if cache:
+            blob_obj = await asyncio.to_thread(cache.lookup, session["did"], img_path)
+            if blob_obj is not None:
+                print(f"  ✓ キャッシュ済み: {img_path.name} → CID: {blob_obj['ref']['$link'][:16]}…")
+                return blob_obj
+            digest = await asyncio.to_thread(cache.digest, img_path)
+            cid = atproto.cid_from_sha256(bytes.fromhex(digest))
+        blob_obj = await atproto_async.upload_blob(client, session, img_path, skip_existing=True, cid=cid)
+        if cache:
+            await asyncio.to_thread(cache.store, session["did"], img_path, blob_obj)
+        return blob_obj
 
-        return f"![{alt}]({public_url})"
+    async with atproto_async.AsyncClient(max_concurrency=jobs, limit_per_host=jobs) as client:
+        results = await asyncio.gather(*(upload(client, p) for p in unique_files))
+    uploaded = dict(zip(unique_files, results))
 
-    new_content = pattern.sub(replace_image, content)
-    return new_content, blobs
+    return substitute_images(content, session["did"], refs, resolved, unique_files, uploaded)
+
+
+def extract_h1_title(content: str) -> str | None:
+    """Markdownの先頭H1をタイトルとして返す。なければ None"""
+    h1_match = re.match(r"^#\s+(.+)", content.strip(), re.MULTILINE)
+    return h1_match.group(1).strip() if h1_match else None
 
 
 # ──────────────────────────────────────────────
 # WhiteWind記事投稿
 # ──────────────────────────────────────────────
 
-def post_entry(session: dict, title: str, content: str, blobs: list,
-               visibility: str = "public", draft: bool = False) -> str:
+def build_entry_record(title: str, content: str, blobs: list,
+                       visibility: str = "public", draft: bool = False,
+                       created_at: str | None = None) -> dict:
     """
-    com.whtwnd.blog.entry レコードを作成してAT URIを返す。
-    失敗時は RuntimeError を送出する。
+    com.whtwnd.blog.entry レコードの値を組み立てる。
+    created_at を省略すると現在時刻を使う（更新時は元の作成日時を渡す）。
     """
     record = {
         "$type": "com.whtwnd.blog.entry",
         "content": content,
-        "createdAt": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        "createdAt": created_at or datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
         "visibility": "author" if draft else visibility,
         "theme": "github-light",
     }
@@ -99,11 +213,21 @@ def post_entry(session: dict, title: str, content: str, blobs: list,
         record["title"] = title
     if blobs:
         record["blobs"] = blobs
+    return record
+
+
+def post_entry(session: dict, title: str, content: str, blobs: list,
+               visibility: str = "public", draft: bool = False) -> str:
+    """
+    com.whtwnd.blog.entry レコードを作成してAT URIを返す。
+    失敗時は RuntimeError を送出する。
+    """
+    record = build_entry_record(title, content, blobs, visibility, draft)
 
     resp = atproto.api_request(
         "POST",
         f"{atproto.PDS_HOST}/xrpc/com.atproto.repo.createRecord",
-        headers={"Authorization": f"Bearer {session['accessJwt']}"},
+        auth=session,
         json={
             "repo": session["did"],
             "collection": "com.whtwnd.blog.entry",
@@ -124,27 +248,19 @@ def post_entry(session: dict, title: str, content: str, blobs: list,
 
 
 def update_entry(session: dict, rkey: str, title: str, content: str, blobs: list,
-                 visibility: str = "public", draft: bool = False) -> str:
+                 visibility: str = "public", draft: bool = False,
+                 created_at: str | None = None) -> str:
     """
     com.whtwnd.blog.entry レコードを更新してAT URIを返す。
+    created_at に元の作成日時を渡すと保持する（省略時は現在時刻）。
     失敗時は RuntimeError を送出する。
     """
-    record = {
-        "$type": "com.whtwnd.blog.entry",
-        "content": content,
-        "createdAt": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
-        "visibility": "author" if draft else visibility,
-        "theme": "github-light",
-    }
-    if title:
-        record["title"] = title
-    if blobs:
-        record["blobs"] = blobs
+    record = build_entry_record(title, content, blobs, visibility, draft, created_at)
 
     resp = atproto.api_request(
         "POST",
         f"{atproto.PDS_HOST}/xrpc/com.atproto.repo.putRecord",
-        headers={"Authorization": f"Bearer {session['accessJwt']}"},
+        auth=session,
         json={
             "repo": session["did"],
             "collection": "com.whtwnd.blog.entry",
@@ -169,11 +285,9 @@ def notify_whitewind(session: dict, at_uri: str):
     """WhiteWind AppViewにインデックスを依頼する"""
     resp = atproto.api_request(
         "POST",
-        "https://whtwnd.com/xrpc/com.whtwnd.blog.notifyOfNewEntry",
-        headers={
-            "Authorization": f"Bearer {session['accessJwt']}",
-            "Content-Type": "application/json",
-        },
+        f"{WHITEWIND_HOST}/xrpc/com.whtwnd.blog.notifyOfNewEntry",
+        auth=session,
+        headers={"Content-Type": "application/json"},
         json={"entryUri": at_uri},
         timeout=15,
     )
@@ -189,90 +303,102 @@ def entry_url(handle: str, at_uri: str, title: str) -> str:
     rkey = at_uri.split("/")[-1]
     if title:
         safe_title = title.replace(" ", "%20")
-        return f"https://whtwnd.com/{handle}/entries/{safe_title}"
-    return f"https://whtwnd.com/{handle}/{rkey}"
+        return f"{WHITEWIND_HOST}/{handle}/entries/{safe_title}"
+    return f"{WHITEWIND_HOST}/{handle}/{rkey}"
 
 
 # ──────────────────────────────────────────────
 # 記事一覧
 # ──────────────────────────────────────────────
 
-def list_entries(session: dict):
-    """投稿済み記事の一覧を表示する"""
-    resp = atproto.api_request(
-        "GET",
-        f"{atproto.PDS_HOST}/xrpc/com.atproto.repo.listRecords",
-        params={
-            "repo": session["did"],
-            "collection": "com.whtwnd.blog.entry",
-            "limit": 50,
-        },
-        headers={"Authorization": f"Bearer {session['accessJwt']}"},
-        timeout=15,
-    )
-    if resp.status_code == 401:
-        print("一覧取得失敗: 認証トークンが無効です。再ログインしてください。")
-        sys.exit(1)
-    if not resp.ok:
-        print(f"一覧取得失敗: {resp.status_code} {resp.text}")
-        sys.exit(1)
+LIST_FIELDS = ["rkey", "uri", "cid", "title", "visibility", "createdAt", "url"]
 
-    records = resp.json().get("records", [])
-    if not records:
-        print("記事がありません。")
-        return
 
-    print(f"\n{'─'*60}")
-    print(f"{'タイトル':<30} {'公開設定':<10} {'作成日'}")
-    print(f"{'─'*60}")
+def list_entries(session: dict, limit: int | None = None, as_json: bool = False,
+                 fields: list[str] | None = None, reverse: bool = False):
+    """
+    投稿済み記事の一覧を表示する。
+    listRecords をページ単位で順に取得しながら1件ずつ出力するため、
+    記事数に関係なくメモリ使用量は一定で、最初のページが届いた時点で表示が始まる。
+
+    as_json=True の場合は1行1記事の JSON (JSONL) で出力し、fields で出力する項目を選択できる。
+    """
+    page_size = min(limit, 100) if limit else 100
+    records = atproto.iter_records(
+        session, "com.whtwnd.blog.entry",
+        page_size=page_size,
+        reverse=reverse,
+        prefetch=limit is None or limit > page_size,  # 1ページで足りるなら先読みしない
+    )
+    fields = fields or LIST_FIELDS
+
+    count = 0
     for r in records:
         v = r["value"]
-        title = v.get("title", "(無題)")[:28]
-        vis = v.get("visibility", "public")
-        created = v.get("createdAt", "")[:10]
         rkey = r["uri"].split("/")[-1]
-        print(f"{title:<30} {vis:<10} {created}  ({rkey})")
-    print(f"{'─'*60}\n")
+        if as_json:
+            row = {
+                "rkey": rkey,
+                "uri": r["uri"],
+                "cid": r.get("cid"),
+                "title": v.get("title"),
+                "visibility": v.get("visibility", "public"),
+                "createdAt": v.get("createdAt"),
+                "url": entry_url(session["handle"], r["uri"], v.get("title")),
+            }
+            print(json.dumps({k: row[k] for k in fields}, ensure_ascii=False), flush=True)
+        else:
+            if count == 0:
+                print(f"\n{'─'*60}")
+                print(f"{'タイトル':<30} {'公開設定':<10} {'作成日'}")
+                print(f"{'─'*60}")
+            title = v.get("title", "(無題)")[:28]
+            vis = v.get("visibility", "public")
+            created = v.get("createdAt", "")[:10]
+            print(f"{title:<30} {vis:<10} {created}  ({rkey})", flush=True)
+        count += 1
+        if limit is not None and count >= limit:
+            break
+
+    if as_json:
+        return
+    if count == 0:
+        print("記事がありません。")
+        return
+    print(f"{'─'*60}")
+    print(f"  {count}件\n")
 
 
 # ──────────────────────────────────────────────
 # サブコマンド
 # ──────────────────────────────────────────────
 
-def find_rkey_by_title(session: dict, title: str) -> str:
-    """
-    PDS の listRecords を検索してタイトルに一致する記事の rkey を返す。
-    カーソルを使って全件検索する。見つからない場合は RuntimeError を送出する。
+def find_rkey_by_title(session: dict, title: str,
+                       index: "entry_index.EntryIndex | None" = None) -> str:
     """
-    cursor = None
-    while True:
-        params = {
-            "repo": session["did"],
-            "collection": "com.whtwnd.blog.entry",
-            "limit": 100,
-        }
-        if cursor:
-            params["cursor"] = cursor
-
-        resp = atproto.api_request(
-            "GET",
-            f"{atproto.PDS_HOST}/xrpc/com.atproto.repo.listRecords",
-            params=params,
-            headers={"Authorization": f"Bearer {session['accessJwt']}"},
-            timeout=15,
-        )
-        if not resp.ok:
-            raise RuntimeError(f"記事一覧の取得に失敗しました: {resp.status_code}")
-
-        data = resp.json()
-        for r in data.get("records", []):
-            if r["value"].get("title") == title:
-                return r["uri"].split("/")[-1]
-
-        cursor = data.get("cursor")
-        if not cursor:
-            break
+    タイトルに一致する記事の rkey を返す。見つからない場合は RuntimeError を送出する。
+    ローカルの記事索引を差分同期（通常 listRecords 1回）してから検索し、
+    索引にない場合のみ listRecords を全件取得して索引を作り直したうえで再検索する。
 
+    差分同期では削除された記事や古い記事の編集を検出できないため、見つかった rkey は getRecord で
+    存在とタイトルを確かめる（削除済みの rkey に putRecord して記事を作り直さないため）。
+    食い違っていれば索引を作り直して検索し直し、確かめた createdAt・CID を索引に反映する。
+    """
+    if index is None:
+        import entry_index
+        index = entry_index.shared()
+    index.sync(session)
+    for rebuilt in (False, True):
+        rkey = index.find_by_title(session["did"], title)
+        if rkey is not None:
+            record = atproto.get_record(session, "com.whtwnd.blog.entry", rkey)
+            if record is not None and record["value"].get("title") == title:
+                index.put(session["did"], rkey, title, record.get("cid"), record["value"].get("createdAt"))
+                return rkey
+        if not rebuilt:
+            if rkey is not None:
+                print("  記事索引が古いため作り直します...")
+            index.rebuild(session)
     raise RuntimeError(f"記事が見つかりません: タイトル「{title}」")
 
 
@@ -281,7 +407,7 @@ def resolve_rkey(session: dict, target: str | None, title: str | None) -> str:
     rkey を解決して返す。
     - target が "at://" 始まりの AT URI ならその末尾を使用
     - target が rkey 文字列ならそのまま使用
-    - title 指定時は listRecords を全件検索してタイトルが一致する rkey を返す
+    - title 指定時はローカルの記事索引からタイトルが一致する rkey を返す
     """
     if title:
         return find_rkey_by_title(session, title)
@@ -293,8 +419,12 @@ def resolve_rkey(session: dict, target: str | None, title: str | None) -> str:
 
 
 def cmd_post(args):
+    import asyncio
+
+    import blob_cache
+
     config = atproto.load_config()
-    session = atproto.create_session(config["handle"], config["password"])
+    session = atproto.login(config["handle"], config["password"])
 
     md_file = Path(args.file)
     if not md_file.exists():
@@ -306,16 +436,27 @@ def cmd_post(args):
     # タイトルが未指定の場合、Markdownの先頭H1から取得
     title = args.title
     if not title:
-        h1_match = re.match(r"^#\s+(.+)", raw_content.strip(), re.MULTILINE)
-        if h1_match:
-            title = h1_match.group(1).strip()
+        title = extract_h1_title(raw_content)
+        if title:
             print(f"  タイトルをMarkdownのH1から取得: {title}")
 
     # 画像処理
     print("\n[画像のアップロード]")
     blobs: list = []
+    cache = None if args.no_cache else blob_cache.shared()
+    prep = image_prep.options_from_args(args)
     if not args.no_images:
-        content, blobs = process_markdown_images(raw_content, md_file.parent, session)
+        try:
+            if args.use_async:
+                content, blobs = asyncio.run(process_markdown_images_async(
+                    raw_content, md_file.parent, session, cache, jobs=args.jobs,
+                    prep=prep))
+            else:
+                content, blobs = process_markdown_images(raw_content, md_file.parent, session, cache,
+                                                         jobs=args.jobs, prep=prep)
+        except RuntimeError as e:
+            print(f"エラー: {e}")
+            sys.exit(1)
         if not blobs:
             print("  (ローカル画像なし)")
     else:
@@ -338,6 +479,8 @@ def cmd_post(args):
         if blobs:
             print("  ⚠ 画像はアップロード済みですが、記事の作成に失敗しました。")
             print("    アップロード済みの画像はPDSのGCにより自動削除されます。")
+            if cache:
+                cache.forget(session["did"], [b["blobref"]["ref"]["$link"] for b in blobs])
         sys.exit(1)
 
     # WhiteWind通知
@@ -356,8 +499,13 @@ def cmd_post(args):
 
 
 def cmd_update(args):
+    import asyncio
+
+    import blob_cache
+    import entry_index
+
     config = atproto.load_config()
-    session = atproto.create_session(config["handle"], config["password"])
+    session = atproto.login(config["handle"], config["password"])
 
     # rkey の解決
     try:
@@ -367,6 +515,21 @@ def cmd_update(args):
         sys.exit(1)
     print(f"  更新対象 rkey: {rkey}")
 
+    # 元の作成日時を保持する。--title の場合は find_rkey_by_title() が getRecord で確かめた索引の値を使い、
+    # rkey 指定の場合は getRecord で存在も確かめる（削除済みの記事を putRecord で作り直さないため）
+    index = entry_index.shared()
+    created_at = (index.get(session["did"], rkey) or {}).get("createdAt") if args.title else None
+    if created_at is None:
+        try:
+            existing = atproto.get_record(session, "com.whtwnd.blog.entry", rkey)
+        except RuntimeError as e:
+            print(f"エラー: {e}")
+            sys.exit(1)
+        if existing is None:
+            print(f"エラー: 記事が見つかりません: rkey {rkey}")
+            sys.exit(1)
+        created_at = existing["value"].get("createdAt")
+
     md_file = Path(args.file)
     if not md_file.exists():
         print(f"ファイルが見つかりません: {md_file}")
@@ -377,16 +540,27 @@ def cmd_update(args):
     # タイトル: CLIオプション → Markdown H1 → rkey の順
     new_title = args.new_title
     if not new_title:
-        h1_match = re.match(r"^#\s+(.+)", raw_content.strip(), re.MULTILINE)
-        if h1_match:
-            new_title = h1_match.group(1).strip()
+        new_title = extract_h1_title(raw_content)
+        if new_title:
             print(f"  タイトルをMarkdownのH1から取得: {new_title}")
 
     # 画像処理
     print("\n[画像のアップロード]")
     blobs: list = []
+    cache = None if args.no_cache else blob_cache.shared()
+    prep = image_prep.options_from_args(args)
     if not args.no_images:
-        content, blobs = process_markdown_images(raw_content, md_file.parent, session)
+        try:
+            if args.use_async:
+                content, blobs = asyncio.run(process_markdown_images_async(
+                    raw_content, md_file.parent, session, cache, jobs=args.jobs,
+                    prep=prep))
+            else:
+                content, blobs = process_markdown_images(raw_content, md_file.parent, session, cache,
+                                                         jobs=args.jobs, prep=prep)
+        except RuntimeError as e:
+            print(f"エラー: {e}")
+            sys.exit(1)
         if not blobs:
             print("  (ローカル画像なし)")
     else:
@@ -404,14 +578,20 @@ def cmd_update(args):
             blobs=blobs,
             visibility=args.visibility,
             draft=args.draft,
+            created_at=created_at,
         )
     except RuntimeError as e:
         print(f"エラー: {e}")
         if blobs:
             print("  ⚠ 画像はアップロード済みですが、記事の更新に失敗しました。")
             print("    アップロード済みの画像はPDSのGCにより自動削除されます。")
+            if cache:
+                cache.forget(session["did"], [b["blobref"]["ref"]["$link"] for b in blobs])
         sys.exit(1)
 
+    # 記事索引に反映（CIDは次回同期時に取得）
+    index.put(session["did"], rkey, new_title or md_file.stem, None, created_at)
+
     # WhiteWind通知
     notify_whitewind(session, at_uri)
 
@@ -427,9 +607,26 @@ def cmd_update(args):
     print(f"{'='*50}\n")
 
 
+def forget_entry_blobs(session: dict, cache: "blob_cache.BlobCache", rkeys: list[str]):
+    """
+    削除する記事が参照している blob をキャッシュから取り除く（どこからも参照されなくなると PDS の GC で消えるため）。
+    記事を削除する前に getRecord で blobs を読む。取得できなかった記事は飛ばす（キャッシュは期限切れで確かめ直される）。
+    """
+    for rkey in rkeys:
+        try:
+            record = atproto.get_record(session, "com.whtwnd.blog.entry", rkey)
+        except RuntimeError:
+            continue
+        if record is not None:
+            cache.forget(session["did"], [b["blobref"]["ref"]["$link"]
+                                          for b in record["value"].get("blobs", []) if b.get("blobref")])
+
+
 def cmd_delete(args):
+    import blob_cache
+
     config = atproto.load_config()
-    session = atproto.create_session(config["handle"], config["password"])
+    session = atproto.login(config["handle"], config["password"])
 
     # rkey の解決
     try:
@@ -448,10 +645,11 @@ def cmd_delete(args):
             print("削除をキャンセルしました。")
             sys.exit(0)
 
+    forget_entry_blobs(session, blob_cache.shared(), [rkey])
     resp = atproto.api_request(
         "POST",
         f"{atproto.PDS_HOST}/xrpc/com.atproto.repo.deleteRecord",
-        headers={"Authorization": f"Bearer {session['accessJwt']}"},
+        auth=session,
         json={
             "repo": session["did"],
             "collection": "com.whtwnd.blog.entry",
@@ -466,13 +664,719 @@ def cmd_delete(args):
         print(f"削除失敗: {resp.status_code} {resp.text}")
         sys.exit(1)
 
+    entry_index.shared().remove(session["did"], rkey)
     print(f"✓ 削除完了: {rkey}")
 
 
+def collect_markdown_files(target: str) -> list[Path]:
+    """ディレクトリなら配下の *.md を再帰的に、それ以外はglobパターンとして展開して返す（パス順）"""
+    path = Path(target)
+    if path.is_dir():
+        return sorted(path.rglob("*.md"))
+    return sorted(Path(p) for p in glob.glob(target, recursive=True) if p.endswith(".md"))
+
+
+def cmd_publish(args):
+    from concurrent.futures import ThreadPoolExecutor
+
+    import blob_cache
+    import entry_index
+
+    md_files = collect_markdown_files(args.target)
+    if not md_files:
+        print(f"Markdownファイルが見つかりません: {args.target}")
+        sys.exit(1)
+
+    config = atproto.load_config()
+    session = atproto.login(config["handle"], config["password"])
+    cache = None if args.no_cache else blob_cache.shared()
+    prep = image_prep.options_from_args(args)
+    index = entry_index.shared()
+    if not args.create_only:
+        index.sync(session)
+
+    sources = []
+    for md_file in md_files:
+        raw_content = md_file.read_text(encoding="utf-8")
+        sources.append((md_file, raw_content, extract_h1_title(raw_content) or md_file.stem))
+
+    # 索引で見つかった rkey は存在とタイトルを確かめてから #update にする
+    # （索引が古いと、削除済みの rkey で一括書き込み全体が失敗したり、改題された別の記事を上書きしたりするため）
+    existing: dict[str, dict] = {}
+    if not args.create_only:
+        try:
+            existing = confirm_entries_by_title(session, index, [title for *_, title in sources], args.jobs)
+        except RuntimeError as e:
+            print(f"エラー: {e}")
+            sys.exit(1)
+
+    # 1. 記事の準備（タイトル抽出・画像アップロード・レコード作成）
+    print(f"\n[記事の準備] {len(md_files)}件")
+    writes: list[dict] = []
+    articles: list[dict] = []
+    for md_file, raw_content, title in sources:
+        print(f"\n● {md_file}  ({title})")
+
+        blobs: list = []
+        content = raw_content
+        if not args.no_images:
+            try:
+                content, blobs = process_markdown_images(raw_content, md_file.parent, session, cache,
+                                                         jobs=args.jobs, prep=prep)
+            except RuntimeError as e:
+                print(f"エラー: {e}")
+                sys.exit(1)
+
+        prev = existing.get(title)
+        rkey = prev["rkey"] if prev else None
+        created_at = prev["createdAt"] if prev else None  # 元の作成日時を保持する
+        record = build_entry_record(title, content, blobs, args.visibility, args.draft, created_at=created_at)
+        if rkey:
+            action = "更新"
+            writes.append({"$type": "com.atproto.repo.applyWrites#update",
+                           "collection": "com.whtwnd.blog.entry", "rkey": rkey, "value": record})
+        else:
+            action = "作成"
+            rkey = atproto.generate_tid()
+            writes.append({"$type": "com.atproto.repo.applyWrites#create",
+                           "collection": "com.whtwnd.blog.entry", "rkey": rkey, "value": record})
+        articles.append({"file": md_file, "title": title, "rkey": rkey, "action": action,
+                         "record": record, "blobs": blobs})
+
+    # 2. applyWrites で一括書き込み
+    batch_size = min(args.batch_size, atproto.APPLY_WRITES_LIMIT)
+    batches = -(-len(writes) // batch_size)
+    print(f"\n[一括書き込み] {len(writes)}件 / applyWrites {batches}回")
+    at_uris: list[str] = []
+    try:
+        for article, result in zip(articles, atproto.apply_writes(session, writes, batch_size)):
+            at_uris.append(result["uri"])
+            index.put(session["did"], article["rkey"], article["title"], result.get("cid"),
+                      article["record"]["createdAt"])
+    except RuntimeError as e:
+        print(f"エラー: {e}")
+        print(f"  {len(at_uris)}件は書き込み済みです。残り{len(articles) - len(at_uris)}件は未反映です。")
+        failed = articles[len(at_uris):]
+        if cache and any(a["blobs"] for a in failed):
+            cache.forget(session["did"],
+                         [b["blobref"]["ref"]["$link"] for a in failed for b in a["blobs"]])
+        sys.exit(1)
+    print(f"✓ {len(at_uris)}件を書き込みました")
+
+    # 3. WhiteWind通知（並列）
+    print("\n[WhiteWind通知]")
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        list(pool.map(lambda uri: notify_whitewind(session, uri), at_uris))
+
+    # 結果表示
+    print(f"\n{'='*60}")
+    print(f"✅ 一括投稿完了! ({len(at_uris)}件)")
+    for article, at_uri in zip(articles, at_uris):
+        print(f"   [{article['action']}] {article['title']}")
+        print(f"          {entry_url(config['handle'], at_uri, article['title'])}")
+    print(f"{'='*60}\n")
+
+
+MANIFEST_NAME = ".whtwnd_manifest.json"
+
+
+def load_manifest(path: Path) -> dict:
+    """sync 用マニフェストを読み込む。なければ空のマニフェストを返す"""
+    if not path.exists():
+        return {"version": 1, "did": None, "entries": {}}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except json.JSONDecodeError as e:
+        print(f"エラー: マニフェストのJSON形式が不正です: {path}")
+        print(f"  詳細: {e}")
+        sys.exit(1)
+
+
+def save_manifest(path: Path, manifest: dict):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True) + "\n",
+                   encoding="utf-8")
+    tmp.replace(path)
+
+
+def source_fingerprint(raw_content: str, md_dir: Path, title: str, visibility: str,
+                       cache: "blob_cache.BlobCache | None", prep: dict | None = None) -> tuple[str, dict]:
+    """
+    記事の変更検出用に (ソースのハッシュ, 画像パス → sha256) を返す。
+    本文・タイトル・公開設定・参照しているローカル画像の内容から計算し、ネットワークにはアクセスしない。
+    画像の前処理設定（prep）を変えた場合も変更として扱う。
+    """
+    import markdown_images
+
+    images = {}
+    for path_str in local_image_paths(markdown_images.scan(raw_content)):
+        img_path = (md_dir / path_str).resolve()
+        if img_path.exists():
+            images[path_str] = cache.digest(img_path) if cache else atproto.file_sha256(img_path).hex()
+    parts = [raw_content, title, visibility, images]
+    if prep:
+        parts.append(image_prep.options_tag(prep))
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest(), images
+
+
+def rendered_hash(record: dict) -> str:
+    """画像置換後のレコード内容（createdAt を除く）のハッシュ"""
+    payload = {k: v for k, v in record.items() if k != "createdAt"}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def build_manifest_entry(prev: dict | None, title: str, content: str, blobs: list, visibility: str,
+                         fingerprint: str, images: dict) -> tuple[dict, dict]:
+    """
+    画像置換後の本文から (レコード, マニフェストのエントリ) を組み立てる。
+    既存のエントリ（prev）があれば rkey・createdAt・cid を引き継ぎ、なければ新しい TID を割り当てる。
+    """
+    record = build_entry_record(title, content, blobs, visibility,
+                                created_at=prev.get("createdAt") if prev else None)
+    entry = {"rkey": prev["rkey"] if prev else atproto.generate_tid(),
+             "title": title, "sourceHash": fingerprint, "images": images,
+             "renderedHash": rendered_hash(record), "createdAt": record["createdAt"],
+             "cid": prev.get("cid") if prev else None}
+    return record, entry
+
+
+def confirm_entries_by_title(session: dict, index: "entry_index.EntryIndex", titles: list[str],
+                             jobs: int = DEFAULT_JOBS) -> dict[str, dict]:
+    """
+    タイトルごとに索引上の rkey を getRecord（最大 jobs 並列）で確かめ、存在してタイトルも一致する記事の
+    {"rkey", "createdAt", "cid"} をタイトルをキーにして返す（publish で #update を組み立てる前に使う）。
+    索引が古く、削除・改題されていた rkey は索引を直して同じタイトルの別の記事を探し直す。
+    失敗時は RuntimeError を送出する。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    did = session["did"]
+    confirmed: dict[str, dict] = {}
+    pending = list(dict.fromkeys(titles))
+    atproto.ensure_pool_size(jobs)
+    while pending:
+        candidates = {t: rkey for t in pending if (rkey := index.find_by_title(did, t)) is not None}
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            records = pool.map(lambda rkey: atproto.get_record(session, "com.whtwnd.blog.entry", rkey),
+                               candidates.values())
+            records = dict(zip(candidates, records))
+        pending = []
+        for title, record in records.items():
+            rkey = candidates[title]
+            if record is None:
+                index.remove(did, rkey)
+                pending.append(title)
+                continue
+            value = record["value"]
+            index.put(did, rkey, value.get("title"), record.get("cid"), value.get("createdAt"))
+            if value.get("title") == title:
+                confirmed[title] = {"rkey": rkey, "createdAt": value.get("createdAt"), "cid": record.get("cid")}
+            else:
+                pending.append(title)
+    return confirmed
+
+
+def adopt_existing_entry(session: dict, index: "entry_index.EntryIndex", title: str,
+                         claimed: set[str]) -> dict | None:
+    """
+    マニフェストにない記事ファイルを、同じタイトルの既存記事に対応付ける
+    （post / publish で投稿済みの記事を sync・watch の初回で重複して作成しないため）。
+    見つかれば build_manifest_entry() に渡す prev の形 {"rkey", "createdAt", "cid"} を返し、なければ None。
+    claimed（マニフェストで他のファイルに対応付け済みの rkey）は除き、索引の結果は getRecord で確かめる。
+    失敗時は RuntimeError を送出する。
+    """
+    rkey = index.find_by_title(session["did"], title)
+    if rkey is None or rkey in claimed:
+        return None
+    record = atproto.get_record(session, "com.whtwnd.blog.entry", rkey)
+    if record is None or record["value"].get("title") != title:
+        return None
+    return {"rkey": rkey, "createdAt": record["value"].get("createdAt"), "cid": record.get("cid")}
+
+
+def cmd_sync(args):
+    import blob_cache
+    import entry_index
+
+    root = Path(args.dir)
+    if not root.is_dir():
+        print(f"ディレクトリが見つかりません: {root}")
+        sys.exit(1)
+    manifest_path = Path(args.manifest) if args.manifest else root / MANIFEST_NAME
+    manifest = load_manifest(manifest_path)
+    entries: dict = manifest["entries"]
+    visibility = "author" if args.draft else args.visibility
+    cache = None if args.no_cache else blob_cache.shared()
+    prep = image_prep.options_from_args(args)
+
+    # 1. 変更検出（ローカルのみ）
+    changed = []  # (相対パス, ファイル, 本文, タイトル, ソースハッシュ, 画像ハッシュ)
+    md_files = sorted(root.rglob("*.md"))
+    seen = set()
+    for md_file in md_files:
+        rel = md_file.relative_to(root).as_posix()
+        seen.add(rel)
+        raw_content = md_file.read_text(encoding="utf-8")
+        title = extract_h1_title(raw_content) or md_file.stem
+        fingerprint, images = source_fingerprint(raw_content, md_file.parent, title, visibility, cache, prep)
+        prev = entries.get(rel)
+        if prev and prev.get("sourceHash") == fingerprint:
+            continue
+        changed.append((rel, md_file, raw_content, title, fingerprint, images))
+    removed = sorted(set(entries) - seen) if args.delete else []
+
+    print(f"\n[同期計画] {len(md_files)}件中 変更/新規 {len(changed)}件"
+          + (f" / 削除 {len(removed)}件" if args.delete else ""))
+    index = entry_index.shared()
+    for rel, *_ in changed:
+        print(f"  {'更新' if rel in entries else '新規（同じタイトルの既存記事があれば更新）'}: {rel}")
+    for rel in removed:
+        print(f"  削除: {rel}")
+    if not changed and not removed:
+        print("  変更はありません。")
+        return
+    if args.dry_run:
+        return
+
+    config = atproto.load_config()
+    session = atproto.login(config["handle"], config["password"])
+    if manifest.get("did") not in (None, session["did"]):
+        print(f"エラー: マニフェストは別のアカウント ({manifest['did']}) のものです: {manifest_path}")
+        sys.exit(1)
+    manifest["did"] = session["did"]
+
+    # マニフェストにない記事は、同じタイトルの既存記事があればそれを更新する
+    adopted: dict[str, dict] = {}
+    new_files = [(rel, title) for rel, _, _, title, *_ in changed if rel not in entries]
+    if new_files:
+        index.sync(session)
+        claimed = {e["rkey"] for e in entries.values()}
+        for rel, title in new_files:
+            try:
+                prev = adopt_existing_entry(session, index, title, claimed)
+            except RuntimeError as e:
+                print(f"エラー: {e}")
+                sys.exit(1)
+            if prev:
+                claimed.add(prev["rkey"])
+                adopted[rel] = prev
+                print(f"  既存の記事に対応付け: {rel} → {prev['rkey']}")
+
+    # 2. 画像処理・レコード作成。レンダリング結果が前回と同じなら書き込まない
+    writes: list[dict] = []
+    pending: list[tuple[str, dict | None]] = []  # (相対パス, マニフェストに書く内容。削除は None)
+    for rel, md_file, raw_content, title, fingerprint, images in changed:
+        prev = entries.get(rel) or adopted.get(rel)
+        blobs: list = []
+        content = raw_content
+        if not args.no_images:
+            try:
+                content, blobs = process_markdown_images(raw_content, md_file.parent, session, cache,
+                                                         jobs=args.jobs, prep=prep)
+            except RuntimeError as e:
+                print(f"エラー: {e}")
+                sys.exit(1)
+        record, entry = build_manifest_entry(prev, title, content, blobs, visibility, fingerprint, images)
+        if prev and prev.get("renderedHash") == entry["renderedHash"]:
+            entries[rel] = entry  # 内容は変わっていないのでマニフェストだけ更新
+            continue
+        write_type = "update" if prev else "create"
+        writes.append({"$type": f"com.atproto.repo.applyWrites#{write_type}",
+                       "collection": "com.whtwnd.blog.entry", "rkey": entry["rkey"], "value": record})
+        pending.append((rel, entry))
+    if removed and cache:
+        forget_entry_blobs(session, cache, [entries[rel]["rkey"] for rel in removed])
+    for rel in removed:
+        writes.append({"$type": "com.atproto.repo.applyWrites#delete",
+                       "collection": "com.whtwnd.blog.entry", "rkey": entries[rel]["rkey"]})
+        pending.append((rel, None))
+
+    # 3. 書き込み。成功したバッチの分だけマニフェストに反映する
+    print(f"\n[書き込み] {len(writes)}件")
+    notify_uris = []
+    try:
+        for (rel, entry), result in zip(pending, atproto.apply_writes(session, writes)):
+            if entry is None:
+                index.remove(session["did"], entries.pop(rel)["rkey"])
+                print(f"  ✓ 削除: {rel}")
+                continue
+            entry["cid"] = result.get("cid")
+            entries[rel] = entry
+            index.put(session["did"], entry["rkey"], entry["title"], entry["cid"], entry["createdAt"])
+            notify_uris.append(result["uri"])
+            print(f"  ✓ {rel} → {result['uri']}")
+    except RuntimeError as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+    finally:
+        save_manifest(manifest_path, manifest)
+
+    if notify_uris:
+        from concurrent.futures import ThreadPoolExecutor
+
+        print("\n[WhiteWind通知]")
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            list(pool.map(lambda uri: notify_whitewind(session, uri), notify_uris))
+    print(f"\n✅ 同期完了 (書き込み {len(writes)}件, マニフェスト: {manifest_path})\n")
+
+
+WATCH_DEBOUNCE = 0.5  # 最後の変更からこの秒数だけ静かになったらまとめて反映する
+_WATCH_MAX_DELAY = 5.0  # 保存が続いてもこの秒数で一度反映する
+
+
+def image_dependencies(raw_content: str, md_dir: Path) -> set[Path]:
+    """記事が参照しているローカル画像の解決済みパス（まだ存在しないものも含む）"""
+    import markdown_images
+
+    return {(md_dir / path_str).resolve() for path_str in local_image_paths(markdown_images.scan(raw_content))}
+
+
+def cmd_watch(args):
+    import blob_cache
+    import entry_index
+    import file_watch
+
+    root = Path(args.dir)
+    if not root.is_dir():
+        print(f"ディレクトリが見つかりません: {root}")
+        sys.exit(1)
+    root = root.resolve()
+    manifest_path = Path(args.manifest) if args.manifest else root / MANIFEST_NAME
+    manifest = load_manifest(manifest_path)
+    entries: dict = manifest["entries"]
+    visibility = "author" if args.draft else args.visibility
+    cache = None if args.no_cache else blob_cache.shared()
+    prep = image_prep.options_from_args(args)
+
+    config = atproto.load_config()
+    session = atproto.login(config["handle"], config["password"])
+    if manifest.get("did") not in (None, session["did"]):
+        print(f"エラー: マニフェストは別のアカウント ({manifest['did']}) のものです: {manifest_path}")
+        sys.exit(1)
+    manifest["did"] = session["did"]
+    index = entry_index.shared()
+    index.sync(session)  # マニフェストにない記事を既存の記事に対応付けるため
+    deps: dict[Path, set[Path]] = {}  # 記事 → 参照している画像
+    written = 0
+
+    def republish(md_files: set[Path]):
+        """変更のあった記事だけを update_entry で書き込む（画像は blob キャッシュにないものだけアップロード）"""
+        nonlocal written
+        for md_file in sorted(md_files):
+            rel = md_file.relative_to(root).as_posix()
+            try:
+                raw_content = md_file.read_text(encoding="utf-8")
+            except FileNotFoundError:
+                deps.pop(md_file, None)
+                if rel in entries:
+                    print(f"\n  ⚠ {rel} が削除されました（記事は残します。削除するには sync --delete を使ってください）")
+                continue
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"\n  ⚠ 読み込めません (スキップ): {rel} ({e})")
+                continue
+            deps[md_file] = image_dependencies(raw_content, md_file.parent)
+            title = extract_h1_title(raw_content) or md_file.stem
+            fingerprint, images = source_fingerprint(raw_content, md_file.parent, title, visibility, cache, prep)
+            prev = entries.get(rel)
+            if prev and prev.get("sourceHash") == fingerprint:
+                continue
+
+            label = "更新" if prev else "新規"
+            if prev is None:  # 同じタイトルの既存記事があればそれを更新する
+                try:
+                    prev = adopt_existing_entry(session, index, title, {e["rkey"] for e in entries.values()})
+                except RuntimeError as e:
+                    print(f"\nエラー: {e}")
+                    continue
+                if prev:
+                    label = f"更新（同じタイトルの既存記事 {prev['rkey']}）"
+            print(f"\n[{time.strftime('%H:%M:%S')}] {label}: {rel}")
+            blobs: list = []
+            content = raw_content
+            if not args.no_images:
+                try:
+                    content, blobs = process_markdown_images(raw_content, md_file.parent, session, cache,
+                                                             jobs=args.jobs, prep=prep)
+                except RuntimeError as e:
+                    # 監視は続ける。マニフェストを更新しないので、次の保存で再度アップロードする
+                    print(f"エラー: {e}")
+                    continue
+                except SystemExit:
+                    continue  # 通信エラーが続いた（api_request が表示済み）
+            _, entry = build_manifest_entry(prev, title, content, blobs, visibility, fingerprint, images)
+            if prev and prev.get("renderedHash") == entry["renderedHash"]:
+                entries[rel] = entry  # 内容は変わっていないのでマニフェストだけ更新
+                save_manifest(manifest_path, manifest)
+                print("  (レンダリング結果に変化なし)")
+                continue
+            try:
+                at_uri = update_entry(session, rkey=entry["rkey"], title=title, content=content, blobs=blobs,
+                                      visibility=visibility, created_at=entry["createdAt"])
+            except (RuntimeError, SystemExit) as e:
+                # 監視は続ける。マニフェストを更新しないので、次の保存で再度書き込む
+                if isinstance(e, RuntimeError):
+                    print(f"エラー: {e}")
+                if blobs and cache:
+                    cache.forget(session["did"], [b["blobref"]["ref"]["$link"] for b in blobs])
+                continue
+            entry["cid"] = None  # CIDは次回同期時に取得
+            entries[rel] = entry
+            save_manifest(manifest_path, manifest)
+            index.put(session["did"], entry["rkey"], title, None, entry["createdAt"])
+            notify_whitewind(session, at_uri)
+            written += 1
+
+    def outside_dirs() -> set[Path]:
+        return {img.parent for imgs in deps.values() for img in imgs if root not in img.parents}
+
+    # 監視を始める前に、前回の同期・監視以降の変更を反映しておく
+    print("\n[初回同期]")
+    republish(set(root.rglob("*.md")))
+    watcher = file_watch.create(root, polling=args.poll, interval=args.interval)
+    watcher.watch_dirs(outside_dirs())
+    print(f"\n👀 監視中 ({watcher.name}): {root}  (Ctrl+C で終了)")
+
+    try:
+        while True:
+            changed = watcher.wait(None)
+            if not changed:
+                continue
+            # 連続した保存（エディターの一時ファイル経由の書き込みなど）を1回の反映にまとめる
+            deadline = time.monotonic() + _WATCH_MAX_DELAY
+            while time.monotonic() < deadline:
+                more = watcher.wait(max(0.0, min(args.debounce, deadline - time.monotonic())))
+                if not more:
+                    break
+                changed |= more
+
+            if root in changed:  # イベントの取りこぼし: 全記事を確認する
+                affected = set(root.rglob("*.md")) | set(deps)
+            else:
+                affected = {p for p in changed if p.suffix == ".md" and root in p.parents}
+                affected |= {md for md, imgs in deps.items() if not imgs.isdisjoint(changed)}
+            republish(affected)
+            watcher.watch_dirs(outside_dirs())
+    except KeyboardInterrupt:
+        print(f"\n✅ 監視を終了しました (書き込み {written}件, マニフェスト: {manifest_path})\n")
+    finally:
+        watcher.close()
+
+
+def cmd_cache(args):
+    import blob_cache
+
+    cache = blob_cache.shared()
+    if args.action == "prune":
+        removed_blobs, removed_files = cache.prune(older_than_days=args.older_than, clear=args.all)
+        print(f"✓ 削除: blob {removed_blobs}件 / ファイル記録 {removed_files}件")
+
+    st = cache.stats()
+    print(f"\n{'─'*60}")
+    print(f"  キャッシュ     : {st['path']}")
+    print(f"  DBサイズ       : {st['db_bytes'] / 1024:.1f} KB")
+    print(f"  blob           : {st['blobs']}件 ({st['blob_bytes'] / 1024 / 1024:.1f} MB, DID {st['dids']}件)")
+    print(f"  ファイル記録   : {st['files']}件")
+    print(f"{'─'*60}\n")
+
+
 def cmd_list(args):
     config = atproto.load_config()
-    session = atproto.create_session(config["handle"], config["password"])
-    list_entries(session)
+    session = atproto.login(config["handle"], config["password"])
+    fields = None
+    if args.fields:
+        fields = [f.strip() for f in args.fields.split(",") if f.strip()]
+        unknown = [f for f in fields if f not in LIST_FIELDS]
+        if unknown:
+            print(f"不明なフィールド: {', '.join(unknown)}（指定可能: {', '.join(LIST_FIELDS)}）")
+            sys.exit(1)
+    try:
+        list_entries(session, limit=args.limit, as_json=args.json, fields=fields, reverse=args.reverse)
+    except RuntimeError as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+
+
+# ──────────────────────────────────────────────
+# エクスポート（getRepo の CAR からのバックアップ）
+# ──────────────────────────────────────────────
+
+EXPORT_STATE_NAME = ".whtwnd_export.json"
+ENTRY_COLLECTION = "com.whtwnd.blog.entry"
+POST_COLLECTION = "app.bsky.feed.post"
+
+
+def fetch_repo(did: str, since: str | None = None):
+    """
+    com.atproto.sync.getRepo の応答（CAR）をストリームで受け取る requests.Response を返す。
+    since にリビジョンを渡すとそれ以降の差分だけを受け取る。失敗時は RuntimeError を送出する。
+    """
+    params = {"did": did}
+    if since:
+        params["since"] = since
+    resp = atproto.api_request(
+        "GET",
+        f"{atproto.PDS_HOST}/xrpc/com.atproto.sync.getRepo",
+        params=params,
+        stream=True,
+        timeout=30,
+    )
+    if not resp.ok:
+        raise RuntimeError(f"リポジトリの取得に失敗しました: {resp.status_code} {resp.text}")
+    return resp
+
+
+def entry_markdown(record: dict) -> str:
+    """記事レコードを front matter 付きの Markdown にする（値は JSON の文字列・配列で書く。YAML としても読める）"""
+    value = record["value"]
+    front = {
+        "title": value.get("title"),
+        "rkey": record["rkey"],
+        "uri": record["uri"],
+        "cid": record["cid"],
+        "createdAt": value.get("createdAt"),
+        "visibility": value.get("visibility"),
+        "theme": value.get("theme"),
+        "blobs": [b["blobref"]["ref"]["$link"] for b in value.get("blobs", []) if b.get("blobref")] or None,
+    }
+    lines = ["---"]
+    lines += [f"{key}: {json.dumps(v, ensure_ascii=False)}" for key, v in front.items() if v is not None]
+    lines += ["---", ""]
+    return "\n".join(lines) + value.get("content", "")
+
+
+def export_repo(session: dict, out_dir: Path, since: str | None = None) -> dict:
+    """
+    リポジトリを getRepo の1リクエストで受け取り、記事を out_dir/entries/<rkey>.md に、
+    Bluesky の投稿を out_dir/posts.jsonl（1行1件、listRecords と同じ {"uri", "cid", "value"}）に書き出す。
+    CAR は受信しながら読み、記事は読んだ順にファイルへ書く（全体をメモリに載せない）。
+
+    since を渡すと差分だけを受け取り、記事は変わったものだけ書き直し、投稿は posts.jsonl に追記する。
+    差分には削除が含まれないため、PDS で削除された記事のファイルは since なしの書き出しでだけ削除される
+    （since なしの場合は posts.jsonl を作り直し、前回の書き出しにあって今回ない記事のファイルを削除する）。
+    差分が空（since 以降に変更がない）なら何も書き出さず、リビジョンは since のまま記録する。
+    書き出し後、リビジョンと記事の一覧を out_dir/.whtwnd_export.json に保存し、集計を返す。
+    """
+    import repo_car
+
+    state_path = out_dir / EXPORT_STATE_NAME
+    state = json.loads(state_path.read_text(encoding="utf-8")) if state_path.exists() else {}
+    if state.get("did") not in (None, session["did"]):
+        raise RuntimeError(f"書き出し先は別のアカウント ({state['did']}) のものです: {out_dir}")
+    entries_dir = out_dir / "entries"
+    entries_dir.mkdir(parents=True, exist_ok=True)
+
+    started = time.time()
+    resp = fetch_repo(session["did"], since)
+    reader = repo_car.RepoReader(resp.iter_content(chunk_size=1 << 16), session["did"],
+                                 (ENTRY_COLLECTION, POST_COLLECTION))
+    exported: set[str] = set()
+    counts = {"entries": 0, "posts": 0}
+    try:
+        with open(out_dir / "posts.jsonl", "a" if since else "w", encoding="utf-8") as posts:
+            for record in reader:
+                if record["collection"] == POST_COLLECTION:
+                    posts.write(json.dumps({k: record[k] for k in ("uri", "cid", "value")}, ensure_ascii=False)
+                                + "\n")
+                    counts["posts"] += 1
+                    continue
+                tmp = entries_dir / f".{record['rkey']}.md.tmp"
+                tmp.write_text(entry_markdown(record), encoding="utf-8")
+                tmp.replace(entries_dir / f"{record['rkey']}.md")
+                exported.add(record["rkey"])
+                counts["entries"] += 1
+    except ValueError as e:
+        raise RuntimeError(f"CAR の読み取りに失敗しました: {e}") from e
+    finally:
+        resp.close()
+
+    if reader.commit is None and not since:
+        raise RuntimeError("CAR の読み取りに失敗しました: コミットが含まれていません")
+    rev = reader.commit.get("rev") if reader.commit else since
+    removed = []
+    if since:
+        exported |= set(state.get("entries", []))
+    else:
+        removed = sorted(set(state.get("entries", [])) - exported)
+        for rkey in removed:
+            (entries_dir / f"{rkey}.md").unlink(missing_ok=True)
+    state = {"version": 1, "did": session["did"], "rev": rev,
+             "exportedAt": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+             "entries": sorted(exported)}
+    save_manifest(state_path, state)
+    return {**counts, "removed": len(removed), "unresolved": reader.unresolved, "blocks": reader.blocks,
+            "rev": state["rev"], "elapsed": time.time() - started}
+
+
+def cmd_export(args):
+    out_dir = Path(args.dir)
+    since = args.since
+    if args.incremental and not since:
+        state_path = out_dir / EXPORT_STATE_NAME
+        if state_path.exists():
+            since = json.loads(state_path.read_text(encoding="utf-8")).get("rev")
+        if not since:
+            print("前回の書き出しの記録がないため、全体を書き出します。")
+    config = atproto.load_config()
+    session = atproto.login(config["handle"], config["password"])
+    print(f"\nリポジトリを取得中{f' (rev {since} 以降の差分)' if since else ''}...")
+    try:
+        result = export_repo(session, out_dir, since)
+    except RuntimeError as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+
+    print(f"\n{'─'*60}")
+    print(f"  書き出し先     : {out_dir}")
+    print(f"  記事           : {result['entries']}件 (entries/*.md)"
+          + (f" / 削除 {result['removed']}件" if result["removed"] else ""))
+    print(f"  投稿           : {result['posts']}件 (posts.jsonl に{'追記' if since else '出力'})")
+    print(f"  ブロック       : {result['blocks']}件 / {result['elapsed']:.1f}秒")
+    print(f"  リビジョン     : {result['rev']}")
+    if since:
+        print("  ※ PDS で削除された記事は差分に含まれません（--incremental なしの書き出しでファイルを削除します）")
+    if result["unresolved"]:
+        print(f"  ⚠ パスの分からないレコード {result['unresolved']}件を書き出せませんでした")
+    print(f"{'─'*60}\n")
+
+
+# ──────────────────────────────────────────────
+# blob のミラー（画像のバックアップ）
+# ──────────────────────────────────────────────
+
+def cmd_mirror_blobs(args):
+    import blob_mirror
+
+    if args.jobs < 1:
+        print("--jobs は1以上を指定してください")
+        sys.exit(1)
+    store = Path(args.dir)
+    config = atproto.load_config()
+    session = atproto.login(config["handle"], config["password"])
+    try:
+        if args.all:
+            print("\nアカウントの blob 一覧を取得中...")
+            cids = blob_mirror.list_blob_cids(session["did"])
+        else:
+            print("\n記事が参照している blob を収集中...")
+            cids = blob_mirror.entry_blob_cids(session)
+    except RuntimeError as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+    print(f"  {len(cids)}件 → {store} (並列 {args.jobs})")
+    result = blob_mirror.mirror(session["did"], cids, store, jobs=args.jobs, verify_existing=args.verify)
+
+    print(f"\n{'─'*60}")
+    print(f"  保存先         : {store}")
+    print(f"  取得済み       : {result['present']}件{'（検証済み）' if args.verify else ''}")
+    print(f"  ダウンロード   : {result['downloaded'] + result['resumed']}件"
+          + (f"（うち続きから {result['resumed']}件）" if result["resumed"] else ""))
+    print(f"  受信           : {atproto.format_throughput(result['bytes'], result['elapsed'])}")
+    if result["failed"]:
+        print(f"  ✗ 失敗 {result['failed']}件（もう一度実行すると続きから取得します）")
+    print(f"{'─'*60}\n")
+    if result["failed"]:
+        sys.exit(1)
 
 
 # ──────────────────────────────────────────────
@@ -497,9 +1401,33 @@ def main():
   # URLを知っている人だけ閲覧可能
   python whtwnd_post.py post article.md --visibility url
 
+  # ディレクトリ内の記事を一括投稿（同じタイトルの既存記事は更新）
+  python whtwnd_post.py publish posts/
+
+  # ディレクトリと同期（変更のあった記事だけ書き込む）
+  python whtwnd_post.py sync posts/ --delete
+
+  # ディレクトリを監視し、保存された記事をその都度更新
+  python whtwnd_post.py watch posts/
+
   # 記事一覧
   python whtwnd_post.py list
 
+  # 記事一覧をJSONLで出力（項目を選択）
+  python whtwnd_post.py list --json --fields rkey,title,createdAt
+
+  # 記事（Markdown）と投稿（JSONL）のバックアップ。2回目以降は差分だけ
+  python whtwnd_post.py export backup/
+  python whtwnd_post.py export backup/ --incremental
+
+  # 記事の画像（blob）をローカルに保存。中断しても再実行で続きから取得
+  python whtwnd_post.py mirror-blobs blobs/
+  python whtwnd_post.py mirror-blobs blobs/ --all --jobs 16
+
+  # 画像キャッシュの確認・整理
+  python whtwnd_post.py cache
+  python whtwnd_post.py cache prune --older-than 90
+
 設定ファイル (.bsky_config.json または ~/.bsky_config.json):
   {
     "handle": "yourname.bsky.social",
@@ -509,6 +1437,8 @@ def main():
   ※ Blueskyの設定 → プライバシーとセキュリティ → アプリパスワード で発行
         """,
     )
+    parser.add_argument("--trace", metavar="FILE",
+                        help="通信の記録を FILE に保存し、終了時に集計を表示 (.json: Chrome トレース形式, それ以外: JSONL)")
     sub = parser.add_subparsers(dest="command")
 
     # post サブコマンド
@@ -523,6 +1453,12 @@ def main():
     )
     p_post.add_argument("--draft", "-d", action="store_true", help="下書きとして保存 (visibility=author と同等)")
     p_post.add_argument("--no-images", action="store_true", help="画像アップロードをスキップ")
+    p_post.add_argument("--no-cache", action="store_true", help="blobキャッシュを使わずに全画像をアップロード")
+    p_post.add_argument("--jobs", "-j", type=int, default=DEFAULT_JOBS, metavar="N",
+                        help=f"画像の同時アップロード数 (default: {DEFAULT_JOBS})")
+    p_post.add_argument("--async", dest="use_async", action="store_true",
+                        help="画像アップロードを asyncio クライアントで実行 (要 aiohttp)")
+    image_prep.add_arguments(p_post)
     p_post.set_defaults(func=cmd_post)
 
     # update サブコマンド
@@ -539,8 +1475,78 @@ def main():
     )
     p_update.add_argument("--draft", "-d", action="store_true", help="下書きとして保存")
     p_update.add_argument("--no-images", action="store_true", help="画像アップロードをスキップ")
+    p_update.add_argument("--no-cache", action="store_true", help="blobキャッシュを使わずに全画像をアップロード")
+    p_update.add_argument("--jobs", "-j", type=int, default=DEFAULT_JOBS, metavar="N",
+                        help=f"画像の同時アップロード数 (default: {DEFAULT_JOBS})")
+    p_update.add_argument("--async", dest="use_async", action="store_true",
+                        help="画像アップロードを asyncio クライアントで実行 (要 aiohttp)")
+    image_prep.add_arguments(p_update)
     p_update.set_defaults(func=cmd_update)
 
+    # publish サブコマンド
+    p_publish = sub.add_parser("publish", help="ディレクトリ / globに一致するMarkdownを一括投稿")
+    p_publish.add_argument("target", help="ディレクトリ、またはglobパターン (例: 'posts/**/*.md')")
+    p_publish.add_argument(
+        "--visibility", "-v",
+        choices=["public", "url", "author"],
+        default="public",
+        help="公開設定 (default: public)",
+    )
+    p_publish.add_argument("--draft", "-d", action="store_true", help="下書きとして保存")
+    p_publish.add_argument("--create-only", action="store_true",
+                           help="同じタイトルの既存記事があっても更新せず新規作成する")
+    p_publish.add_argument("--batch-size", type=int, default=atproto.APPLY_WRITES_LIMIT, metavar="N",
+                           help=f"applyWrites 1回あたりの書き込み数 (default/上限: {atproto.APPLY_WRITES_LIMIT})")
+    p_publish.add_argument("--no-images", action="store_true", help="画像アップロードをスキップ")
+    p_publish.add_argument("--no-cache", action="store_true", help="blobキャッシュを使わずに全画像をアップロード")
+    p_publish.add_argument("--jobs", "-j", type=int, default=DEFAULT_JOBS, metavar="N",
+                           help=f"画像アップロード・通知の並列数 (default: {DEFAULT_JOBS})")
+    image_prep.add_arguments(p_publish)
+    p_publish.set_defaults(func=cmd_publish)
+
+    # sync サブコマンド
+    p_sync = sub.add_parser("sync", help="ディレクトリとブログを同期（変更のあった記事だけを書き込む）")
+    p_sync.add_argument("dir", help="Markdownファイルのディレクトリ")
+    p_sync.add_argument(
+        "--visibility", "-v",
+        choices=["public", "url", "author"],
+        default="public",
+        help="公開設定 (default: public)",
+    )
+    p_sync.add_argument("--draft", "-d", action="store_true", help="下書きとして保存")
+    p_sync.add_argument("--delete", action="store_true", help="ソースファイルが削除された記事を削除する")
+    p_sync.add_argument("--dry-run", "-n", action="store_true", help="同期計画だけを表示して終了")
+    p_sync.add_argument("--manifest", metavar="FILE", help=f"マニフェストのパス (default: <dir>/{MANIFEST_NAME})")
+    p_sync.add_argument("--no-images", action="store_true", help="画像アップロードをスキップ")
+    p_sync.add_argument("--no-cache", action="store_true", help="blobキャッシュを使わずに全画像をアップロード")
+    p_sync.add_argument("--jobs", "-j", type=int, default=DEFAULT_JOBS, metavar="N",
+                        help=f"画像アップロード・通知の並列数 (default: {DEFAULT_JOBS})")
+    image_prep.add_arguments(p_sync)
+    p_sync.set_defaults(func=cmd_sync)
+
+    # watch サブコマンド
+    p_watch = sub.add_parser("watch", help="ディレクトリを監視し、保存された記事をその都度更新")
+    p_watch.add_argument("dir", help="Markdownファイルのディレクトリ")
+    p_watch.add_argument(
+        "--visibility", "-v",
+        choices=["public", "url", "author"],
+        default="public",
+        help="公開設定 (default: public)",
+    )
+    p_watch.add_argument("--draft", "-d", action="store_true", help="下書きとして保存")
+    p_watch.add_argument("--manifest", metavar="FILE", help=f"マニフェストのパス (default: <dir>/{MANIFEST_NAME})")
+    p_watch.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE, metavar="SEC",
+                         help=f"最後の変更からこの秒数待ってまとめて反映 (default: {WATCH_DEBOUNCE})")
+    p_watch.add_argument("--poll", action="store_true", help="inotify を使わずポーリングで監視する")
+    p_watch.add_argument("--interval", type=float, default=1.0, metavar="SEC",
+                         help="ポーリング間隔 (default: 1.0)")
+    p_watch.add_argument("--no-images", action="store_true", help="画像アップロードをスキップ")
+    p_watch.add_argument("--no-cache", action="store_true", help="blobキャッシュを使わずに全画像をアップロード")
+    p_watch.add_argument("--jobs", "-j", type=int, default=DEFAULT_JOBS, metavar="N",
+                         help=f"画像の同時アップロード数 (default: {DEFAULT_JOBS})")
+    image_prep.add_arguments(p_watch)
+    p_watch.set_defaults(func=cmd_watch)
+
     # delete サブコマンド
     p_delete = sub.add_parser("delete", help="記事を削除")
     p_delete.add_argument("target", nargs="?", help="rkey または AT URI（--title 指定時は省略可）")
@@ -550,14 +1556,45 @@ def main():
 
     # list サブコマンド
     p_list = sub.add_parser("list", help="投稿済み記事の一覧を表示")
+    p_list.add_argument("--limit", "-n", type=int, metavar="N", help="表示する最大件数 (省略時は全件)")
+    p_list.add_argument("--json", action="store_true", help="1行1記事のJSON (JSONL) で出力")
+    p_list.add_argument("--fields", metavar="F1,F2,...",
+                        help=f"--json で出力する項目 (指定可能: {','.join(LIST_FIELDS)})")
+    p_list.add_argument("--reverse", action="store_true", help="古い順に表示")
     p_list.set_defaults(func=cmd_list)
 
+    # export サブコマンド
+    p_export = sub.add_parser("export", help="リポジトリを1リクエストで取得し、記事をMarkdownに・投稿をJSONLに書き出す")
+    p_export.add_argument("dir", help="書き出し先のディレクトリ")
+    p_export.add_argument("--since", metavar="REV", help="このリビジョン以降の差分だけを書き出す")
+    p_export.add_argument("--incremental", "-i", action="store_true",
+                          help=f"前回の書き出し ({EXPORT_STATE_NAME}) 以降の差分だけを書き出す")
+    p_export.set_defaults(func=cmd_export)
+
+    # mirror-blobs サブコマンド
+    p_mirror = sub.add_parser("mirror-blobs", help="記事の画像（blob）を並列にダウンロードし、CID で検証して保存")
+    p_mirror.add_argument("dir", help="保存先のディレクトリ（<CID の末尾2文字>/<CID> に保存）")
+    p_mirror.add_argument("--all", action="store_true", help="記事が参照するものに限らず、アカウントの全 blob を保存")
+    p_mirror.add_argument("--jobs", "-j", type=int, default=8, metavar="N", help="同時ダウンロード数 (default: 8)")
+    p_mirror.add_argument("--verify", action="store_true", help="保存済みの blob も読み直して検証し、壊れていれば取り直す")
+    p_mirror.set_defaults(func=cmd_mirror_blobs)
+
+    # cache サブコマンド
+    p_cache = sub.add_parser("cache", help="アップロード済み画像のキャッシュを確認・整理")
+    p_cache.add_argument("action", nargs="?", choices=["stats", "prune"], default="stats",
+                         help="stats=統計表示 (default), prune=不要エントリを削除")
+    p_cache.add_argument("--older-than", type=float, metavar="DAYS",
+                         help="prune: 最終使用がDAYS日より前のblobを削除")
+    p_cache.add_argument("--all", action="store_true", help="prune: キャッシュを全削除")
+    p_cache.set_defaults(func=cmd_cache)
+
     args = parser.parse_args()
     if not args.command:
         parser.print_help()
         sys.exit(0)
 
-    args.func(args)
+    with request_trace.recording(args.trace):
+        args.func(args)
 
 
 if __name__ == "__main__":